@@ -28,25 +28,26 @@ logging.basicConfig(
 # ================================================================
 # Reconstruction automatique de la base vectorielle si absente
 from utils.vector_store import VectorStoreManager
-from utils.data_loader import load_and_parse_files
-
-FAISS_INDEX = "vector_db/faiss_index.idx"
-CHUNKS_FILE = "vector_db/document_chunks.pkl"
+from utils.vector_store_registry import get_vector_store, register_vector_store
+from utils.data_loader import iter_parsed_files
 
 def rebuild_vector_db():
     st.info("Reconstruction de la base vectorielle…")
-    docs = load_and_parse_files("inputs/pdf")
+    docs = iter_parsed_files("inputs/pdf") # Documents indexés au fil du parsing
     vsm = VectorStoreManager()
-    vsm.build_index(docs)
+    if not vsm.build_index(docs):
+        st.error("Échec de la reconstruction de la base vectorielle.")
+        return
+    register_vector_store(vsm) # Index publié déjà en mémoire: inutile de recharger le snapshot
     st.success("Base vectorielle reconstruite avec succès !")
 
 # Si la base vectorielle n'existe pas → on la reconstruit
-if not (os.path.exists(FAISS_INDEX) and os.path.exists(CHUNKS_FILE)):
+if not VectorStoreManager.has_persisted_index():
     rebuild_vector_db()
 
-# IMPORTANT : recharger FAISS après reconstruction
-from utils.vector_store import VectorStoreManager
-GLOBAL_VECTOR_STORE = VectorStoreManager()
+# Index partagé par le processus: chargé une seule fois (et non à chaque rerun Streamlit),
+# puis rechargé à chaud quand src/indexer.py reconstruit l'index
+GLOBAL_VECTOR_STORE = get_vector_store()
 
 # ================================================================
 # Router avec vector store global
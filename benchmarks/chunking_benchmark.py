@@ -0,0 +1,104 @@
+# benchmarks/chunking_benchmark.py
+"""
+Débit de découpage (chunks/s) et distribution des tailles de chunks en tokens: découpeur
+natif (utils/chunker.py) comparé au RecursiveCharacterTextSplitter de LangChain, en
+caractères et avec un budget en tokens (LangChain mesurant alors chaque morceau par une
+fonction de longueur). Corpus: documents parsés de inputs/ ou textes synthétiques.
+
+    python benchmarks/chunking_benchmark.py                  # documents de inputs/
+    python benchmarks/chunking_benchmark.py --synthetic 500  # 500 documents synthétiques
+"""
+import sys
+import os
+import time
+import random
+import argparse
+import logging
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from utils.chunker import TextChunker, get_token_starts_function
+from utils.config import (
+    INPUT_DIR, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_SEPARATORS, CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_TOKENIZER
+)
+
+logging.basicConfig(level=logging.WARNING)
+
+_WORDS = ("le la les un une des joueur joueuse équipe match saison points rebonds passes décisives "
+          "tirs réussis pourcentage victoire défaite NBA Lakers Celtics analyse performance 2024 3,5").split()
+
+
+def synthetic_texts(n: int, seed: int = 0):
+    """Documents de paragraphes et de lignes de longueurs variées."""
+    rng = random.Random(seed)
+
+    def paragraph():
+        return "\n".join(" ".join(rng.choice(_WORDS) for _ in range(rng.randint(5, 120)))
+                         for _ in range(rng.randint(1, 6)))
+
+    return ["\n\n".join(paragraph() for _ in range(rng.randint(1, 40))) for _ in range(n)]
+
+
+def input_texts(input_dir: str):
+    from utils.data_loader import load_and_parse_files
+    logging.getLogger().setLevel(logging.WARNING) # data_loader configure le logging en INFO
+    return [doc["page_content"] for doc in load_and_parse_files(input_dir)]
+
+
+def langchain_splitter(chunk_size: int, chunk_overlap: int, length_function=len):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                              separators=list(CHUNK_SEPARATORS), length_function=length_function,
+                                              add_start_index=True)
+    return lambda text: [(doc.metadata["start_index"], doc.page_content) for doc in splitter.create_documents([text])]
+
+
+def run(name: str, split, texts, count_tokens, budget: int) -> dict:
+    start = time.perf_counter()
+    chunks = [chunk for text in texts for _, chunk in split(text)]
+    seconds = time.perf_counter() - start
+    tokens = np.array([count_tokens(chunk) for chunk in chunks]) if chunks else np.zeros(1)
+    return {
+        "name": name, "chunks": len(chunks), "seconds": seconds,
+        "chunks_per_second": len(chunks) / seconds if seconds else float("inf"),
+        "p50": np.percentile(tokens, 50), "p95": np.percentile(tokens, 95), "max": tokens.max(),
+        "over_budget": float(np.mean(tokens > budget)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit et tailles en tokens des découpeurs de chunks.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Nombre de documents synthétiques (0 = inputs/)")
+    parser.add_argument("--input-dir", default=os.path.join(ROOT_DIR, INPUT_DIR))
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.synthetic) if args.synthetic else input_texts(args.input_dir)
+    if not texts:
+        raise SystemExit("Aucun document: utilisez --synthetic.")
+    token_starts = get_token_starts_function(CHUNK_TOKENIZER)
+    count_tokens = lambda text: len(token_starts(text))
+    print(f"{len(texts)} documents, {sum(map(len, texts)) / 1e6:.2f} M caractères, tokenizer: {CHUNK_TOKENIZER}")
+    print(f"Budget en caractères: {CHUNK_SIZE} (chevauchement {CHUNK_OVERLAP}); "
+          f"en tokens: {CHUNK_SIZE_TOKENS} (chevauchement {CHUNK_OVERLAP_TOKENS})\n")
+
+    reports = [
+        run("langchain (caractères)", langchain_splitter(CHUNK_SIZE, CHUNK_OVERLAP), texts, count_tokens, CHUNK_SIZE_TOKENS),
+        run("natif (caractères)", TextChunker(CHUNK_SIZE, CHUNK_OVERLAP).split, texts, count_tokens, CHUNK_SIZE_TOKENS),
+        run("langchain (tokens)", langchain_splitter(CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS, count_tokens),
+            texts, count_tokens, CHUNK_SIZE_TOKENS),
+        run("natif (tokens)", TextChunker(CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS, unit="tokens",
+                                          tokenizer=CHUNK_TOKENIZER).split, texts, count_tokens, CHUNK_SIZE_TOKENS),
+    ]
+    print(f"{'découpeur':<24} {'chunks':>7} {'secondes':>9} {'chunks/s':>10} "
+          f"{'tokens p50':>11} {'p95':>6} {'max':>6} {'> budget':>9}")
+    for r in reports:
+        print(f"{r['name']:<24} {r['chunks']:>7} {r['seconds']:>9.3f} {r['chunks_per_second']:>10.0f} "
+              f"{r['p50']:>11.0f} {r['p95']:>6.0f} {r['max']:>6.0f} {r['over_budget']:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/index_benchmark.py
+"""
+Comparaison rappel / latence / taille des types d'index Faiss (SQ8, FP16, HNSW, IVF, IVF-PQ)
+par rapport à l'index exact (flat), sur les vecteurs de l'index courant ou sur un corpus synthétique.
+Les index quantifiés sont aussi mesurés avec re-score exact des candidats (EXACT_RESCORE_FACTOR).
+
+    python benchmarks/index_benchmark.py                   # vecteurs de vector_db/
+    python benchmarks/index_benchmark.py --synthetic 50000 # corpus synthétique de 50 000 vecteurs
+"""
+import sys
+import os
+import argparse
+import logging
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+import faiss
+import numpy as np
+
+from utils.index_factory import compare_index_configs, default_index_params
+from utils.vector_store import VectorStoreManager
+from utils.config import EXACT_RESCORE_FACTOR
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def load_index_vectors() -> np.ndarray:
+    """Reconstruit les vecteurs (normalisés) de l'index courant."""
+    vector_store = VectorStoreManager()
+    if vector_store.index is None:
+        raise SystemExit("Aucun index Faiss chargé: lancez d'abord src/indexer.py ou utilisez --synthetic.")
+    ids = vector_store._chunk_ids
+    return np.vstack([vector_store.index.reconstruct(int(i)) for i in ids]).astype("float32")
+
+
+def synthetic_vectors(n: int, dimension: int, seed: int = 0) -> np.ndarray:
+    """Vecteurs normalisés regroupés en clusters, plus réalistes qu'un bruit uniforme."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 200), dimension)).astype("float32")
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dimension)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def build_configs():
+    configs = []
+    for index_type in ("sq8", "fp16"):
+        configs.append(default_index_params(index_type))
+        configs.append({**default_index_params(index_type), "rescore_factor": EXACT_RESCORE_FACTOR})
+    for ef_search in (16, 32, 64, 128):
+        configs.append({**default_index_params("hnsw"), "ef_search": ef_search})
+    for nprobe in (1, 4, 16, 64):
+        configs.append({**default_index_params("ivf"), "nprobe": nprobe})
+    for nprobe in (4, 16, 64):
+        configs.append({**default_index_params("ivfpq"), "nprobe": nprobe})
+    configs.append({**default_index_params("ivfpq"), "nprobe": 16, "rescore_factor": EXACT_RESCORE_FACTOR})
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rappel vs latence des index Faiss par rapport à l'index exact")
+    parser.add_argument("--synthetic", type=int, default=0, help="Nombre de vecteurs synthétiques (0 = index courant)")
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200, help="Nombre de requêtes (tenues à l'écart de l'index)")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.synthetic, args.dimension) if args.synthetic else load_index_vectors()
+    n_queries = min(args.queries, max(1, len(vectors) // 10))
+    queries, corpus = vectors[:n_queries], vectors[n_queries:]
+    print(f"{len(corpus)} vecteurs indexés, {n_queries} requêtes, k={args.k}\n")
+
+    reports = compare_index_configs(corpus, queries, build_configs(), k=args.k)
+    print(f"{'type':<8} {'réglage':<24} {'rappel@k':>9} {'latence (ms)':>13} {'construction (s)':>17} {'taille (Mo)':>12}")
+    for report in reports:
+        setting = (f"efSearch={report['ef_search']}" if "ef_search" in report
+                   else f"nprobe={report['nprobe']}" if "nprobe" in report else "-")
+        if report["rescore_factor"]:
+            rescore = f"re-score x{report['rescore_factor']}"
+            setting = rescore if setting == "-" else f"{setting} +{rescore}"
+        print(f"{report['index_type']:<8} {setting:<24} {report['recall_at_k']:>9.3f} {report['latency_ms']:>13.3f} "
+              f"{report['build_seconds']:>17.2f} {report['index_bytes'] / 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
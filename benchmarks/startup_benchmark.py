@@ -0,0 +1,78 @@
+# benchmarks/startup_benchmark.py
+"""
+Temps d'import du point d'entrée de l'application, mesuré dans des interpréteurs neufs
+(médiane de plusieurs exécutions), comparé au temps "import + initialisation de l'OCR",
+c'est-à-dire le coût qu'imposait le chargement d'EasyOCR à l'import de utils/data_loader.py.
+
+Le script échoue (code de retour 1) si l'import charge un module lourd (PyTorch, EasyOCR,
+sentence-transformers) ou dépasse --max-seconds: une régression du démarrage est détectée.
+
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --module utils.data_loader --runs 5 --max-seconds 2
+"""
+import sys
+import os
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules dont le chargement à l'import du point d'entrée est une régression
+HEAVY_MODULES = ("torch", "easyocr", "sentence_transformers")
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+if {init_ocr}:
+    from utils.data_loader import get_ocr_reader
+    get_ocr_reader()
+    elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, init_ocr: bool, runs: int) -> dict:
+    """Médiane du temps d'import de `module` sur `runs` interpréteurs neufs."""
+    code = _PROBE.format(module=module, init_ocr=init_ocr, heavy=HEAVY_MODULES)
+    timings, heavy = [], set()
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise SystemExit(f"Échec de l'import de {module}:\n{completed.stderr.strip()}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        heavy.update(result["heavy"])
+    return {"seconds": statistics.median(timings), "heavy": sorted(heavy)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure du temps de démarrage (import du point d'entrée).")
+    parser.add_argument("--module", default="app.ui_streamlit", help="Module point d'entrée à importer")
+    parser.add_argument("--runs", type=int, default=3, help="Nombre d'interpréteurs neufs par mesure")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Temps d'import maximal toléré")
+    args = parser.parse_args()
+
+    lazy = measure(args.module, init_ocr=False, runs=args.runs)
+    eager = measure(args.module, init_ocr=True, runs=args.runs)
+
+    print(f"{'mesure':<34} {'secondes':>9}  modules lourds chargés")
+    print(f"{'import ' + args.module:<34} {lazy['seconds']:>9.2f}  {', '.join(lazy['heavy']) or '-'}")
+    print(f"{'import + initialisation OCR':<34} {eager['seconds']:>9.2f}  {', '.join(eager['heavy']) or '-'}")
+    print(f"Gain au démarrage (OCR paresseux): {eager['seconds'] - lazy['seconds']:.2f} s")
+
+    failures = []
+    if lazy["heavy"]:
+        failures.append(f"modules lourds chargés à l'import: {', '.join(lazy['heavy'])}")
+    if args.max_seconds is not None and lazy["seconds"] > args.max_seconds:
+        failures.append(f"import en {lazy['seconds']:.2f} s (> {args.max_seconds:.2f} s)")
+    if failures:
+        print("Régression du démarrage: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
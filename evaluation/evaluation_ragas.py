@@ -19,7 +19,7 @@ from datasets import Dataset
 
 from app.mistral_client import mistral_chat
 from app.router import route_question
-from utils.vector_store import VectorStoreManager
+from utils.vector_store_registry import get_vector_store
 from utils.config import MISTRAL_API_KEY
 from evaluation.mistral_ragas_embeddings import MistralRagasEmbeddings
 
@@ -37,7 +37,7 @@ logging.basicConfig(level=logging.INFO)
 # ================================================================
 # Vector store
 
-vector_store = VectorStoreManager()
+vector_store = get_vector_store()
 chunks = vector_store.chunks
 logging.info(f"{len(chunks)} chunks chargés pour l'évaluation.")
 
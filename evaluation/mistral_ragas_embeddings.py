@@ -1,24 +1,18 @@
 from langchain_core.embeddings import Embeddings
-from mistralai.client import MistralClient
-import numpy as np
-from utils.config import MISTRAL_API_KEY, EMBEDDING_MODEL
+from typing import Optional
+from utils.embedding_provider import EmbeddingProvider, get_embedding_provider
 
 class MistralRagasEmbeddings(Embeddings):
-    """Wrapper embeddings compatible RAGAS."""
+    """
+    Wrapper embeddings compatible RAGAS, adossé au fournisseur d'embeddings configuré
+    (EMBEDDING_BACKEND: API Mistral ou modèle local), le même que celui de l'index.
+    """
 
-    def __init__(self):
-        self.client = MistralClient(api_key=MISTRAL_API_KEY)
+    def __init__(self, provider: Optional[EmbeddingProvider] = None):
+        self.provider = provider or get_embedding_provider()
 
     def embed_documents(self, texts):
-        response = self.client.embeddings(
-            model=EMBEDDING_MODEL,
-            input=texts
-        )
-        return [np.array(d.embedding, dtype="float32") for d in response.data]
+        return list(self.provider.embed_documents(texts))
 
     def embed_query(self, text):
-        response = self.client.embeddings(
-            model=EMBEDDING_MODEL,
-            input=[text]
-        )
-        return np.array(response.data[0].embedding, dtype="float32")
+        return self.provider.embed_queries([text])[0]
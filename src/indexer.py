@@ -1,62 +1,199 @@
 # indexer.py
+import os
 import argparse
 import logging
 import time
-from typing import Optional
+from typing import Optional, List, Dict
 
-from utils.config import INPUT_DIR
-from utils.data_loader import download_and_extract_zip, load_and_parse_files
+from utils.config import INPUT_DIR, INPUT_MANIFEST_FILE, PARSE_WORKERS
+from utils.data_loader import (
+    download_and_extract_zip, iter_download_and_extract, load_and_parse_files, iter_parsed_files
+)
+from utils.input_manifest import scan_input_files, diff_manifests, exclude_files, load_manifest, save_manifest
 from utils.vector_store import VectorStoreManager
+from utils.streaming import threaded_stage
+from utils.snapshots import list_snapshots, current_version, load_snapshot_manifest, rollback_snapshot
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-def run_indexing(input_directory: str, data_url: Optional[str] = None):
-    logging.info("=== Démarrage du processus d'indexation ===")
+def run_indexing(input_directory: str, data_url: Optional[str] = None, incremental: bool = False,
+                 data_sha256: Optional[str] = None):
+    logging.info(f"=== Démarrage du processus d'indexation{' (incrémental)' if incremental else ''} ===")
     start_time = time.time()
 
-    # Étape 1 : Téléchargement optionnel
+    # Étape 1 : Téléchargement optionnel. En construction complète, l'archive est extraite
+    # pendant le parsing (étape 3): chaque fichier est parsé dès qu'il est extrait
+    extracted_files = None
     if data_url:
         logging.info(f"Téléchargement depuis : {data_url}")
-        if not download_and_extract_zip(data_url, input_directory):
-            logging.error("Échec du téléchargement ou de l'extraction. Arrêt.")
-            return
+        if incremental:
+            if not download_and_extract_zip(data_url, input_directory, sha256=data_sha256):
+                logging.error("Échec du téléchargement ou de l'extraction. Arrêt.")
+                return
+        else:
+            extracted_files = threaded_stage(iter_download_and_extract(data_url, input_directory, sha256=data_sha256),
+                                             maxsize=PARSE_WORKERS * 4, name="extraction")
     else:
         logging.info(f"Utilisation des fichiers locaux dans : {input_directory}")
 
-    # Étape 2 : Parsing
-    logging.info(f"Chargement et parsing des fichiers...")
-    documents = load_and_parse_files(input_directory)
+    # Étape 2 : Détection des fichiers ajoutés / modifiés / supprimés
+    previous_manifest = load_manifest()
+    # Fichiers téléchargés en flux: le manifeste est établi une fois l'extraction terminée
+    current_manifest = scan_input_files(input_directory, previous=previous_manifest) \
+        if extracted_files is None else None
 
-    if not documents:
-        logging.warning("Aucun document trouvé. Arrêt.")
+    if incremental and previous_manifest is not None \
+            and previous_manifest.get("input_dir") == current_manifest["input_dir"] \
+            and VectorStoreManager.has_persisted_index():
+        run_incremental_indexing(input_directory, previous_manifest, current_manifest, start_time)
         return
 
-    logging.info(f"{len(documents)} documents chargés.")
-
-    # Étape 3 : Indexation
     logging.info("Initialisation du Vector Store...")
     vector_store = VectorStoreManager()
+    document_count = 0
+    failures = [] # Fichiers dont le parsing a échoué: exclus du manifeste pour être retraités
 
-    logging.info("Construction de l'index FAISS...")
     try:
-        vector_store.build_index(documents)
+        if incremental and vector_store.index is not None:
+            # Étape 3 : Parsing
+            logging.info(f"Chargement et parsing des fichiers...")
+            documents = load_and_parse_files(input_directory, failures=failures)
+            if not documents:
+                logging.warning("Aucun document trouvé. Arrêt.")
+                return
+            document_count = len(documents)
+
+            # Étape 4 : Indexation
+            logging.info("Mise à jour incrémentale de l'index FAISS (sans manifeste des entrées)...")
+            update_index_incrementally(vector_store, documents)
+        else:
+            # Étapes 3 et 4 en flux : parsing, découpage, embeddings et indexation se chevauchent
+            logging.info("Construction de l'index FAISS en flux (parsing -> découpage -> embeddings -> index)...")
+
+            def counted(documents):
+                nonlocal document_count
+                for document in documents:
+                    document_count += 1
+                    yield document
+
+            if not vector_store.build_index(counted(iter_parsed_files(input_directory, files=extracted_files, failures=failures))):
+                logging.error("Échec de la construction de l'index. Snapshot et manifeste inchangés.")
+                return
     except Exception as e:
         logging.error(f"Erreur lors de la construction de l'index : {e}")
         return
 
+    if current_manifest is None:
+        current_manifest = scan_input_files(input_directory, previous=previous_manifest)
+    if vector_store.index is not None:
+        save_manifest(exclude_files(current_manifest, [path for path, _ in failures]))
+
     # Résumé
     duration = time.time() - start_time
     logging.info("=== Indexation terminée avec succès ===")
     logging.info(f"Durée totale : {duration:.2f} secondes")
-    logging.info(f"Documents traités : {len(documents)}")
+    logging.info(f"Documents traités : {document_count}")
     logging.info(f"Chunks indexés : {vector_store.index.ntotal if vector_store.index else 0}")
 
 
+def run_incremental_indexing(input_directory: str, previous_manifest: Dict[str, any],
+                             current_manifest: Dict[str, any], start_time: float):
+    """
+    Ne parse, découpe et embedde que les fichiers ajoutés ou modifiés depuis le dernier
+    manifeste, et retire de l'index les chunks des fichiers modifiés ou supprimés.
+    """
+    changes = diff_manifests(previous_manifest, current_manifest)
+    logging.info(f"Changements détectés : {len(changes['added'])} ajouté(s), "
+                 f"{len(changes['modified'])} modifié(s), {len(changes['deleted'])} supprimé(s).")
+
+    if not any(changes.values()):
+        # Rien à réindexer: on met seulement à jour les dates de modification du manifeste
+        save_manifest(current_manifest)
+        logging.info(f"=== Aucun changement, index inchangé ({time.time() - start_time:.2f} secondes) ===")
+        return
+
+    changed_files = changes["added"] + changes["modified"]
+    stale_sources = changes["modified"] + changes["deleted"]
+    failures = []
+    documents = load_and_parse_files(input_directory, only_files=changed_files, failures=failures) \
+        if changed_files else []
+
+    logging.info("Initialisation du Vector Store...")
+    vector_store = VectorStoreManager()
+    try:
+        if documents:
+            # 0 chunk (fichiers vides ou illisibles) est valide: leurs anciens chunks sont retirés
+            added = vector_store.upsert_documents(documents, save=False, replace_sources=stale_sources)
+            if added is None:
+                logging.error("Échec de l'ajout des documents modifiés. Index et manifeste inchangés.")
+                return
+        else:
+            vector_store.remove_documents(stale_sources, save=False)
+        vector_store.save()
+    except Exception as e:
+        logging.error(f"Erreur lors de la mise à jour de l'index : {e}")
+        return
+
+    # Un fichier en échec n'est pas enregistré: ses anciens chunks sont retirés et il sera retraité
+    save_manifest(exclude_files(current_manifest, [path for path, _ in failures]))
+
+    # Résumé
+    duration = time.time() - start_time
+    logging.info("=== Indexation incrémentale terminée avec succès ===")
+    logging.info(f"Durée totale : {duration:.2f} secondes")
+    logging.info(f"Fichiers retraités : {len(changed_files)} | Documents traités : {len(documents)}")
+    logging.info(f"Chunks indexés : {vector_store.index.ntotal if vector_store.index else 0}")
+
+
+def update_index_incrementally(vector_store: VectorStoreManager, documents: List[Dict[str, any]]):
+    """
+    Synchronise l'index existant avec les documents fournis:
+    les sources disparues sont retirées, les autres sont remplacées (upsert).
+    Grâce au cache d'embeddings, seuls les chunks réellement nouveaux sont envoyés à l'API.
+    """
+    current_sources = {doc["metadata"]["source"] for doc in documents}
+    indexed_sources = {chunk["metadata"]["source"] for chunk in vector_store.document_chunks}
+    deleted_sources = indexed_sources - current_sources
+    if deleted_sources:
+        logging.info(f"{len(deleted_sources)} source(s) supprimée(s) : {sorted(deleted_sources)}")
+        vector_store.remove_documents(deleted_sources, save=False)
+    vector_store.upsert_documents(documents, save=False)
+    vector_store.save()
+
+
+def print_snapshots():
+    """Affiche les snapshots publiés (le courant est marqué d'une étoile)."""
+    current = current_version()
+    versions = list_snapshots()
+    if not versions:
+        print("Aucun snapshot publié.")
+    for version in versions:
+        manifest = load_snapshot_manifest(version)
+        print(f"{'*' if version == current else ' '} {version}  {manifest.get('vector_count', '?')} vecteurs  "
+              f"{manifest.get('embedding_model', '?')}  index={manifest.get('index_params', {}).get('index_type', '?')}")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Script d'indexation pour l'application RAG")
     parser.add_argument("--input-dir", type=str, default=INPUT_DIR)
     parser.add_argument("--data-url", type=str, default=None)
+    parser.add_argument("--data-sha256", type=str, default=None,
+                        help="Empreinte SHA-256 attendue de l'archive téléchargée (vérifiée avant extraction)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Ne retraite que les fichiers ajoutés, modifiés ou supprimés depuis la dernière indexation")
+    parser.add_argument("--list-snapshots", action="store_true", help="Liste les snapshots d'index publiés")
+    parser.add_argument("--rollback", nargs="?", const="", default=None, metavar="VERSION",
+                        help="Revient au snapshot VERSION (par défaut, au snapshot précédent) sans réindexer")
     args = parser.parse_args()
 
-    run_indexing(input_directory=args.input_dir, data_url=args.data_url)
+    if args.list_snapshots:
+        print_snapshots()
+    elif args.rollback is not None:
+        rollback_snapshot(args.rollback or None)
+        # Le manifeste des entrées décrit l'index abandonné: la prochaine indexation incrémentale resynchronisera tout
+        if os.path.exists(INPUT_MANIFEST_FILE):
+            os.remove(INPUT_MANIFEST_FILE)
+    else:
+        run_indexing(input_directory=args.input_dir, data_url=args.data_url, incremental=args.incremental,
+                     data_sha256=args.data_sha256)
@@ -1,57 +1,84 @@
-from utils.vector_store import VectorStoreManager
+import time
+
+from utils.vector_store_registry import get_vector_store
+from utils.reranker import get_reranker
 from src.prompt_builder import build_rag_prompt
 from app.mistral_client import mistral_chat
-from utils.config import SEARCH_K
+from utils.config import SEARCH_K, RERANK_CANDIDATES, RERANK_TOP_N
 from src.validation_pydantic import RAGResponse
 
 import logfire
 
-_vector_store = VectorStoreManager()
+get_vector_store() # Chargement de l'index au démarrage, partagé par tout le processus
+get_reranker() # Idem pour le cross-encoder (None si le re-classement est désactivé)
 logfire.configure()
 
 @logfire.instrument()
-def rag_answer(question: str) -> dict:
+def rag_answer(question: str, where: dict = None) -> dict:
     """
     Pipeline RAG complet :
-    1. Recherche vectorielle (FAISS)
-    2. Construction du contexte
-    3. Construction du prompt final via prompt_builder
-    4. Appel au LLM
-    5. Retourne :
+    1. Recherche vectorielle (FAISS), restreinte aux métadonnées `where` si fourni
+       (ex. {"filename": "Reddit 1.pdf"})
+    2. Re-classement optionnel par cross-encoder (RERANK_ENABLED): RERANK_CANDIDATES
+       candidats sont recherchés, seuls les RERANK_TOP_N meilleurs vont dans le prompt
+    3. Construction du contexte
+    4. Construction du prompt final via prompt_builder
+    5. Appel au LLM
+    6. Retourne :
     {
         "answer": str,
-        "contexts": [list de chunks utilisés]
+        "contexts": [list de chunks utilisés],
+        "timings_ms": {durée de chaque étape}
     }
     """
-    logfire.info("RAG start", question=question)
+    logfire.info("RAG start", question=question, where=where)
+    timings_ms = {}
+    reranker = get_reranker()
 
-    # Recherche FAISS
-    results = _vector_store.search(question, k=SEARCH_K)
-    logfire.info("FAISS results", count=len(results))
+    # Recherche FAISS (index courant, éventuellement rechargé à chaud depuis le dernier appel)
+    start = time.perf_counter()
+    vector_store = get_vector_store()
+    results = vector_store.search(question, k=RERANK_CANDIDATES if reranker else SEARCH_K, where=where)
+    timings_ms["retrieval"] = (time.perf_counter() - start) * 1000
+    logfire.info("FAISS results", count=len(results), query_cache=vector_store.query_cache_stats())
 
     if not results:
         return RAGResponse( 
             answer="Je n’ai trouvé aucune information pertinente dans les documents.", 
-            contexts=[] 
+            contexts=[],
+            timings_ms=timings_ms
             ).model_dump()
 
+    # Re-classement des candidats (un seul passage du cross-encoder, scores en cache)
+    if reranker is not None:
+        start = time.perf_counter()
+        results = reranker.rerank(question, results, top_n=RERANK_TOP_N)
+        timings_ms["rerank"] = (time.perf_counter() - start) * 1000
+        logfire.info("Rerank results", count=len(results),
+                     scores=[r["rerank_score"] for r in results], cache=reranker.cache_stats())
+
     # Construction du contexte
     context_chunks = [r["text"] for r in results]
     context_str = "\n\n---\n\n".join(context_chunks)
     logfire.info("Context chunks", chunks=context_chunks)
 
     # Prompt final
+    start = time.perf_counter()
     system_prompt = build_rag_prompt(context_str, question)
+    timings_ms["prompt"] = (time.perf_counter() - start) * 1000
 
     # Appel Mistral
+    start = time.perf_counter()
     answer = mistral_chat(
         system_prompt=system_prompt,
         user_message="",
         temperature=0.1
     )
+    timings_ms["generation"] = (time.perf_counter() - start) * 1000
 
     logfire.info("LLM answer", answer=answer)
-    return RAGResponse( answer=answer, contexts=context_chunks ).model_dump()
+    logfire.info("RAG timings", prompt_chars=len(system_prompt), **{f"{k}_ms": round(v, 1) for k, v in timings_ms.items()})
+    return RAGResponse( answer=answer, contexts=context_chunks, timings_ms=timings_ms ).model_dump()
 
 
 
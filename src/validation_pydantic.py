@@ -7,6 +7,7 @@ from typing import List, Dict, Optional
 class RAGResponse(BaseModel):
     answer: str
     contexts: List[str]
+    timings_ms: Dict[str, float] = Field(default_factory=dict) # Durée de chaque étape (recherche, re-classement, génération)
 
 
 # -----------------------------
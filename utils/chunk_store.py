@@ -0,0 +1,274 @@
+# utils/chunk_store.py
+import os
+import json
+import mmap
+import shutil
+import logging
+from array import array
+from typing import List, Dict, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+# Métadonnées propres à chaque chunk, stockées en colonnes numériques.
+# Toutes les autres clés (source, filename, category, full_path, ...) sont
+# regroupées dans une table de documents dédupliquée.
+CHUNK_COLUMNS = ("chunk_id_in_doc", "start_index", "page", "page_end")
+# Colonnes omises des métadonnées d'un chunk qui n'en a pas (valeur -1): pages des seuls chunks de PDF
+OPTIONAL_CHUNK_COLUMNS = ("page", "page_end")
+
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+IDS_FILE = "ids.npy"
+DOC_INDEX_FILE = "doc_index.npy"
+DOCUMENTS_FILE = "documents.json"
+VECTORS_FILE = "vectors.npy"
+FORMAT_VERSION = 1
+VECTORS_COPY_BLOCK_SIZE = 16 * 1024 * 1024 # Recopie des vecteurs bruts dans vectors.npy, par blocs
+
+
+class ChunkStore:
+    """
+    Stockage colonnaire en lecture seule des chunks, chargé par memory-mapping.
+
+    Format sur disque (un répertoire):
+      - texts.bin      : textes des chunks concaténés en UTF-8
+      - offsets.npy    : positions de début de chaque texte dans texts.bin (n + 1 entrées)
+      - ids.npy        : identifiants stables des chunks (triés par ordre croissant)
+      - doc_index.npy  : indice du document (table des métadonnées) de chaque chunk
+      - <colonne>.npy  : une colonne par métadonnée de CHUNK_COLUMNS (-1 si le chunk ne l'a pas)
+      - documents.json : table des métadonnées de documents, dédupliquées
+      - vectors.npy    : (optionnel) embeddings pleine précision (float32), une ligne par chunk
+
+    Seuls les chunks effectivement demandés sont matérialisés en dictionnaires.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Version de format de chunks non supportée: {header.get('version')}")
+        self.documents: List[Dict[str, any]] = header["documents"]
+        self.next_id: int = header.get("next_id", 0)
+
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        self.ids = np.load(os.path.join(directory, IDS_FILE), mmap_mode="r")
+        self.doc_index = np.load(os.path.join(directory, DOC_INDEX_FILE), mmap_mode="r")
+        # Stockages antérieurs sans colonnes de pages: les pages sont alors dans la table des documents
+        self.columns = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in CHUNK_COLUMNS if os.path.exists(os.path.join(directory, f"{name}.npy"))
+        }
+        vectors_path = os.path.join(directory, VECTORS_FILE)
+        self.vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+
+        self._texts_file = open(os.path.join(directory, TEXTS_FILE), "rb")
+        # mmap refuse les fichiers vides
+        self._texts = (
+            mmap.mmap(self._texts_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if os.fstat(self._texts_file.fileno()).st_size > 0 else b""
+        )
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, DOCUMENTS_FILE))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def text(self, position: int) -> str:
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return self._texts[start:end].decode("utf-8")
+
+    def _materialize(self, position: int) -> Dict[str, any]:
+        metadata = dict(self.documents[int(self.doc_index[position])])
+        for name, column in self.columns.items():
+            value = int(column[position])
+            if value >= 0 or name not in OPTIONAL_CHUNK_COLUMNS:
+                metadata[name] = value
+        return {"id": int(self.ids[position]), "text": self.text(position), "metadata": metadata}
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[Dict[str, any], List[Dict[str, any]]]:
+        if isinstance(item, slice):
+            return [self._materialize(pos) for pos in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(f"Position de chunk hors limites: {item}")
+        return self._materialize(item)
+
+    def __iter__(self) -> Iterator[Dict[str, any]]:
+        for pos in range(len(self)):
+            yield self._materialize(pos)
+
+    def close(self):
+        if isinstance(self._texts, mmap.mmap):
+            self._texts.close()
+        self._texts_file.close()
+
+    @staticmethod
+    def write(directory: str, chunks: Iterable[Dict[str, any]], next_id: int = 0,
+              vectors: Optional[np.ndarray] = None):
+        """
+        Écrit des chunks (dictionnaires id/text/metadata) au format colonnaire.
+        `vectors`, si fourni, contient les embeddings pleine précision dans l'ordre des chunks.
+        """
+        writer = ChunkStoreWriter(directory)
+        try:
+            writer.add_chunks(chunks)
+            if vectors is not None:
+                writer.add_vectors(vectors)
+            writer.close(next_id)
+        except Exception:
+            writer.abort()
+            raise
+
+
+class ChunkStoreWriter:
+    """
+    Écriture en flux d'un ChunkStore: les textes et les vecteurs pleine précision sont écrits
+    sur disque au fil des lots. Seuls quelques entiers par chunk (identifiant, offset, colonnes,
+    indice de document) et la table des documents restent en mémoire jusqu'à `close`.
+    Les métadonnées de documents d'un chunk déjà écrit peuvent encore être complétées
+    (`add_duplicates`); les lignes de documents devenues inutilisées sont retirées à la fermeture.
+    Chaque fichier est écrit sous un nom temporaire puis renommé; la table des documents est
+    écrite en dernier.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._documents: List[Dict[str, any]] = []
+        self._document_keys: Dict[str, int] = {}
+        self._offsets = array("q", [0])
+        self._ids = array("q")
+        self._doc_index = array("i")
+        self._columns = {name: array("q") for name in CHUNK_COLUMNS}
+        self._texts_file = open(self._tmp_path(TEXTS_FILE), "wb")
+        self._vectors_file = None # Lignes float32 brutes, précédées de l'en-tête .npy à la fermeture
+        self._vector_count = 0
+        self._dimension = 0
+
+    def _tmp_path(self, filename: str) -> str:
+        return os.path.join(self.directory, f"{filename}.tmp")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _document_row(self, doc_metadata: Dict[str, any]) -> int:
+        key = json.dumps(doc_metadata, sort_keys=True, ensure_ascii=False)
+        if key not in self._document_keys:
+            self._document_keys[key] = len(self._documents)
+            self._documents.append(doc_metadata)
+        return self._document_keys[key]
+
+    def add_chunks(self, chunks: Iterable[Dict[str, any]]):
+        """Ajoute des chunks (identifiants croissants) à la suite des précédents."""
+        for chunk in chunks:
+            encoded = chunk["text"].encode("utf-8")
+            self._texts_file.write(encoded)
+            self._offsets.append(self._offsets[-1] + len(encoded))
+            self._ids.append(chunk["id"])
+
+            metadata = chunk["metadata"]
+            for name in CHUNK_COLUMNS:
+                self._columns[name].append(metadata.get(name, -1))
+            self._doc_index.append(self._document_row(
+                {key: value for key, value in metadata.items() if key not in CHUNK_COLUMNS}
+            ))
+
+    def add_duplicates(self, references: Dict[int, List[Dict[str, any]]]):
+        """Ajoute des références de doublons (identifiant de chunk -> métadonnées) à metadata["duplicates"]."""
+        ids = np.frombuffer(self._ids, dtype="int64")
+        for chunk_id, duplicates in references.items():
+            position = int(np.searchsorted(ids, chunk_id))
+            if position >= len(ids) or ids[position] != chunk_id:
+                raise KeyError(f"Chunk {chunk_id} absent du stockage en cours d'écriture.")
+            metadata = self._documents[self._doc_index[position]]
+            self._doc_index[position] = self._document_row(
+                {**metadata, "duplicates": metadata.get("duplicates", []) + duplicates}
+            )
+
+    def add_vectors(self, vectors: np.ndarray):
+        """Ajoute les vecteurs pleine précision des chunks suivants (mêmes ordre et nombre de lignes au total)."""
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if self._vectors_file is None:
+            self._vectors_file = open(self._tmp_path(f"{VECTORS_FILE}.raw"), "wb")
+            self._dimension = vectors.shape[1]
+        elif vectors.shape[1] != self._dimension:
+            raise ValueError(f"Vecteurs de dimension {vectors.shape[1]} ({self._dimension} attendue).")
+        self._vectors_file.write(vectors.tobytes())
+        self._vector_count += len(vectors)
+
+    def _write_vectors(self, keep_vectors: bool):
+        """Écrit vectors.npy (en-tête puis lignes brutes recopiées par blocs), ou supprime un fichier périmé."""
+        raw_path = self._tmp_path(f"{VECTORS_FILE}.raw")
+        vectors_path = os.path.join(self.directory, VECTORS_FILE)
+        if self._vectors_file is None or not keep_vectors:
+            if self._vectors_file is not None:
+                os.remove(raw_path)
+            if os.path.exists(vectors_path):
+                os.remove(vectors_path) # Vecteurs d'une version précédente, désormais faux
+            return
+        if self._vector_count != len(self._ids):
+            raise ValueError(f"{self._vector_count} vecteurs pour {len(self._ids)} chunks.")
+        tmp_path = self._tmp_path(VECTORS_FILE)
+        with open(tmp_path, "wb") as f, open(raw_path, "rb") as raw:
+            np.lib.format.write_array_header_1_0(f, {
+                "descr": np.lib.format.dtype_to_descr(np.dtype("float32")),
+                "fortran_order": False,
+                "shape": (self._vector_count, self._dimension),
+            })
+            shutil.copyfileobj(raw, f, VECTORS_COPY_BLOCK_SIZE)
+        os.remove(raw_path)
+        os.replace(tmp_path, vectors_path)
+
+    def close(self, next_id: int = 0, keep_vectors: bool = True):
+        """
+        Termine l'écriture. `keep_vectors=False` abandonne les vecteurs ajoutés (index finalement
+        non quantifié, par exemple).
+        """
+        self._texts_file.close()
+        if self._vectors_file is not None:
+            self._vectors_file.close()
+        self._write_vectors(keep_vectors)
+
+        documents = self._documents
+        doc_index = np.frombuffer(self._doc_index, dtype="int32")
+        used = np.unique(doc_index)
+        if len(used) < len(documents): # Lignes remplacées par add_duplicates
+            renumber = np.full(len(documents), -1, dtype="int32")
+            renumber[used] = np.arange(len(used), dtype="int32")
+            doc_index = renumber[doc_index]
+            documents = [documents[row] for row in used]
+
+        arrays = {
+            OFFSETS_FILE: np.frombuffer(self._offsets, dtype="int64"),
+            IDS_FILE: np.frombuffer(self._ids, dtype="int64"),
+            DOC_INDEX_FILE: doc_index,
+            **{f"{name}.npy": np.frombuffer(values, dtype="int64") for name, values in self._columns.items()},
+        }
+        for filename, values in arrays.items():
+            tmp_path = self._tmp_path(filename)
+            with open(tmp_path, "wb") as f:
+                np.save(f, values)
+            os.replace(tmp_path, os.path.join(self.directory, filename))
+        os.replace(self._tmp_path(TEXTS_FILE), os.path.join(self.directory, TEXTS_FILE))
+
+        # La table des documents est écrite en dernier: sa présence marque un stockage complet
+        documents_tmp = self._tmp_path(DOCUMENTS_FILE)
+        with open(documents_tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": FORMAT_VERSION, "next_id": next_id, "documents": documents}, f, ensure_ascii=False)
+        os.replace(documents_tmp, os.path.join(self.directory, DOCUMENTS_FILE))
+
+        logging.info(f"{len(self._ids)} chunks écrits dans {self.directory} ({len(documents)} documents distincts, "
+                     f"{self._offsets[-1] / 1e6:.2f} Mo de texte).")
+
+    def abort(self):
+        """Abandonne l'écriture et supprime les fichiers temporaires."""
+        self._texts_file.close()
+        if self._vectors_file is not None:
+            self._vectors_file.close()
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".tmp"):
+                os.remove(os.path.join(self.directory, filename))
@@ -0,0 +1,234 @@
+# utils/chunker.py
+import re
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .config import (
+    CHUNK_SIZE, CHUNK_OVERLAP, CHUNKER_ENGINE, CHUNK_SEPARATORS, CHUNK_SIZE_UNIT, CHUNK_SIZE_TOKENS,
+    CHUNK_OVERLAP_TOKENS, CHUNK_TOKENIZER
+)
+
+# Estimation du découpage en tokens d'un tokenizer BPE/sentencepiece sans charger de modèle:
+# un token par fragment de 6 lettres au plus, groupe de 3 chiffres au plus ou signe de ponctuation
+_SPACE, _LETTER, _DIGIT, _SYMBOL = 0, 1, 2, 3
+_MAX_RUN = np.array([1, 6, 3, 1], dtype=np.int32) # Longueur maximale d'un token, par classe de caractères
+# Classe de chaque point de code: les caractères non ASCII (lettres accentuées) comptent comme des lettres
+_CLASSES = np.full(0x110000, _LETTER, dtype=np.int8)
+_CLASSES[:128] = [
+    _SPACE if chr(code).isspace() else _LETTER if chr(code).isalpha() else _DIGIT if chr(code).isdigit() else _SYMBOL
+    for code in range(128)
+]
+
+
+class TokenBoundaries:
+    """
+    Nombre de tokens de n'importe quel passage d'un texte en temps constant: le texte est
+    tokenisé une seule fois et `prefix[i]` compte les tokens qui commencent avant la position i.
+    """
+
+    def __init__(self, starts: Sequence[int], length: int):
+        marks = np.zeros(length + 1, dtype=np.int64)
+        marks[np.asarray(starts, dtype=np.int64) + 1] = 1
+        self.prefix = np.cumsum(marks)
+
+    def count(self, start: int, end: int) -> int:
+        return int(self.prefix[end] - self.prefix[start])
+
+
+def estimate_token_starts(text: str) -> np.ndarray:
+    """Positions de début des tokens estimés (vectorisé avec NumPy, aucun modèle chargé)."""
+    codes = np.frombuffer(text.encode("utf-32-le", errors="surrogatepass"), dtype=np.uint32)
+    if not len(codes):
+        return np.empty(0, dtype=np.int64)
+    classes = _CLASSES[codes]
+    positions = np.arange(len(codes), dtype=np.int32)
+    run_starts = np.ones(len(codes), dtype=bool)
+    run_starts[1:] = (classes[1:] != classes[:-1]) | (classes[1:] == _SYMBOL)
+    first_of_run = np.maximum.accumulate(np.where(run_starts, positions, 0))
+    token_start = ((positions - first_of_run) % _MAX_RUN[classes] == 0) & (classes != _SPACE)
+    return np.flatnonzero(token_start)
+
+
+_tokenizers: Dict[str, Callable[[str], Sequence[int]]] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def get_token_starts_function(tokenizer: str) -> Callable[[str], Sequence[int]]:
+    """
+    Fonction texte -> positions de début des tokens. "estimate": estimation vectorisée par
+    classes de caractères (`estimate_token_starts`, NumPy, aucun modèle); sinon nom d'un
+    tokenizer Hugging Face (transformers, installé avec sentence-transformers), avec repli sur
+    l'estimation s'il ne peut pas être chargé.
+    """
+    if tokenizer == "estimate":
+        return estimate_token_starts
+    with _tokenizers_lock:
+        if tokenizer not in _tokenizers:
+            try:
+                from transformers import AutoTokenizer
+                hf_tokenizer = AutoTokenizer.from_pretrained(tokenizer)
+
+                def token_starts(text: str) -> List[int]:
+                    encoding = hf_tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                                            verbose=False)
+                    return [start for start, end in encoding["offset_mapping"] if end > start]
+
+                _tokenizers[tokenizer] = token_starts
+            except Exception as e:
+                logging.warning(f"Tokenizer {tokenizer} indisponible ({e}): nombre de tokens estimé.")
+                _tokenizers[tokenizer] = estimate_token_starts
+        return _tokenizers[tokenizer]
+
+
+class TextChunker:
+    """
+    Découpe récursive de textes bruts, sans objet intermédiaire: même principe que le
+    RecursiveCharacterTextSplitter de LangChain (séparateurs essayés du plus grossier au plus
+    fin, morceaux regroupés jusqu'à `chunk_size` avec `chunk_overlap` de recouvrement), mais
+    chaque chunk reste un intervalle du texte d'origine: sa position de début est connue sans
+    recherche et son texte n'est copié qu'une fois.
+
+    Les positions de chaque séparateur sont calculées une seule fois par texte. Les tailles
+    sont mesurées en caractères (`unit="chars"`) ou en tokens (`unit="tokens"`): le texte est
+    alors tokenisé une seule fois et la taille d'un passage se déduit des positions des tokens.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, unit: str = "chars",
+                 separators: Sequence[str] = CHUNK_SEPARATORS, tokenizer: str = "estimate"):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"Chevauchement ({chunk_overlap}) supérieur ou égal à la taille des chunks ({chunk_size}).")
+        if unit not in ("chars", "tokens"):
+            raise ValueError(f"Unité de taille de chunk inconnue: {unit}")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.unit = unit
+        self.separators = list(separators)
+        self._token_starts = get_token_starts_function(tokenizer) if unit == "tokens" else None
+
+    def split(self, text: str) -> List[Tuple[int, str]]:
+        """Chunks du texte: liste de (position de début dans `text`, texte du chunk)."""
+        if not text:
+            return []
+        if self._token_starts is not None:
+            measure = TokenBoundaries(self._token_starts(text), len(text)).count
+        else:
+            measure = lambda start, end: end - start
+        separator_positions: Dict[str, List[int]] = {}
+
+        def positions(separator: str) -> List[int]:
+            if separator not in separator_positions:
+                separator_positions[separator] = [match.start() for match in re.finditer(re.escape(separator), text)]
+            return separator_positions[separator]
+
+        pieces: List[Tuple[int, int]] = []
+        self._split_span(text, 0, len(text), 0, measure, positions, pieces)
+        return self._merge(text, pieces, measure)
+
+    def _split_span(self, text: str, start: int, end: int, level: int, measure, positions,
+                    pieces: List[Tuple[int, int]]):
+        """Découpe [start, end) en morceaux de taille <= chunk_size (ajoutés à `pieces`)."""
+        if measure(start, end) <= self.chunk_size:
+            pieces.append((start, end))
+            return
+        for depth in range(level, len(self.separators)):
+            separator = self.separators[depth]
+            if not separator:
+                break
+            all_positions = positions(separator)
+            first = bisect.bisect_left(all_positions, start + 1)
+            last = bisect.bisect_left(all_positions, end)
+            if first >= last:
+                continue # Séparateur absent de ce passage: on essaie le suivant
+            # Le séparateur reste attaché au début du morceau qui le suit (comme keep_separator)
+            bounds = [start] + list(all_positions[first:last]) + [end]
+            for piece_start, piece_end in zip(bounds, bounds[1:]):
+                if piece_end > piece_start:
+                    self._split_span(text, piece_start, piece_end, depth + 1, measure, positions, pieces)
+            return
+        self._hard_split(start, end, measure, pieces)
+
+    def _hard_split(self, start: int, end: int, measure, pieces: List[Tuple[int, int]]):
+        """Dernier recours (aucun séparateur): coupe en passages d'au plus chunk_size."""
+        position = start
+        while position < end:
+            low, high = position + 1, end
+            while low < high: # Plus longue fin possible (mesure croissante avec la fin)
+                middle = (low + high + 1) // 2
+                if measure(position, middle) <= self.chunk_size:
+                    low = middle
+                else:
+                    high = middle - 1
+            pieces.append((position, low))
+            position = low
+
+    def _merge(self, text: str, pieces: List[Tuple[int, int]], measure) -> List[Tuple[int, str]]:
+        """Regroupe les morceaux consécutifs en chunks de taille <= chunk_size, avec recouvrement."""
+        chunks: List[Tuple[int, str]] = []
+        window_start = 0 # Indice du premier morceau du chunk en cours
+        for index, (piece_start, piece_end) in enumerate(pieces):
+            if index > window_start and measure(pieces[window_start][0], piece_end) > self.chunk_size:
+                self._emit(text, pieces[window_start][0], pieces[index - 1][1], chunks)
+                # Le chunk suivant reprend les derniers morceaux, dans la limite du recouvrement
+                # et de la place nécessaire au morceau courant (sans jamais repartir du même début)
+                previous_start, window_start = window_start, index
+                while window_start > previous_start + 1:
+                    candidate = pieces[window_start - 1][0]
+                    if measure(candidate, pieces[index - 1][1]) > self.chunk_overlap \
+                            or measure(candidate, piece_end) > self.chunk_size:
+                        break
+                    window_start -= 1
+        if pieces:
+            self._emit(text, pieces[window_start][0], pieces[-1][1], chunks)
+        return chunks
+
+    @staticmethod
+    def _emit(text: str, start: int, end: int, chunks: List[Tuple[int, str]]):
+        """Ajoute le chunk [start, end) sans ses espaces de bord (position ajustée en conséquence)."""
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end > start:
+            chunks.append((start, text[start:end]))
+
+    def token_count(self, text: str) -> int:
+        """Nombre de tokens d'un texte, tel que mesuré pour la taille des chunks (unité "tokens")."""
+        return len((self._token_starts or estimate_token_starts)(text))
+
+
+def chunking_params(engine: str = CHUNKER_ENGINE, unit: str = CHUNK_SIZE_UNIT) -> Dict[str, any]:
+    """Paramètres de découpage effectifs (enregistrés dans le manifeste des snapshots)."""
+    if engine == "langchain" and unit == "tokens":
+        logging.warning("Le moteur de découpage langchain mesure en caractères: CHUNK_SIZE_UNIT ignoré.")
+        unit = "chars"
+    if unit == "tokens":
+        return {"chunker": engine, "chunk_unit": unit, "chunk_size": CHUNK_SIZE_TOKENS,
+                "chunk_overlap": CHUNK_OVERLAP_TOKENS, "chunk_tokenizer": CHUNK_TOKENIZER}
+    return {"chunker": engine, "chunk_unit": unit, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+
+
+def make_text_splitter(engine: str = CHUNKER_ENGINE, unit: str = CHUNK_SIZE_UNIT
+                       ) -> Callable[[str], List[Tuple[int, str]]]:
+    """
+    Fonction texte -> [(position de début, texte du chunk)] selon la configuration:
+    découpeur natif (`TextChunker`) ou RecursiveCharacterTextSplitter de LangChain.
+    """
+    params = chunking_params(engine, unit)
+    if engine == "langchain":
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=params["chunk_size"],
+            chunk_overlap=params["chunk_overlap"],
+            separators=list(CHUNK_SEPARATORS),
+            length_function=len, # Important: mesure en caractères
+            add_start_index=True, # Ajoute la position de début du chunk dans le document original
+        )
+        return lambda text: [(doc.metadata.get("start_index", -1), doc.page_content)
+                             for doc in text_splitter.create_documents([text])]
+    chunker = TextChunker(params["chunk_size"], params["chunk_overlap"], unit=params["chunk_unit"],
+                          tokenizer=CHUNK_TOKENIZER)
+    return chunker.split
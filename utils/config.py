@@ -9,7 +9,17 @@ if not MISTRAL_API_KEY:
     print("⚠️ Attention: MISTRAL_API_KEY manquante dans .env")
 
 # --- Models ---
+# Backend d'embeddings: "mistral" (API) ou "local" (sentence-transformers, sans réseau).
+# Changer de backend impose de reconstruire l'index (dimensions et espaces vectoriels différents).
+EMBEDDING_BACKEND = "mistral"
 EMBEDDING_MODEL = "mistral-embed"
+LOCAL_EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+LOCAL_EMBEDDING_DEVICE = "cpu"
+LOCAL_EMBEDDING_BATCH_SIZE = 64
+LOCAL_EMBEDDING_THREADS = 0 # Threads PyTorch (0 = valeur par défaut de PyTorch)
+# Préfixes requis par certains modèles asymétriques (ex. "query: " / "passage: " pour e5)
+LOCAL_EMBEDDING_QUERY_PREFIX = ""
+LOCAL_EMBEDDING_DOCUMENT_PREFIX = ""
 MODEL_NAME = "mistral-small-latest"
 
 # --- Directories ---
@@ -22,16 +32,179 @@ os.makedirs(VECTOR_DB_DIR, exist_ok=True)
 os.makedirs(DATABASE_DIR, exist_ok=True)
 
 # --- Vector Store Files ---
+# Chaque construction est publiée dans un snapshot versionné (vector_db/snapshots/<version>/:
+# index, paramètres, index lexical, chunks et manifeste), désigné par le pointeur CURRENT
+SNAPSHOTS_DIR = os.path.join(VECTOR_DB_DIR, "snapshots")
+CURRENT_SNAPSHOT_FILE = os.path.join(VECTOR_DB_DIR, "CURRENT")
+SNAPSHOT_KEEP = 3 # Snapshots précédents conservés pour un retour arrière
+SNAPSHOT_VERIFY_CHECKSUMS = True # Vérifie les sommes de contrôle au chargement d'un snapshot non encore vérifié
+# Ancienne disposition (fichiers à la racine de vector_db/), lue tant qu'aucun snapshot n'est publié
 FAISS_INDEX_FILE = os.path.join(VECTOR_DB_DIR, "faiss_index.idx")
+FAISS_INDEX_PARAMS_FILE = os.path.join(VECTOR_DB_DIR, "faiss_index.params.json")
+LEXICAL_INDEX_FILE = os.path.join(VECTOR_DB_DIR, "lexical_index.npz")
+CHUNK_STORE_DIR = os.path.join(VECTOR_DB_DIR, "chunk_store")
+# Ancien format (pickle), lu uniquement pour une migration unique vers CHUNK_STORE_DIR
 DOCUMENT_CHUNKS_FILE = os.path.join(VECTOR_DB_DIR, "document_chunks.pkl")
+ALLOW_LEGACY_CHUNKS_PICKLE = True
+INPUT_MANIFEST_FILE = os.path.join(VECTOR_DB_DIR, "input_manifest.json")
+
+# --- Téléchargement des données (--data-url) ---
+# L'archive est écrite en flux dans DOWNLOAD_DIR (jamais en mémoire); un téléchargement
+# interrompu reprend par requête HTTP Range au lancement suivant
+DOWNLOAD_DIR = os.path.join(VECTOR_DB_DIR, "downloads")
+DOWNLOAD_CHUNK_SIZE = 1 << 16 # Octets lus par bloc (une coupure ne perd que le bloc en cours)
+DOWNLOAD_MAX_RETRIES = 5 # Reprises automatiques après une coupure réseau
+DOWNLOAD_TIMEOUT = 60 # Secondes (connexion et attente entre deux blocs)
+
+# --- Parsing des fichiers d'entrée ---
+# Processus de parsing (PDF/OCR, DOCX, CSV, Excel) en parallèle; 1 = parsing séquentiel.
+# Chaque processus qui OCRise une page charge son propre modèle EasyOCR (plusieurs centaines de Mo):
+# avec beaucoup de PDF scannés, la mémoire croît avec PARSE_WORKERS x taille du modèle
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Extraction du texte des PDF: "pymupdf" (un seul passage par page, document réutilisé pour l'OCR)
+# ou "pypdf2" (moteur historique, plus lent)
+PDF_TEXT_ENGINE = "pymupdf"
+
+# --- OCR (pages de PDF scannées) ---
+OCR_LANGUAGES = ["en", "fr"]
+OCR_WORKERS = 2 # Pages OCRisées en parallèle par fichier (threads partageant le lecteur EasyOCR)
+PDF_PAGE_MIN_TEXT_CHARS = 20 # En dessous, le texte extrait d'une page est jugé absent: la page passe à l'OCR
+# Échelle de rendu adaptée à la taille de la page: le plus grand côté vise OCR_TARGET_LONG_SIDE_PX pixels
+OCR_TARGET_LONG_SIDE_PX = 1800
+OCR_MIN_SCALE = 1.0
+OCR_MAX_SCALE = 3.0
+OCR_BLANK_INK_RATIO = 0.002 # Proportion de pixels "encrés" sous laquelle une page est jugée blanche
+OCR_CACHE_ENABLED = True
+OCR_CACHE_FILE = os.path.join(VECTOR_DB_DIR, "ocr_cache.sqlite")
+OCR_CACHE_MAX_ENTRIES = 50_000
 
 # --- Chunking ---
 CHUNK_SIZE = 1500
 CHUNK_OVERLAP = 150
+# "native": découpeur interne sur les textes bruts (utils/chunker.py); "langchain": RecursiveCharacterTextSplitter
+CHUNKER_ENGINE = "native"
+CHUNK_SEPARATORS = ["\n\n", "\n", " ", ""] # Essayés du plus grossier au plus fin
+# Unité de taille des chunks: "chars" (CHUNK_SIZE / CHUNK_OVERLAP) ou "tokens" (CHUNK_SIZE_TOKENS /
+# CHUNK_OVERLAP_TOKENS, adapté aux limites des modèles d'embeddings, moteur "native" uniquement)
+CHUNK_SIZE_UNIT = "chars"
+CHUNK_SIZE_TOKENS = 400
+CHUNK_OVERLAP_TOKENS = 40
+# "estimate" (estimation sans dépendance) ou nom d'un tokenizer Hugging Face (ex. celui du modèle local)
+CHUNK_TOKENIZER = "estimate"
 EMBEDDING_BATCH_SIZE = 32
 
+# --- Fichiers tabulaires (CSV, Excel) ---
+# "rows": lecture des lignes en flux, groupes de lignes compacts avec l'en-tête des colonnes
+# (une ligne n'est jamais coupée entre deux chunks); "text": feuille entière via df.to_string()
+TABULAR_INGESTION_MODE = "rows"
+TABULAR_MAX_RECORD_CHARS = CHUNK_SIZE # Taille maximale d'un groupe de lignes (en-tête compris)
+TABULAR_MAX_ROWS_PER_RECORD = 20
+TABULAR_HEADER_SCAN_ROWS = 10 # Lignes examinées pour trouver l'en-tête (titres, numéros de colonnes au-dessus)
+
+# --- Indexation en flux (parsing -> découpage -> embeddings -> index) ---
+# Les étages se chevauchent, reliés par des files bornées: la mémoire transitoire dépend
+# de la taille des lots, pas de celle du corpus
+INGEST_BATCH_SIZE = 256 # Chunks par lot entre le découpage, les embeddings et l'index
+INGEST_QUEUE_SIZE = 2 # Lots en attente au plus entre deux étages
+INDEX_TRAIN_SAMPLE_SIZE = 10_000 # Vecteurs accumulés pour entraîner un index sq8/ivf/ivfpq avant les ajouts
+
+# --- Déduplication des chunks (avant embeddings) ---
+# Les chunks quasi identiques (citations, mentions répétées) ne sont embeddés et indexés qu'une
+# fois; le chunk conservé référence les autres dans metadata["duplicates"]
+DEDUP_ENABLED = True
+DEDUP_THRESHOLD = 0.85 # Similarité de Jaccard estimée (n-grammes de mots) à partir de laquelle deux chunks sont regroupés
+DEDUP_NUM_PERM = 128 # Taille des signatures MinHash
+DEDUP_LSH_BANDS = 16 # Bandes LSH (DEDUP_NUM_PERM / DEDUP_LSH_BANDS composantes chacune)
+DEDUP_SHINGLE_SIZE = 5 # Mots par n-gramme
+
+# --- Embedding Pipeline (indexation) ---
+EMBEDDING_MAX_WORKERS = 4 # Requêtes d'embeddings simultanées
+EMBEDDING_REQUESTS_PER_SECOND = 5.0 # 0 = pas de limite
+EMBEDDING_TOKENS_PER_SECOND = 50_000 # Estimation ~4 caractères/token, 0 = pas de limite
+EMBEDDING_MAX_RETRIES = 5 # Reprises d'un lot sur 429, 5xx ou erreur réseau
+EMBEDDING_BACKOFF_BASE_SECONDS = 1.0
+EMBEDDING_BACKOFF_MAX_SECONDS = 30.0
+
+# --- Embedding Cache ---
+# Embeddings de requêtes (recherche): délai court et aucune reprise, pour basculer vite sur BM25
+# en cas de panne de l'API plutôt que d'épuiser les reprises du SDK (5 reprises, 120 s par défaut)
+QUERY_EMBEDDING_TIMEOUT_SECONDS = 10
+QUERY_EMBEDDING_MAX_RETRIES = 1 # 1 = une seule tentative
+
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_FILE = os.path.join(VECTOR_DB_DIR, "embedding_cache.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = 100_000
+
+# --- Faiss Index ---
+# "flat" (exact), "sq8" / "fp16" (quantification scalaire: vecteurs 4x / 2x plus compacts),
+# "hnsw" (graphe), "ivf" (listes inversées) ou "ivfpq" (listes inversées + quantification produit)
+INDEX_TYPE = "flat"
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NLIST = 256 # Réduit automatiquement pour les petits corpus (~39 vecteurs par liste)
+IVF_NPROBE = 16
+PQ_M = 64 # Doit diviser la dimension des embeddings (1024 pour mistral-embed)
+PQ_NBITS = 8
+# Index quantifiés (sq8, fp16, ivfpq): les vecteurs pleine précision sont conservés dans le stockage
+# de chunks (memory-mappés, hors RAM de l'index) pour re-scorer exactement les meilleurs candidats
+KEEP_FULL_PRECISION_VECTORS = True
+EXACT_RESCORE_FACTOR = 4 # Candidats re-scorés = k * facteur
+
 # --- Retrieval ---
 SEARCH_K = 5
+# "dense" (embeddings), "lexical" (BM25, sans API) ou "hybrid" (fusion des deux classements par RRF).
+# En mode hybrid, le "score" des résultats est le score RRF (et non plus la similarité cosinus en %)
+# et min_score ne filtre que les candidats denses
+SEARCH_MODE = "dense"
+HYBRID_CANDIDATES = 50 # Candidats de chaque classement avant fusion
+RRF_K = 60 # Constante de la Reciprocal Rank Fusion
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Diversification des résultats (sur demande): MMR sur les candidats (quasi-doublons écartés), puis fusion
+# des chunks adjacents d'un même document (sans répéter leur chevauchement)
+SEARCH_DIVERSIFY = False # Re-classement MMR et fusion des chunks adjacents, sur demande (search(diversify=True))
+MMR_CANDIDATES = 20 # Candidats parmi lesquels MMR choisit les k résultats
+MMR_LAMBDA = 0.7 # 1 = pertinence seule, 0 = diversité seule
+NEAR_DUPLICATE_THRESHOLD = 0.95 # Similarité cosinus au-delà de laquelle un candidat est un quasi-doublon
+MERGE_ADJACENT_CHUNKS = False # Fusion des chunks consécutifs d'un même document, appliquée seulement avec diversify
+# Champs de métadonnées utilisables dans les filtres `where` de la recherche
+METADATA_FILTER_FIELDS = ("category", "filename", "source", "sheet")
+# En dessous de ce nombre de chunks éligibles, un filtre sur index approché est résolu par recherche exacte
+FILTER_EXACT_MAX_IDS = 2048
+
+# Re-classement par cross-encoder (CPU) entre la recherche et la construction du prompt:
+# RERANK_CANDIDATES candidats sont évalués en un seul passage, les RERANK_TOP_N meilleurs vont au LLM.
+# Nécessite sentence-transformers (le modèle est téléchargé au premier usage).
+RERANK_ENABLED = False
+RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1" # Multilingue (questions en français)
+RERANK_DEVICE = "cpu"
+RERANK_CANDIDATES = 20
+RERANK_TOP_N = 4
+RERANK_CACHE_MAX_ENTRIES = 10000 # Scores mis en cache par (question normalisée, chunk)
+
+# Regroupement des recherches concurrentes (déploiement multi-utilisateurs)
+SEARCH_MICRO_BATCHING = False
+SEARCH_MICRO_BATCH_MAX_SIZE = 32
+SEARCH_MICRO_BATCH_WAIT_MS = 5
+
+# Rechargement à chaud: l'application surveille les fichiers de l'index et bascule
+# sur un index reconstruit (par src/indexer.py) sans redémarrage
+VECTOR_STORE_HOT_RELOAD = True
+VECTOR_STORE_RELOAD_INTERVAL_SECONDS = 5
+# Index Faiss chargé avec IO_FLAG_MMAP (lecture seule). Seuls les index IVF (ivf, ivfpq) sont alors
+# réellement servis depuis le cache de pages; les autres types sont lus en mémoire, et un rechargement
+# à chaud tient brièvement deux index complets (pic ~2x la taille du fichier de l'index)
+VECTOR_STORE_MMAP_INDEX = True
+
+# --- Query Embedding Cache ---
+QUERY_CACHE_ENABLED = True
+QUERY_CACHE_MAX_ENTRIES = 1024
+QUERY_CACHE_TTL_SECONDS = 3600
+QUERY_CACHE_PERSIST = True # Conserve les embeddings de requêtes sur disque (fichier distinct du cache des documents)
+QUERY_CACHE_FILE = os.path.join(VECTOR_DB_DIR, "query_cache.sqlite")
+QUERY_CACHE_PERSIST_MAX_ENTRIES = 10_000
 
 # --- Database ---
 DATABASE_FILE = os.path.join(DATABASE_DIR, "interactions.db")
@@ -2,106 +2,270 @@
 import os
 import requests
 import zipfile
-import io
 from pathlib import Path
-from typing import List, Dict, Optional, Union
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Optional, Union, Iterable, Iterator, Tuple
 import logging
+import threading
+import importlib.util
 import numpy as np
 from tqdm import tqdm # Ajout de tqdm
 
+from .config import (
+    PARSE_WORKERS, OCR_LANGUAGES, OCR_WORKERS, PDF_PAGE_MIN_TEXT_CHARS, OCR_TARGET_LONG_SIDE_PX,
+    OCR_MIN_SCALE, OCR_MAX_SCALE, OCR_BLANK_INK_RATIO, OCR_CACHE_ENABLED, TABULAR_INGESTION_MODE,
+    PDF_TEXT_ENGINE
+)
+from .input_manifest import SUPPORTED_EXTENSIONS
+from .ocr_cache import OCRPageCache, get_ocr_cache
+from .tabular_loader import iter_tabular_documents
+from .zip_download import DownloadError, download_file, discard_download, iter_extract_zip
+
 # --- Importations pour OCR ---
 try:
     import fitz  # PyMuPDF
-    from PIL import Image
-    import easyocr
-
-    # Initialiser le lecteur EasyOCR une seule fois
-    logging.info("Initialisation du lecteur EasyOCR...")
-    reader = easyocr.Reader(['en', 'fr']) 
-    logging.info("Lecteur EasyOCR initialisé.")
-
 except ImportError as e:
-    logging.warning(f"Modules OCR (PyMuPDF, Pillow, easyocr) non installés ou erreur: {e}. L'OCR pour PDF ne sera pas disponible.")
-    fitz = None
-    Image = None
-    easyocr = None
-    reader = None
-except Exception as e:
-    logging.error(f"Erreur inattendue lors du chargement des modules/modèle OCR: {e}")
+    logging.warning(f"PyMuPDF non installé ou erreur: {e}. L'OCR pour PDF ne sera pas disponible.")
     fitz = None
-    Image = None
-    easyocr = None
-    reader = None
+
+# Lecteur EasyOCR: chargé (PyTorch + modèles) à la première page qui en a besoin, puis
+# conservé pour le processus. Importer ce module ne coûte donc rien si aucun OCR n'est requis.
+_ocr_reader = None
+_ocr_reader_failed = False
+_ocr_reader_lock = threading.Lock()
+
+
+def get_ocr_reader():
+    """Lecteur EasyOCR du processus, créé au premier appel; None si EasyOCR est indisponible."""
+    global _ocr_reader, _ocr_reader_failed
+    if _ocr_reader is None and not _ocr_reader_failed:
+        with _ocr_reader_lock:
+            if _ocr_reader is None and not _ocr_reader_failed:
+                try:
+                    import easyocr
+                    logging.info("Initialisation du lecteur EasyOCR...")
+                    _ocr_reader = easyocr.Reader(OCR_LANGUAGES)
+                    logging.info("Lecteur EasyOCR initialisé.")
+                except ImportError as e:
+                    logging.warning(f"easyocr non installé ou erreur: {e}. L'OCR pour PDF ne sera pas disponible.")
+                    _ocr_reader_failed = True
+                except Exception as e:
+                    logging.error(f"Erreur inattendue lors du chargement du modèle OCR: {e}")
+                    _ocr_reader_failed = True
+    return _ocr_reader
+
+
+def ocr_available() -> bool:
+    """EasyOCR utilisable dans ce processus (vérifié sans charger le modèle)."""
+    return _ocr_reader is not None or (not _ocr_reader_failed and importlib.util.find_spec("easyocr") is not None)
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Fonctions d'extraction de texte ---
 
-def extract_text_from_pdf_with_ocr(file_path: str) -> Optional[str]:
-    """Extrait le texte d'un fichier PDF en utilisant l'OCR (EasyOCR)."""
-    if not fitz or not reader:
-        logging.warning("Modules/Modèle OCR non disponibles. Impossible d'effectuer l'OCR.")
-        return None
+def _render_scale(page) -> float:
+    """Échelle de rendu adaptée à la page: le plus grand côté vise OCR_TARGET_LONG_SIDE_PX pixels."""
+    long_side = max(page.rect.width, page.rect.height)
+    if not long_side:
+        return OCR_MAX_SCALE
+    return min(OCR_MAX_SCALE, max(OCR_MIN_SCALE, OCR_TARGET_LONG_SIDE_PX / long_side))
 
-    text_content = []
-    try:
+
+def _is_blank_page(image: np.ndarray) -> bool:
+    """
+    Page blanche (ou uniforme): presque aucun pixel ne s'écarte nettement de la teinte
+    dominante. Estimé sur une version sous-échantillonnée de l'image.
+    """
+    sample = image[::4, ::4]
+    if sample.size == 0:
+        return True
+    background = np.median(sample)
+    ink_ratio = np.count_nonzero(np.abs(sample.astype(np.int16) - background) > 64) / sample.size
+    return ink_ratio < OCR_BLANK_INK_RATIO
+
+
+def _ocr_image(ocr_reader, image: np.ndarray) -> str:
+    results = ocr_reader.readtext(image)
+    return "\n".join([res[1] for res in results])
+
+
+def ocr_pdf_pages(file_path: str, page_numbers: Optional[Iterable[int]] = None, doc=None) -> Dict[int, str]:
+    """
+    OCR (EasyOCR) des pages `page_numbers` d'un PDF (toutes si omis), page par page.
+
+    Chaque page est rendue en niveaux de gris à une échelle adaptée à sa taille; les pages
+    blanches sont ignorées sans OCR, les pages déjà lues sont servies par le cache OCR
+    (clé: image rendue, langues, échelle) et les autres sont OCRisées en parallèle sur
+    OCR_WORKERS threads (le lecteur EasyOCR n'est chargé qu'à ce moment). Le rendu reste séquentiel (un document PyMuPDF n'est pas partagé
+    entre threads) et le nombre de pages rendues en attente d'OCR est borné.
+    Si `doc` (document PyMuPDF déjà ouvert) est fourni, il est réutilisé et laissé ouvert.
+    Retourne {numéro de page: texte} (texte vide pour une page blanche ou en échec).
+    """
+    if not fitz or not ocr_available():
+        logging.warning(f"Modules/Modèle OCR non disponibles. Impossible d'effectuer l'OCR de {file_path}.")
+        return {}
+
+    cache = get_ocr_cache() if OCR_CACHE_ENABLED else None
+    texts: Dict[int, str] = {}
+    blank_pages = cached_pages = 0
+
+    def collect(future):
+        page_num, key = in_flight.pop(future)
+        try:
+            texts[page_num] = future.result()
+            if cache is not None:
+                cache.put(key, texts[page_num])
+        except Exception as ocr_e:
+            logging.error(f"Erreur lors de l'OCR de la page {page_num + 1} de {file_path} avec EasyOCR: {ocr_e}")
+            texts[page_num] = ""
+
+    owns_doc = doc is None
+    if owns_doc:
         doc = fitz.open(file_path)
-        # Utiliser tqdm pour la barre de progression
-        for page_num in tqdm(range(len(doc)), desc=f"OCR de {os.path.basename(file_path)}"):
-            page = doc.load_page(page_num)
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2)) # Augmenter la résolution pour l'OCR
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            try:
-                img_np = np.array(img)
-                results = reader.readtext(img_np)
-                page_text = "\n".join([res[1] for res in results])
-                text_content.append(page_text)
-                # logging.info(f"OCR effectuée sur la page {page_num + 1} de {file_path} avec EasyOCR") # Commenté pour éviter le spam de logs avec tqdm
-            except Exception as ocr_e:
-                logging.error(f"Erreur lors de l'OCR de la page {page_num + 1} de {file_path} avec EasyOCR: {ocr_e}")
-                continue
+    try:
+        pages = range(len(doc)) if page_numbers is None else sorted(page_numbers)
+        with ThreadPoolExecutor(max_workers=OCR_WORKERS) as executor:
+            in_flight = {}
+            # Utiliser tqdm pour la barre de progression
+            for page_num in tqdm(pages, desc=f"OCR de {os.path.basename(file_path)}"):
+                page = doc.load_page(page_num)
+                scale = _render_scale(page)
+                pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY, alpha=False)
+                image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
 
-        doc.close()
-        full_text = "\n".join(text_content).strip()
-        if full_text:
-            logging.info(f"Texte extrait via OCR de PDF: {file_path} ({len(full_text)} caractères)")
-            return full_text
-        else:
-            logging.warning(f"Aucun texte significatif extrait via OCR de {file_path}.")
-            return None
+                if _is_blank_page(image):
+                    texts[page_num] = ""
+                    blank_pages += 1
+                    continue
+                key = OCRPageCache.make_key(image.tobytes(), OCR_LANGUAGES, scale)
+                cached = cache.get(key) if cache is not None else None
+                if cached is not None:
+                    texts[page_num] = cached
+                    cached_pages += 1
+                    continue
+
+                ocr_reader = get_ocr_reader()
+                if ocr_reader is None: # Échec du chargement du modèle: les pages restantes ne seront pas lues
+                    logging.warning(f"Modèle OCR non disponible: OCR de {file_path} interrompu à la page {page_num + 1}.")
+                    break
+                in_flight[executor.submit(_ocr_image, ocr_reader, image)] = (page_num, key)
+                if len(in_flight) >= OCR_WORKERS * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+            done, _ = wait(in_flight)
+            for future in done:
+                collect(future)
+    finally:
+        if owns_doc:
+            doc.close()
+
+    logging.info(f"OCR de {file_path}: {len(texts)} page(s), {blank_pages} blanche(s), {cached_pages} en cache.")
+    return texts
+
+
+def extract_text_from_pdf_with_ocr(file_path: str) -> Optional[str]:
+    """Extrait le texte d'un fichier PDF en utilisant l'OCR (EasyOCR) sur toutes ses pages."""
+    try:
+        pages = ocr_pdf_pages(file_path)
     except Exception as e:
         logging.error(f"Erreur lors de l'ouverture ou du traitement OCR du PDF {file_path}: {e}")
         return None
+    full_text = "\n".join(pages[page_num] for page_num in sorted(pages)).strip()
+    if full_text:
+        logging.info(f"Texte extrait via OCR de PDF: {file_path} ({len(full_text)} caractères)")
+        return full_text
+    logging.warning(f"Aucun texte significatif extrait via OCR de {file_path}.")
+    return None
 
-def extract_text_from_pdf(file_path: str) -> Optional[str]:
-    """Extrait le texte d'un fichier PDF, avec fallback OCR si peu de texte est trouvé."""
+def _pdf_page_texts_pypdf2(file_path: str) -> List[str]:
+    """Texte natif de chaque page avec PyPDF2 (moteur historique, plus lent)."""
+    from PyPDF2 import PdfReader
+    pdf_reader = PdfReader(file_path)
+    page_texts = []
+    for page in pdf_reader.pages:
+        try:
+            page_texts.append(page.extract_text() or "")
+        except Exception as page_e:
+            logging.warning(f"Erreur extraction d'une page de {file_path}: {page_e}")
+            page_texts.append("")
+    return page_texts
+
+
+def _ocr_missing_pages(file_path: str, page_texts: List[str], doc=None) -> int:
+    """
+    Remplace par leur texte OCR les pages dont le texte natif est quasi vide (moins de
+    PDF_PAGE_MIN_TEXT_CHARS caractères, ex. pages scannées). Retourne le nombre de pages
+    soumises à l'OCR.
+    """
+    ocr_pages = [i for i, text in enumerate(page_texts) if len(text.strip()) < PDF_PAGE_MIN_TEXT_CHARS]
+    if ocr_pages:
+        logging.info(f"{len(ocr_pages)}/{len(page_texts)} page(s) sans texte exploitable dans {file_path}. Tentative d'OCR...")
+        try:
+            for page_num, ocr_text in ocr_pdf_pages(file_path, ocr_pages, doc=doc).items():
+                if len(ocr_text.strip()) > len(page_texts[page_num].strip()):
+                    page_texts[page_num] = ocr_text
+        except Exception as e:
+            logging.error(f"Erreur lors du traitement OCR du PDF {file_path}: {e}")
+    return len(ocr_pages)
+
+
+def extract_pdf_pages(file_path: str, engine: str = PDF_TEXT_ENGINE, ocr: bool = True
+                      ) -> Optional[List[Tuple[int, str]]]:
+    """
+    Extrait le texte d'un fichier PDF page par page: seules les pages dont le texte extrait
+    est quasi vide passent à l'OCR, les autres gardent leur texte natif.
+    Retourne [(numéro de page à partir de 1, texte)] pour les pages non vides, ou None.
+
+    Moteur "pymupdf": le document est ouvert une seule fois, le texte de chaque page est
+    extrait en un seul passage et le même document sert au rendu des pages à OCRiser.
+    Moteur "pypdf2": extraction PyPDF2, le PDF est rouvert avec PyMuPDF pour l'OCR.
+    Avec `ocr=False`, seul le texte natif est extrait.
+    """
+    if engine == "pymupdf" and not fitz:
+        engine = "pypdf2"
+    ocr_count = 0
     try:
-        from PyPDF2 import PdfReader
-        reader = PdfReader(file_path)
-        text = "".join(page.extract_text() + "\n" for page in reader.pages if page.extract_text())
-        
-        if len(text.strip()) < 100: # Si très peu de texte est extrait, tenter l'OCR
-            logging.info(f"Peu de texte trouvé dans {file_path} via extraction standard ({len(text.strip())} caractères). Tentative d'OCR...")
-            ocr_text = extract_text_from_pdf_with_ocr(file_path)
-            if ocr_text:
-                return ocr_text
-            else:
-                logging.warning(f"L'OCR n'a pas non plus produit de texte significatif pour {file_path}.")
-                return text # Retourne le peu de texte trouvé ou vide
-        
-        logging.info(f"Texte extrait de PDF: {file_path} ({len(text)} caractères)")
-        return text
+        if engine == "pymupdf":
+            with fitz.open(file_path) as doc:
+                page_texts = [page.get_text("text") for page in doc]
+                if ocr:
+                    ocr_count = _ocr_missing_pages(file_path, page_texts, doc=doc)
+        else:
+            page_texts = _pdf_page_texts_pypdf2(file_path)
+            if ocr:
+                ocr_count = _ocr_missing_pages(file_path, page_texts)
     except Exception as e:
+        if not ocr:
+            logging.error(f"Erreur extraction PDF {file_path}: {e}")
+            return None
         logging.error(f"Erreur extraction PDF {file_path}: {e}. Tentative d'OCR en dernier recours...")
         # Si l'extraction standard échoue complètement, tenter l'OCR
-        ocr_text = extract_text_from_pdf_with_ocr(file_path)
-        if ocr_text:
-            return ocr_text
-        else:
-            logging.warning(f"L'OCR n'a pas non plus produit de texte significatif après échec de l'extraction standard pour {file_path}.")
-            return None
+        try:
+            ocr_texts = ocr_pdf_pages(file_path)
+        except Exception as ocr_e:
+            logging.error(f"Erreur lors de l'ouverture ou du traitement OCR du PDF {file_path}: {ocr_e}")
+            ocr_texts = {}
+        page_texts = [ocr_texts[page_num] for page_num in sorted(ocr_texts)]
+        ocr_count = len(page_texts)
+
+    pages = [(page_num + 1, text) for page_num, text in enumerate(page_texts) if text.strip()]
+    if not pages:
+        logging.warning(f"Aucun texte significatif extrait de {file_path}{', ni directement ni via OCR' if ocr else ''}.")
+        return None
+    logging.info(f"Texte extrait de PDF ({engine}): {file_path} ({sum(len(text) + 1 for _, text in pages)} "
+                 f"caractères, {len(pages)} page(s), {ocr_count} page(s) soumises à l'OCR)")
+    return pages
+
+
+def extract_text_from_pdf(file_path: str) -> Optional[str]:
+    """Texte d'un fichier PDF, pages concaténées (voir `extract_pdf_pages`)."""
+    pages = extract_pdf_pages(file_path)
+    if not pages:
+        return None
+    return "".join(text + "\n" for _, text in pages)
 
 
 def extract_text_from_docx(file_path: str) -> Optional[str]:
@@ -180,97 +344,309 @@ def extract_text_from_excel(file_path: str) -> Optional[Union[str, Dict[str, str
 
 # --- Fonctions de chargement ---
 
-def download_and_extract_zip(url: str, output_dir: str) -> bool:
+def iter_download_and_extract(url: str, output_dir: str, sha256: Optional[str] = None) -> Iterator[str]:
+    """
+    Télécharge une archive ZIP en flux (reprise sur coupure, voir `download_file`) puis
+    l'extrait fichier par fichier dans `output_dir`, en produisant le chemin relatif de chaque
+    fichier dès qu'il est extrait. L'archive n'est supprimée qu'une fois entièrement extraite:
+    un échec d'extraction ne fait pas re-télécharger. Lève DownloadError ou BadZipFile.
+    """
+    logging.info(f"Téléchargement des données depuis {url}...")
+    archive_path = download_file(url, sha256=sha256)
+    logging.info(f"Extraction du contenu dans {output_dir}...")
+    try:
+        extracted = 0
+        for relative in iter_extract_zip(archive_path, output_dir):
+            extracted += 1
+            yield relative
+    except zipfile.BadZipFile:
+        # Archive corrompue (ou pas un ZIP): elle ne doit pas être reprise au prochain lancement
+        discard_download(url)
+        raise
+    discard_download(url)
+    logging.info(f"Téléchargement et extraction terminés ({extracted} fichiers).")
+
+
+def download_and_extract_zip(url: str, output_dir: str, sha256: Optional[str] = None) -> bool:
     """Télécharge un fichier ZIP depuis une URL et l'extrait."""
     if not url:
         logging.warning("Aucune URL fournie pour le téléchargement.")
         return False
     try:
-        logging.info(f"Téléchargement des données depuis {url}...")
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
-
-        with zipfile.ZipFile(io.BytesIO(response.content)) as z:
-            logging.info(f"Extraction du contenu dans {output_dir}...")
-            z.extractall(output_dir)
-        logging.info("Téléchargement et extraction terminés.")
+        for _ in iter_download_and_extract(url, output_dir, sha256=sha256):
+            pass
         return True
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, DownloadError) as e:
         logging.error(f"Erreur de téléchargement: {e}")
         return False
-    except zipfile.BadZipFile:
-        logging.error("Le fichier téléchargé n'est pas un ZIP valide.")
+    except zipfile.BadZipFile as e:
+        logging.error(f"Le fichier téléchargé n'est pas un ZIP valide: {e}")
         return False
     except Exception as e:
         logging.error(f"Erreur inattendue lors du téléchargement/extraction: {e}")
         return False
 
-def load_and_parse_files(input_dir: str) -> List[Dict[str, any]]:
+def _documents_from_content(extracted_content: Union[str, Dict[str, str]], file_path: Path,
+                            relative_path: Path, source_folder: str) -> List[Dict[str, any]]:
+    """Construit les documents d'un fichier (un par feuille pour un Excel multi-feuilles)."""
+    # Si c'est un dictionnaire (plusieurs feuilles Excel), créer un doc par feuille
+    if isinstance(extracted_content, dict):
+        return [{
+            "page_content": text,
+            "metadata": {
+                "source": f"{str(relative_path)} (Feuille: {sheet_name})",
+                "filename": file_path.name,
+                "sheet": sheet_name,
+                "category": source_folder,
+                "full_path": str(file_path.resolve())
+            }
+        } for sheet_name, text in extracted_content.items()]
+    # Pour tous les autres types de fichiers
+    return [{
+        "page_content": extracted_content,
+        "metadata": {
+            "source": str(relative_path),
+            "filename": file_path.name,
+            "category": source_folder,
+            "full_path": str(file_path.resolve())
+        }
+    }]
+
+
+def _streams_in_caller(file_path: Path) -> bool:
+    """Fichier tabulaire en mode "rows": ses documents sont produits en flux (voir `parse_file`)."""
+    return file_path.suffix.lower() in [".csv", ".xlsx", ".xls"] and TABULAR_INGESTION_MODE == "rows"
+
+
+def _iter_tabular_file(file_path: Path, relative_path: Path, source_folder: str) -> Iterator[Dict[str, any]]:
+    """Documents d'un fichier tabulaire, lus en flux; ValueError en fin de lecture si aucune ligne n'a été extraite."""
+    empty = True
+    for document in iter_tabular_documents(file_path, relative_path, source_folder):
+        empty = False
+        yield document
+    if empty:
+        raise ValueError("aucune ligne n'a pu être extraite")
+
+
+def parse_file(file_path: str, input_dir: str) -> Iterable[Dict[str, any]]:
+    """
+    Extrait les documents d'un fichier de `input_dir`. Exécutée dans les processus de
+    parsing (fonction de module, sérialisable). Lève une ValueError si aucun contenu
+    n'a pu être extrait.
+
+    Exception: un fichier tabulaire en mode "rows" est retourné sous forme de générateur,
+    lu groupe de lignes par groupe de lignes (un classeur entier n'est jamais construit ni
+    renvoyé d'un processus à l'autre). Il est donc parsé dans le processus appelant (voir
+    `_parse_files`), et sa ValueError est levée pendant l'itération.
+    """
+    file_path = Path(file_path)
+    relative_path = file_path.relative_to(Path(input_dir))
+    source_folder = relative_path.parts[0] if len(relative_path.parts) > 1 else "root"
+    ext = file_path.suffix.lower()
+
+    logging.debug(f"Traitement du fichier: {relative_path} (Dossier source: {source_folder})")
+
+    if _streams_in_caller(file_path):
+        # Lignes lues en flux et regroupées avec leur en-tête, plutôt qu'une feuille entière en texte
+        return _iter_tabular_file(file_path, relative_path, source_folder)
+
+    if ext == ".pdf":
+        pages = extract_pdf_pages(str(file_path))
+        if not pages:
+            raise ValueError("aucun contenu n'a pu être extrait")
+        documents = _documents_from_content("".join(text + "\n" for _, text in pages),
+                                            file_path, relative_path, source_folder)
+        # Début de chaque page dans le texte: le découpage en déduit les pages de chaque chunk
+        page_offsets, offset = [], 0
+        for page_number, text in pages:
+            page_offsets.append([offset, page_number])
+            offset += len(text) + 1
+        documents[0]["metadata"]["page_offsets"] = page_offsets
+        return documents
+
+    extracted_content = None
+    if ext == ".docx":
+        extracted_content = extract_text_from_docx(str(file_path))
+    elif ext == ".txt":
+        extracted_content = extract_text_from_txt(str(file_path))
+    elif ext == ".csv":
+        extracted_content = extract_text_from_csv(str(file_path))
+    elif ext in [".xlsx", ".xls"]:
+        extracted_content = extract_text_from_excel(str(file_path))
+
+    if not extracted_content:
+        raise ValueError("aucun contenu n'a pu être extrait")
+    return _documents_from_content(extracted_content, file_path, relative_path, source_folder)
+
+
+def _list_input_files(input_path: Path, only_files: Optional[Iterable[str]]) -> List[Path]:
+    """Fichiers pris en charge de `input_path`, triés (ordre de traitement déterministe)."""
+    only_files = set(only_files) if only_files is not None else None
+    files = []
+    for file_path in sorted(input_path.rglob("*.*")):
+        if not file_path.is_file():
+            continue
+        relative_path = file_path.relative_to(input_path)
+        if only_files is not None and str(relative_path) not in only_files:
+            continue
+        if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+            logging.warning(f"Type de fichier non supporté ignoré: {relative_path}")
+            continue
+        files.append(file_path)
+    return files
+
+
+def _iter_supported_files(input_path: Path, relative_paths: Iterable[str]) -> Iterator[Path]:
+    """Chemins des fichiers pris en charge parmi `relative_paths`, dans l'ordre où ils arrivent."""
+    for relative in relative_paths:
+        file_path = input_path / relative
+        if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+            logging.warning(f"Type de fichier non supporté ignoré: {relative}")
+            continue
+        yield file_path
+
+
+def _parse_files(files: Iterable[Path], input_dir: str, workers: int
+                 ) -> Iterator[Tuple[int, str, Optional[Iterable[Dict[str, any]]], Optional[str]]]:
+    """
+    Parse les fichiers et produit (position, chemin relatif, documents, erreur) dans l'ordre
+    de fin de traitement. Avec `workers` > 1, les fichiers sont répartis sur un pool de
+    processus; le nombre de fichiers en cours est borné pour ne pas accumuler les résultats.
+    `files` peut être un flux: chaque fichier est soumis dès qu'il est disponible.
+    Les fichiers tabulaires (mode "rows") restent dans ce processus: leurs documents sont un
+    générateur, dont l'itération peut lever l'erreur de parsing (voir `iter_parsed_files`).
+    """
+    input_path = Path(input_dir)
+    if workers <= 1 or (isinstance(files, list) and len(files) <= 1):
+        for position, file_path in enumerate(files):
+            relative = str(file_path.relative_to(input_path))
+            try:
+                yield position, relative, parse_file(str(file_path), input_dir), None
+            except Exception as e:
+                yield position, relative, None, str(e)
+        return
+
+    if isinstance(files, list):
+        logging.info(f"Parsing de {len(files)} fichiers sur {workers} processus...")
+    else:
+        logging.info(f"Parsing en flux sur {workers} processus...")
+    pending = iter(enumerate(files))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+        streamed = deque() # Fichiers tabulaires, lus en flux dans ce processus
+
+        def submit_next() -> bool:
+            item = next(pending, None)
+            if item is None:
+                return False
+            position, file_path = item
+            relative = str(file_path.relative_to(input_path))
+            if _streams_in_caller(file_path):
+                streamed.append((position, relative, file_path))
+            else:
+                in_flight[executor.submit(parse_file, str(file_path), input_dir)] = (position, relative)
+            return True
+
+        for _ in range(workers * 2):
+            if not submit_next():
+                break
+        while in_flight or streamed:
+            if streamed:
+                position, relative, file_path = streamed.popleft()
+                yield position, relative, parse_file(str(file_path), input_dir), None
+                submit_next()
+                continue
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                position, relative = in_flight.pop(future)
+                try:
+                    yield position, relative, future.result(), None
+                except Exception as e:
+                    # Y compris BrokenProcessPool (processus tué, ex. mémoire): le lot continue
+                    yield position, relative, None, str(e) or type(e).__name__
+                submit_next()
+
+
+def iter_parsed_files(input_dir: str, only_files: Optional[Iterable[str]] = None,
+                      workers: int = PARSE_WORKERS,
+                      failures: Optional[List[Tuple[str, str]]] = None,
+                      files: Optional[Iterable[str]] = None) -> Iterator[Dict[str, any]]:
+    """
+    Variante en flux de `load_and_parse_files`: produit les documents au fur et à mesure
+    que les fichiers sont parsés (ordre de fin de traitement), pour que le découpage et les
+    embeddings démarrent avant la fin du parsing. Les échecs sont journalisés et, si
+    `failures` est fourni, ajoutés à cette liste sous la forme (chemin relatif, erreur).
+
+    Si `files` est fourni (chemins relatifs à `input_dir` produits au fil de l'eau, ex. par
+    `iter_download_and_extract`), chaque fichier est parsé dès qu'il arrive, sans parcourir
+    `input_dir`.
+    """
+    input_path = Path(input_dir)
+    if files is None and not input_path.is_dir():
+        logging.error(f"Le répertoire d'entrée '{input_dir}' n'existe pas.")
+        return
+
+    if files is None:
+        logging.info(f"Parcours du répertoire source: {input_dir}")
+        files = _list_input_files(input_path, only_files)
+    else:
+        files = _iter_supported_files(input_path, files)
+    failed = parsed = 0
+    for _, relative, documents, error in _parse_files(files, input_dir, workers):
+        parsed += 1
+        if error is None:
+            try:
+                yield from documents
+                continue
+            except Exception as e:
+                # Fichier tabulaire lu en flux: ses documents déjà produits restent indexés,
+                # mais il est signalé en échec (et donc retraité au prochain lancement)
+                error = str(e) or type(e).__name__
+        failed += 1
+        logging.warning(f"Échec du parsing de {relative}: {error}")
+        if failures is not None:
+            failures.append((relative, error))
+    if failed:
+        logging.warning(f"{failed}/{parsed} fichier(s) n'ont pas pu être parsés.")
+
+
+def load_and_parse_files(input_dir: str, only_files: Optional[Iterable[str]] = None,
+                         workers: int = PARSE_WORKERS,
+                         failures: Optional[List[Tuple[str, str]]] = None) -> List[Dict[str, any]]:
     """
     Charge et parse récursivement les fichiers d'un répertoire.
+    Si `only_files` est fourni (chemins relatifs à `input_dir`), seuls ces fichiers sont traités.
+    Avec `workers` > 1, les fichiers sont parsés en parallèle dans un pool de processus;
+    les documents sont retournés dans l'ordre des chemins, quel que soit l'ordre de fin.
+    Un fichier en échec n'interrompt pas le lot: il est journalisé et, si `failures` est
+    fourni, ajouté à cette liste sous la forme (chemin relatif, erreur).
     Retourne une liste de dictionnaires, chacun représentant un document.
     """
-    documents = []
     input_path = Path(input_dir)
     if not input_path.is_dir():
         logging.error(f"Le répertoire d'entrée '{input_dir}' n'existe pas.")
         return []
 
     logging.info(f"Parcours du répertoire source: {input_dir}")
-    for file_path in input_path.rglob("*.*"):
-        if file_path.is_file():
-            relative_path = file_path.relative_to(input_path)
-            source_folder = relative_path.parts[0] if len(relative_path.parts) > 1 else "root"
-            ext = file_path.suffix.lower()
-            
-            logging.debug(f"Traitement du fichier: {relative_path} (Dossier source: {source_folder})")
-
-            extracted_content = None
-            if ext == ".pdf":
-                extracted_content = extract_text_from_pdf(str(file_path))
-            elif ext == ".docx":
-                extracted_content = extract_text_from_docx(str(file_path))
-            elif ext == ".txt":
-                extracted_content = extract_text_from_txt(str(file_path))
-            elif ext == ".csv":
-                extracted_content = extract_text_from_csv(str(file_path))
-            elif ext in [".xlsx", ".xls"]:
-                extracted_content = extract_text_from_excel(str(file_path))
-            # Suppression de la gestion des fichiers HTML
-            else:
-                logging.warning(f"Type de fichier non supporté ignoré: {relative_path}")
-                continue
-
-            if not extracted_content:
-                logging.warning(f"Aucun contenu n'a pu être extrait de {relative_path}")
+    files = _list_input_files(input_path, only_files)
+    by_position: Dict[int, List[Dict[str, any]]] = {}
+    failed = 0
+    for position, relative, documents, error in _parse_files(files, input_dir, workers):
+        if error is None:
+            try:
+                by_position[position] = list(documents)
                 continue
-            
-            # Si c'est un dictionnaire (plusieurs feuilles Excel), créer un doc par feuille
-            if isinstance(extracted_content, dict):
-                for sheet_name, text in extracted_content.items():
-                    documents.append({
-                        "page_content": text,
-                        "metadata": {
-                            "source": f"{str(relative_path)} (Feuille: {sheet_name})",
-                            "filename": file_path.name,
-                            "sheet": sheet_name,
-                            "category": source_folder,
-                            "full_path": str(file_path.resolve())
-                        }
-                    })
-            else: # Pour tous les autres types de fichiers
-                 documents.append({
-                    "page_content": extracted_content,
-                    "metadata": {
-                        "source": str(relative_path),
-                        "filename": file_path.name,
-                        "category": source_folder,
-                        "full_path": str(file_path.resolve())
-                    }
-                })
+            except Exception as e:
+                error = str(e) or type(e).__name__
+        failed += 1
+        logging.warning(f"Échec du parsing de {relative}: {error}")
+        if failures is not None:
+            failures.append((relative, error))
+    if failures is not None:
+        failures.sort()
 
+    documents = [doc for position in sorted(by_position) for doc in by_position[position]]
+    if failed:
+        logging.warning(f"{failed}/{len(files)} fichier(s) n'ont pas pu être parsés.")
     logging.info(f"{len(documents)} documents chargés et parsés.")
-    return documents
\ No newline at end of file
+    return documents
@@ -0,0 +1,146 @@
+# utils/dedup.py
+import re
+import hashlib
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .config import DEDUP_NUM_PERM, DEDUP_LSH_BANDS, DEDUP_SHINGLE_SIZE, DEDUP_THRESHOLD
+
+# Nombre premier de Mersenne 2^31 - 1: a * h + b tient sur 64 bits et le modulo se calcule par
+# décalages et masques (bien plus rapide qu'une division entière sur 64 bits)
+_MERSENNE = np.uint64((1 << 31) - 1)
+_SHIFT = np.uint64(31)
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+class MinHasher:
+    """
+    Signatures MinHash des textes: ensemble des n-grammes de mots (`shingle_size` mots), haché
+    puis réduit par `num_perm` permutations aléatoires (a * h + b mod 2^31 - 1). La proportion de
+    composantes égales entre deux signatures estime la similarité de Jaccard des textes.
+    """
+
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, shingle_size: int = DEDUP_SHINGLE_SIZE, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, int(_MERSENNE), num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_MERSENNE), num_perm, dtype=np.uint64)
+        # Multiplicateurs (impairs) combinant les hachages des mots d'un n-gramme
+        self._mix = rng.integers(1, 1 << 62, shingle_size, dtype=np.uint64) | np.uint64(1)
+
+    def signature(self, text: str) -> np.ndarray:
+        words = _WORD_PATTERN.findall(text.lower()) or [""]
+        # hash() de Python: stable dans un processus, ce qui suffit (les signatures ne sont pas persistées)
+        word_hashes = np.fromiter(map(hash, words), dtype=np.int64, count=len(words)).view(np.uint64)
+        size = min(self.shingle_size, len(words))
+        count = len(words) - size + 1
+        combined = np.zeros(count, dtype=np.uint64)
+        for offset in range(size): # Hachage de chaque n-gramme, calculé pour tous les n-grammes à la fois
+            combined += word_hashes[offset:offset + count] * self._mix[offset]
+        hashes = combined >> np.uint64(33) # 31 bits: a * h + b tient sur 64 bits
+        permuted = np.outer(hashes, self._a)
+        permuted += self._b
+        permuted = (permuted & _MERSENNE) + (permuted >> _SHIFT) # Réduction modulo 2^31 - 1 (à une
+        permuted = (permuted & _MERSENNE) + (permuted >> _SHIFT) # soustraction près, sans effet sur le minimum)
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def _back_reference(metadata: Dict[str, any]) -> Dict[str, any]:
+    """Métadonnées d'un chunk écarté, conservées sur son chunk canonique."""
+    return {key: value for key, value in metadata.items() if key != "duplicates"}
+
+
+class ChunkDeduplicator:
+    """
+    Regroupe les chunks quasi identiques (citations dans les réponses de forum, mentions
+    répétées...) avant le calcul des embeddings: seul le premier chunk de chaque groupe (le
+    chunk canonique) est embeddé et indexé; les métadonnées des autres sont ajoutées à sa
+    liste metadata["duplicates"], pour que toutes leurs sources restent connues.
+
+    Aucun chunk n'est conservé: seuls l'identifiant, la signature et l'empreinte du texte des
+    chunks canoniques sont gardés, et les références des doublons sont regroupées par identifiant
+    de chunk canonique dans `references` (voir `attach_references`).
+
+    Les candidats sont trouvés par LSH (signature MinHash découpée en `bands` bandes: deux
+    chunks partageant une bande sont comparés), puis retenus si la similarité de Jaccard
+    estimée atteint `threshold`. Les doublons exacts (texte normalisé identique) sont détectés
+    sans calcul de signature.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM,
+                 bands: int = DEDUP_LSH_BANDS, shingle_size: int = DEDUP_SHINGLE_SIZE):
+        if num_perm % bands:
+            raise ValueError(f"Le nombre de permutations ({num_perm}) doit être un multiple du nombre de bandes ({bands}).")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self._exact: Dict[bytes, int] = {} # Empreinte du texte normalisé -> identifiant du chunk canonique
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+        self._canonical_ids: List[int] = []
+        self.references: Dict[int, List[Dict[str, any]]] = {} # Identifiant canonique -> métadonnées des doublons
+        self.duplicates = 0
+
+    def _find_similar(self, signature: np.ndarray) -> Optional[int]:
+        candidates = set()
+        for band, buckets in enumerate(self._buckets):
+            candidates.update(buckets.get(signature[band * self.rows:(band + 1) * self.rows].tobytes(), ()))
+        best, best_similarity = None, self.threshold
+        for position in candidates:
+            similarity = float(np.mean(self._signatures[position] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = position, similarity
+        return self._canonical_ids[best] if best is not None else None
+
+    def _register(self, chunk: Dict[str, any], signature: np.ndarray):
+        position = len(self._canonical_ids)
+        self._canonical_ids.append(chunk["id"])
+        self._signatures.append(signature)
+        for band, buckets in enumerate(self._buckets):
+            buckets.setdefault(signature[band * self.rows:(band + 1) * self.rows].tobytes(), []).append(position)
+
+    def canonical_of(self, chunk: Dict[str, any]) -> Optional[int]:
+        """
+        Identifiant du chunk canonique dont `chunk` est un quasi-doublon (chunk déjà vu), ou None
+        si `chunk` est nouveau: il devient alors lui-même canonique.
+        """
+        digest = hashlib.blake2b(" ".join(chunk["text"].lower().split()).encode("utf-8"), digest_size=16).digest()
+        canonical = self._exact.get(digest)
+        if canonical is None:
+            signature = self.hasher.signature(chunk["text"])
+            canonical = self._find_similar(signature)
+            if canonical is None:
+                self._register(chunk, signature)
+                self._exact[digest] = chunk["id"]
+                return None
+        return canonical
+
+    def deduplicate(self, chunks: Iterable[Dict[str, any]]) -> Iterator[Dict[str, any]]:
+        """
+        Produit les chunks canoniques (flux ou liste). Un doublon est ajouté aux références de son
+        chunk canonique (`references`), à rattacher aux chunks une fois le flux consommé.
+        """
+        for chunk in chunks:
+            canonical = self.canonical_of(chunk)
+            if canonical is None:
+                yield chunk
+                continue
+            self.references.setdefault(canonical, []).append(_back_reference(chunk["metadata"]))
+            self.duplicates += 1
+
+    def attach_references(self, chunks: Iterable[Dict[str, any]]):
+        """Ajoute les références des doublons à metadata["duplicates"] des chunks canoniques (en place)."""
+        for chunk in chunks:
+            references = self.references.get(chunk["id"])
+            if references:
+                chunk["metadata"].setdefault("duplicates", []).extend(references)
+
+    def log_stats(self):
+        total = len(self._canonical_ids) + self.duplicates
+        if total:
+            logging.info(f"Déduplication: {self.duplicates}/{total} chunks quasi identiques regroupés "
+                         f"({self.duplicates} embeddings évités, seuil de Jaccard {self.threshold}).")
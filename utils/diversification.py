@@ -0,0 +1,117 @@
+# utils/diversification.py
+from typing import Dict, List
+
+import numpy as np
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float,
+               duplicate_threshold: float = 1.0) -> List[int]:
+    """
+    Maximal Marginal Relevance sur une matrice de candidats (vecteurs normalisés).
+
+    À chaque étape on retient le candidat qui maximise
+    lambda * pertinence(d) - (1 - lambda) * max sim(d, déjà retenus).
+    La pertinence est celle du classement d'origine (similarité cosinus en recherche dense,
+    score RRF normalisé en recherche hybride, voir `rrf_relevance`): MMR ne remplace pas ce
+    classement, les vecteurs ne servent qu'à pénaliser la redondance.
+    La matrice de similarité des candidats est calculée une seule fois; chaque étape
+    est une opération NumPy sur le vecteur des candidats. Les candidats dont la similarité
+    à un chunk retenu atteint `duplicate_threshold` (quasi-doublons) sont écartés.
+    Retourne les positions retenues, dans l'ordre de sélection.
+    """
+    n = len(vectors)
+    if n == 0 or k <= 0:
+        return []
+    relevance = np.asarray(relevance, dtype="float32")
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < min(k, n):
+        available &= max_similarity < duplicate_threshold
+        if not available.any():
+            break
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        available[chosen] = False
+        np.maximum(max_similarity, similarity[chosen], out=max_similarity)
+    return selected
+
+
+def rrf_relevance(scores: np.ndarray) -> np.ndarray:
+    """
+    Scores RRF ramenés entre 0 et 1 (le meilleur candidat vaut 1), pour être comparables aux
+    similarités cosinus de la pénalité de redondance de MMR.
+    """
+    scores = np.asarray(scores, dtype="float32")
+    top = scores.max() if len(scores) else 0.0
+    return scores / top if top > 0 else scores
+
+
+def _append_with_overlap(text: str, end: int, next_text: str, next_start: int) -> str:
+    """
+    Concatène deux chunks consécutifs d'un même document sans répéter leur chevauchement.
+    `end` est la position (dans le document) de la fin du texte déjà fusionné.
+    """
+    if end < 0 or next_start < 0:
+        return f"{text}\n{next_text}"
+    overlap = end - next_start
+    if overlap <= 0:
+        return f"{text}\n{next_text}"
+    if overlap >= len(next_text):
+        return text # Chunk suivant entièrement contenu dans le précédent
+    return text + next_text[overlap:]
+
+
+def merge_adjacent_chunks(results: List[Dict[str, any]]) -> List[Dict[str, any]]:
+    """
+    Fusionne les résultats qui sont des chunks consécutifs d'un même document
+    (chunk_id_in_doc qui se suivent), en retirant le texte en chevauchement (CHUNK_OVERLAP).
+    Le résultat fusionné prend la place du mieux classé de ses chunks et garde son score;
+    les identifiants fusionnés sont listés dans "merged_ids".
+    """
+    by_source: Dict[str, List[int]] = {}
+    for rank, result in enumerate(results):
+        metadata = result["metadata"]
+        if metadata.get("chunk_id_in_doc", -1) >= 0:
+            by_source.setdefault(metadata.get("source"), []).append(rank)
+
+    merged_into: Dict[int, Dict[str, any]] = {}
+    absorbed = set()
+    for ranks in by_source.values():
+        if len(ranks) < 2:
+            continue
+        ranks.sort(key=lambda r: results[r]["metadata"]["chunk_id_in_doc"])
+        run = [ranks[0]]
+        for rank in ranks[1:] + [None]:
+            if rank is not None and results[rank]["metadata"]["chunk_id_in_doc"] == \
+                    results[run[-1]]["metadata"]["chunk_id_in_doc"] + 1:
+                run.append(rank)
+                continue
+            if len(run) > 1:
+                head = min(run) # Position du chunk le mieux classé de la série
+                text = results[run[0]]["text"]
+                start = results[run[0]]["metadata"].get("start_index", -1)
+                end = start + len(text) if start >= 0 else -1
+                for member in run[1:]:
+                    member_text = results[member]["text"]
+                    member_start = results[member]["metadata"].get("start_index", -1)
+                    text = _append_with_overlap(text, end, member_text, member_start)
+                    end = max(end, member_start + len(member_text)) if end >= 0 and member_start >= 0 else -1
+                metadata = {**results[run[0]]["metadata"]}
+                if "page_end" in metadata: # PDF: le résultat fusionné couvre jusqu'à la page du dernier chunk
+                    metadata["page_end"] = results[run[-1]]["metadata"].get("page_end", metadata["page_end"])
+                merged_into[head] = {
+                    **results[head],
+                    "text": text,
+                    "metadata": metadata,
+                    "merged_ids": [results[member]["id"] for member in run],
+                }
+                absorbed.update(member for member in run if member != head)
+            run = [rank]
+
+    return [merged_into.get(rank, result) for rank, result in enumerate(results) if rank not in absorbed]
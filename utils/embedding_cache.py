@@ -0,0 +1,158 @@
+# utils/embedding_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import EMBEDDING_CACHE_FILE, EMBEDDING_CACHE_MAX_ENTRIES
+
+
+class EmbeddingCache:
+    """
+    Cache persistant d'embeddings adressé par contenu.
+
+    Chaque vecteur est indexé par le couple (modèle d'embedding, hash SHA-256 du texte) :
+    un chunk inchangé n'est donc jamais ré-embeddé, quel que soit son emplacement dans le corpus.
+    Le stockage est une base SQLite locale, limitée à `max_entries` vecteurs
+    (éviction des entrées les moins récemment utilisées).
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_FILE, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " created_at REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "created_at" not in columns: # Base créée par une version précédente
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Clé de cache : hash du modèle et du texte (le texte lui-même n'est pas stocké)."""
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Retourne, pour chaque texte, son embedding en cache ou None (miss)."""
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            # SQLite limite le nombre de paramètres par requête : on interroge par paquets
+            unique_keys = list(dict.fromkeys(keys))
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype="float32").copy()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            results = [found.get(key) for key in keys]
+            hits = sum(1 for r in results if r is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def get_with_created_at(self, model: str, text: str) -> Optional[Tuple[np.ndarray, float]]:
+        """(embedding, date d'écriture en secondes epoch) d'un texte, ou None (miss)."""
+        key = self.make_key(model, text)
+        with self._lock:
+            row = self._conn.execute("SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return np.frombuffer(row[0], dtype="float32").copy(), row[1]
+
+    def delete(self, model: str, text: str):
+        key = self.make_key(model, text)
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[np.ndarray]):
+        """Ajoute (ou remplace) les embeddings des textes fournis, puis applique la limite de taille."""
+        if not texts:
+            return
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype="float32")
+            rows.append((self.make_key(model, text), model, int(vector.shape[0]), vector.tobytes(), now, now))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict_if_needed()
+            self._conn.commit()
+
+    def _evict_if_needed(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de `max_entries`."""
+        if not self.max_entries or self.max_entries <= 0:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += overflow
+            logging.info(f"Cache d'embeddings: {overflow} entrées évincées (limite: {self.max_entries}).")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def log_stats(self):
+        """Journalise les statistiques hits/misses depuis le dernier `reset_stats`."""
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0.0
+        logging.info(
+            f"Cache d'embeddings: {self.hits} hits, {self.misses} misses "
+            f"(taux de hit: {hit_rate:.1f}%), {self.evictions} évictions, {len(self)} entrées."
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
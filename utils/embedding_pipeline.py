@@ -0,0 +1,221 @@
+# utils/embedding_pipeline.py
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from mistralai.exceptions import MistralAPIException, MistralConnectionException, MistralException
+
+from .config import (
+    EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_WORKERS, EMBEDDING_REQUESTS_PER_SECOND,
+    EMBEDDING_TOKENS_PER_SECOND, EMBEDDING_MAX_RETRIES,
+    EMBEDDING_BACKOFF_BASE_SECONDS, EMBEDDING_BACKOFF_MAX_SECONDS
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière du nombre de tokens (~4 caractères par token)."""
+    return max(1, len(text) // 4)
+
+
+class RateLimiter:
+    """
+    Double seau à jetons, partagé entre threads: limite le nombre de requêtes par seconde
+    et le nombre (estimé) de tokens par seconde. Une limite à 0 est désactivée.
+    """
+
+    def __init__(self, requests_per_second: float, tokens_per_second: float):
+        self.requests_per_second = requests_per_second
+        self.tokens_per_second = tokens_per_second
+        self._request_allowance = max(1.0, requests_per_second)
+        self._token_allowance = float(tokens_per_second)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_second:
+            self._request_allowance = min(max(1.0, self.requests_per_second),
+                                          self._request_allowance + elapsed * self.requests_per_second)
+        if self.tokens_per_second:
+            self._token_allowance = min(float(self.tokens_per_second),
+                                        self._token_allowance + elapsed * self.tokens_per_second)
+
+    def acquire(self, tokens: int = 0):
+        """Bloque jusqu'à ce qu'une requête de `tokens` tokens puisse partir."""
+        # Un lot plus gros que le seau entier doit pouvoir partir (seau plein)
+        tokens = min(tokens, self.tokens_per_second) if self.tokens_per_second else 0
+        while True:
+            with self._lock:
+                self._refill()
+                request_ok = not self.requests_per_second or self._request_allowance >= 1
+                tokens_ok = not self.tokens_per_second or self._token_allowance >= tokens
+                if request_ok and tokens_ok:
+                    if self.requests_per_second:
+                        self._request_allowance -= 1
+                    if self.tokens_per_second:
+                        self._token_allowance -= tokens
+                    return
+                waits = [0.01]
+                if not request_ok:
+                    waits.append((1 - self._request_allowance) / self.requests_per_second)
+                if not tokens_ok:
+                    waits.append((tokens - self._token_allowance) / self.tokens_per_second)
+            time.sleep(max(waits))
+
+
+def is_retryable(error: Exception) -> bool:
+    """Erreurs transitoires: limitation de débit (429), erreurs serveur (5xx) et erreurs réseau."""
+    if isinstance(error, MistralAPIException):
+        return error.http_status is None or error.http_status == 429 or error.http_status >= 500
+    return isinstance(error, (MistralConnectionException, MistralException, TimeoutError, ConnectionError))
+
+
+def is_fatal(error: Exception) -> bool:
+    """Erreurs communes à tous les lots (clé refusée 401/403, modèle inconnu 404): inutile de continuer."""
+    return isinstance(error, MistralAPIException) and error.http_status in (401, 403, 404)
+
+
+def is_input_error(error: Exception) -> bool:
+    """Rejet lié au contenu du lot (texte trop long, entrée invalide): un texte fautif peut être isolé."""
+    return isinstance(error, MistralAPIException) and error.http_status in (400, 413, 422)
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Délai imposé par le serveur (en-tête Retry-After), s'il est présent."""
+    headers = getattr(error, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class EmbeddingPipeline:
+    """
+    Génération concurrente d'embeddings par lots.
+
+    Les lots sont envoyés par un pool de `max_workers` threads, sous un limiteur de débit
+    commun. Un lot en échec transitoire (429, 5xx, réseau) retourne dans une file de
+    reprise avec un délai exponentiel + jitter; un lot rejeté pour son contenu (400, 413,
+    422) est scindé en deux pour isoler le ou les textes fautifs. Une erreur qui toucherait
+    tous les lots (401, 403, 404: clé ou modèle) arrête le traitement dès le premier lot.
+    Aucun vecteur n'est inventé: les textes qui échouent sont signalés à l'appelant.
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], List[Sequence[float]]],
+                 batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_workers: int = EMBEDDING_MAX_WORKERS,
+                 requests_per_second: float = EMBEDDING_REQUESTS_PER_SECOND,
+                 tokens_per_second: float = EMBEDDING_TOKENS_PER_SECOND,
+                 max_retries: int = EMBEDDING_MAX_RETRIES,
+                 backoff_base: float = EMBEDDING_BACKOFF_BASE_SECONDS,
+                 backoff_max: float = EMBEDDING_BACKOFF_MAX_SECONDS):
+        self.embed_batch = embed_batch
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_second, tokens_per_second)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after
+        # "Full jitter": délai aléatoire entre 0 et base * 2^tentative, plafonné
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _call(self, texts: List[str]) -> np.ndarray:
+        self.rate_limiter.acquire(sum(estimate_tokens(t) for t in texts))
+        vectors = np.array(self.embed_batch(texts), dtype="float32")
+        if vectors.shape[0] != len(texts):
+            raise MistralException(f"{vectors.shape[0]} embeddings reçus pour {len(texts)} textes.")
+        return vectors
+
+    def run(self, texts: Sequence[str],
+            on_batch: Optional[Callable[[List[int], np.ndarray], None]] = None
+            ) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """
+        Embedde `texts`. `on_batch(indices, vecteurs)` est appelé à chaque lot réussi
+        (par exemple pour alimenter le cache au fil de l'eau).
+        Retourne ({indice: vecteur}, [indices en échec définitif]).
+        """
+        # File de reprise: (indices du lot, tentative, pas avant)
+        pending = deque(
+            (list(range(i, min(i + self.batch_size, len(texts)))), 0, 0.0)
+            for i in range(0, len(texts), self.batch_size)
+        )
+        embeddings: Dict[int, np.ndarray] = {}
+        failed: List[int] = []
+        completed = retried = 0
+
+        fatal_error: Optional[Exception] = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embeddings") as executor:
+            in_flight = {}
+            while (pending or in_flight) and fatal_error is None:
+                now = time.monotonic()
+                # Soumettre les lots prêts (dont le délai de reprise est écoulé)
+                for _ in range(len(pending)):
+                    if len(in_flight) >= self.max_workers:
+                        break
+                    indices, attempt, not_before = pending.popleft()
+                    if not_before > now:
+                        pending.append((indices, attempt, not_before))
+                        continue
+                    future = executor.submit(self._call, [texts[i] for i in indices])
+                    in_flight[future] = (indices, attempt)
+
+                if not in_flight:
+                    time.sleep(max(0.0, min(nb for _, _, nb in pending) - time.monotonic()))
+                    continue
+
+                done, _ = wait(list(in_flight), timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    indices, attempt = in_flight.pop(future)
+                    try:
+                        vectors = future.result()
+                    except Exception as e:
+                        if is_fatal(e):
+                            fatal_error = e
+                            break
+                        if is_retryable(e) and attempt < self.max_retries:
+                            delay = self._backoff(attempt, e)
+                            retried += 1
+                            logging.warning(f"  Lot de {len(indices)} textes en échec ({e}); "
+                                            f"nouvelle tentative {attempt + 1}/{self.max_retries} dans {delay:.1f}s.")
+                            pending.append((indices, attempt + 1, time.monotonic() + delay))
+                        elif is_input_error(e) and len(indices) > 1:
+                            # Rejet définitif d'un lot: on le scinde pour isoler le texte fautif
+                            middle = len(indices) // 2
+                            pending.append((indices[:middle], attempt, 0.0))
+                            pending.append((indices[middle:], attempt, 0.0))
+                        else:
+                            logging.error(f"  Échec définitif pour {len(indices)} texte(s) après {attempt} reprise(s): {e}")
+                            failed.extend(indices)
+                        continue
+
+                    for i, vector in zip(indices, vectors):
+                        embeddings[i] = vector
+                    if on_batch is not None:
+                        on_batch(indices, vectors)
+                    completed += 1
+                    logging.info(f"  Lot {completed} traité ({len(embeddings)}/{len(texts)} textes embeddés)")
+
+            if fatal_error is not None:
+                for future in in_flight:
+                    future.cancel()
+
+        if fatal_error is not None:
+            logging.error(f"  Erreur définitive de l'API d'embeddings ({fatal_error}): arrêt sans traiter les lots restants.")
+            failed = [i for i in range(len(texts)) if i not in embeddings]
+        if retried:
+            logging.info(f"{retried} reprise(s) de lot effectuée(s).")
+        return embeddings, sorted(failed)
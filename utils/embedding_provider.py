@@ -0,0 +1,130 @@
+# utils/embedding_provider.py
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import numpy as np
+from mistralai.client import MistralClient
+
+from .config import (
+    MISTRAL_API_KEY, EMBEDDING_MODEL, EMBEDDING_BACKEND,
+    LOCAL_EMBEDDING_MODEL, LOCAL_EMBEDDING_DEVICE, LOCAL_EMBEDDING_BATCH_SIZE, LOCAL_EMBEDDING_THREADS,
+    LOCAL_EMBEDDING_QUERY_PREFIX, LOCAL_EMBEDDING_DOCUMENT_PREFIX,
+    QUERY_EMBEDDING_TIMEOUT_SECONDS, QUERY_EMBEDDING_MAX_RETRIES
+)
+
+EMBEDDING_BACKENDS = ("mistral", "local")
+
+
+class EmbeddingProvider(ABC):
+    """
+    Source d'embeddings (API distante ou modèle local).
+
+    `model_name` identifie les vecteurs produits: il sert de clé au cache d'embeddings et
+    est enregistré dans le manifeste des snapshots. Les vecteurs retournés ne sont pas
+    normalisés; c'est l'appelant qui normalise avant l'indexation ou la recherche.
+    """
+
+    model_name: str
+    remote: bool # True: appels réseau, soumis à limitation de débit et reprises
+
+    @abstractmethod
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Embeddings (float32, shape (n, d)) de textes à indexer."""
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """Embeddings de requêtes (identiques aux documents sauf pour les modèles asymétriques)."""
+        return self.embed_documents(texts)
+
+    def is_available(self) -> Optional[str]:
+        """None si le fournisseur est utilisable, sinon la raison de l'indisponibilité."""
+        return None
+
+
+class MistralEmbeddingProvider(EmbeddingProvider):
+    """Embeddings via l'API Mistral (`mistral-embed`)."""
+
+    remote = True
+
+    def __init__(self, model: str = EMBEDDING_MODEL, api_key: Optional[str] = MISTRAL_API_KEY,
+                 max_retries: Optional[int] = None, timeout: Optional[int] = None):
+        self.model_name = model
+        self.api_key = api_key
+        # max_retries=1: pas de reprises internes au SDK (le pipeline d'indexation gère débit et reprises)
+        client_options = {"max_retries": max_retries, "timeout": timeout}
+        self.client = MistralClient(api_key=api_key, **{k: v for k, v in client_options.items() if v is not None})
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        response = self.client.embeddings(model=self.model_name, input=texts)
+        return np.array([data.embedding for data in response.data], dtype="float32")
+
+    def is_available(self) -> Optional[str]:
+        return None if self.api_key else "MISTRAL_API_KEY manquante"
+
+
+class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
+    """
+    Embeddings calculés localement (CPU par défaut) avec sentence-transformers: pas d'appel
+    réseau, l'indexation peut tourner hors ligne. L'inférence est faite par lots; le nombre
+    de threads de calcul de PyTorch est réglable (LOCAL_EMBEDDING_THREADS).
+    """
+
+    remote = False
+
+    def __init__(self, model: str = LOCAL_EMBEDDING_MODEL, device: str = LOCAL_EMBEDDING_DEVICE,
+                 batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE, num_threads: int = LOCAL_EMBEDDING_THREADS,
+                 query_prefix: str = LOCAL_EMBEDDING_QUERY_PREFIX,
+                 document_prefix: str = LOCAL_EMBEDDING_DOCUMENT_PREFIX):
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("Le backend d'embeddings local nécessite sentence-transformers "
+                              "(pip install sentence-transformers).") from e
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        logging.info(f"Chargement du modèle d'embeddings local {model} ({device})...")
+        self.model = SentenceTransformer(model, device=device)
+        self.model_name = model
+        self.batch_size = batch_size
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        # Un seul encodage à la fois: PyTorch parallélise déjà chaque lot sur les threads configurés
+        self._lock = threading.Lock()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            vectors = self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                        normalize_embeddings=False, show_progress_bar=False)
+        return np.asarray(vectors, dtype="float32")
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        return self._encode([self.document_prefix + text for text in texts])
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        return self._encode([self.query_prefix + text for text in texts])
+
+
+_local_providers: Dict[str, SentenceTransformerEmbeddingProvider] = {}
+_local_lock = threading.Lock()
+
+
+def get_embedding_provider(backend: str = EMBEDDING_BACKEND, for_indexing: bool = False) -> EmbeddingProvider:
+    """
+    Fournisseur d'embeddings du backend configuré. Pour Mistral, les reprises internes du SDK
+    sont désactivées: à l'indexation, le pipeline gère débit et reprises; pour les requêtes, un
+    délai court (QUERY_EMBEDDING_TIMEOUT_SECONDS) laisse la recherche basculer vite sur BM25.
+    Un modèle local n'est chargé qu'une fois par processus.
+    """
+    if backend == "mistral":
+        if for_indexing:
+            return MistralEmbeddingProvider(max_retries=1)
+        return MistralEmbeddingProvider(max_retries=QUERY_EMBEDDING_MAX_RETRIES, timeout=QUERY_EMBEDDING_TIMEOUT_SECONDS)
+    if backend == "local":
+        with _local_lock:
+            if LOCAL_EMBEDDING_MODEL not in _local_providers:
+                _local_providers[LOCAL_EMBEDDING_MODEL] = SentenceTransformerEmbeddingProvider()
+            return _local_providers[LOCAL_EMBEDDING_MODEL]
+    raise ValueError(f"Backend d'embeddings inconnu: {backend}. Backends possibles: {', '.join(EMBEDDING_BACKENDS)}")
@@ -0,0 +1,286 @@
+# utils/index_factory.py
+import os
+import json
+import time
+import logging
+from typing import Callable, List, Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from .config import (
+    INDEX_TYPE, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH,
+    IVF_NLIST, IVF_NPROBE, PQ_M, PQ_NBITS
+)
+
+INDEX_TYPES = ("flat", "sq8", "fp16", "hnsw", "ivf", "ivfpq")
+# Types dont les vecteurs stockés sont approchés (scores à re-calculer pour être exacts)
+QUANTIZED_INDEX_TYPES = ("sq8", "fp16", "ivfpq")
+# Types à entraîner sur un échantillon de vecteurs avant tout ajout
+TRAINED_INDEX_TYPES = ("sq8", "ivf", "ivfpq")
+# Types réellement memory-mappés par IO_FLAG_MMAP (faiss-cpu 1.10): seules les listes inversées
+# des IVF le sont; flat, hnsw, sq8 et fp16 sont lus entièrement en mémoire malgré le drapeau
+MMAP_INDEX_TYPES = ("ivf", "ivfpq")
+
+
+def supports_mmap(params: Dict[str, any]) -> bool:
+    """L'index est-il servi depuis le cache de pages du système (sans copie) quand il est chargé en mmap?"""
+    return params.get("index_type") in MMAP_INDEX_TYPES
+
+
+def default_index_params(index_type: str = INDEX_TYPE) -> Dict[str, any]:
+    """Paramètres de construction et de recherche issus de la configuration pour un type d'index."""
+    params = {"index_type": index_type}
+    if index_type == "hnsw":
+        params.update(m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH)
+    elif index_type in ("ivf", "ivfpq"):
+        params.update(nlist=IVF_NLIST, nprobe=IVF_NPROBE)
+        if index_type == "ivfpq":
+            params.update(pq_m=PQ_M, pq_nbits=PQ_NBITS)
+    elif index_type not in ("flat", "sq8", "fp16"):
+        raise ValueError(f"Type d'index inconnu: {index_type}. Types possibles: {', '.join(INDEX_TYPES)}")
+    return params
+
+
+def _adapt_params(params: Dict[str, any], dimension: int, n_vectors: Optional[int]) -> Dict[str, any]:
+    """
+    Ajuste les paramètres à la taille du corpus: un IVF a besoin d'environ 39 vecteurs
+    d'entraînement par liste, un PQ de 2^nbits vecteurs. Si le corpus est trop petit,
+    on revient à un index exact.
+    """
+    params = dict(params)
+    index_type = params["index_type"]
+    if index_type not in ("ivf", "ivfpq") or n_vectors is None:
+        return params
+
+    if index_type == "ivfpq":
+        if n_vectors < 2 ** params["pq_nbits"] or dimension % params["pq_m"] != 0:
+            logging.warning(f"IVF-PQ impossible ({n_vectors} vecteurs, dimension {dimension}, pq_m={params['pq_m']}): "
+                            "utilisation d'un index exact (flat).")
+            return {"index_type": "flat"}
+
+    nlist = max(1, min(params["nlist"], n_vectors // 39))
+    if nlist != params["nlist"]:
+        logging.info(f"nlist ramené de {params['nlist']} à {nlist} pour {n_vectors} vecteurs.")
+        params["nlist"] = nlist
+    params["nprobe"] = min(params["nprobe"], nlist)
+    return params
+
+
+def create_index(dimension: int, params: Optional[Dict[str, any]] = None,
+                 n_vectors: Optional[int] = None) -> Tuple[faiss.Index, Dict[str, any]]:
+    """
+    Crée un index cosinus (produit scalaire sur vecteurs normalisés), adressé par
+    identifiants stables. Retourne l'index et les paramètres effectifs.
+    Les index IVF doivent ensuite être entraînés avec `train_index`.
+    """
+    params = _adapt_params(params or default_index_params(), dimension, n_vectors)
+    index_type = params["index_type"]
+
+    if index_type == "flat":
+        base = faiss.IndexFlatIP(dimension)
+    elif index_type in ("sq8", "fp16"):
+        # 1 octet (sq8, entraîné sur les bornes de chaque dimension) ou 2 octets (fp16) par composante au lieu de 4
+        quantizer_type = faiss.ScalarQuantizer.QT_8bit if index_type == "sq8" else faiss.ScalarQuantizer.QT_fp16
+        base = faiss.IndexScalarQuantizer(dimension, quantizer_type, faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dimension, params["m"], faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = params["ef_construction"]
+    elif index_type == "ivf":
+        quantizer = faiss.IndexFlatIP(dimension)
+        base = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "ivfpq":
+        quantizer = faiss.IndexFlatIP(dimension)
+        base = faiss.IndexIVFPQ(quantizer, dimension, params["nlist"], params["pq_m"],
+                                params["pq_nbits"], faiss.METRIC_INNER_PRODUCT)
+    else:
+        raise ValueError(f"Type d'index inconnu: {index_type}. Types possibles: {', '.join(INDEX_TYPES)}")
+
+    if isinstance(base, faiss.IndexIVF):
+        # Les IVF gèrent nativement les identifiants; IndexIDMap2 y corromprait les suppressions.
+        # La table de hachage permet reconstruct() et remove_ids() par identifiant.
+        base.set_direct_map_type(faiss.DirectMap.Hashtable)
+        index = base
+    else:
+        index = faiss.IndexIDMap2(base)
+    apply_search_params(index, params)
+    return index, params
+
+
+def train_index(index: faiss.Index, vectors: np.ndarray):
+    """Entraîne l'index si nécessaire (quantifieur IVF / codebooks PQ)."""
+    if not index.is_trained:
+        logging.info(f"Entraînement de l'index Faiss sur {vectors.shape[0]} vecteurs...")
+        index.train(vectors)
+
+
+def is_id_addressable(index: faiss.Index) -> bool:
+    """Vrai si l'index est adressé par identifiants stables (IndexIDMap2 ou IVF à table de hachage)."""
+    return isinstance(index, faiss.IndexIDMap2) or (
+        isinstance(index, faiss.IndexIVF) and index.direct_map.type == faiss.DirectMap.Hashtable
+    )
+
+
+def _base_index(index: faiss.Index) -> faiss.Index:
+    """Index sous-jacent à un IndexIDMap2 (downcasté vers son type concret)."""
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def apply_search_params(index: faiss.Index, params: Dict[str, any]):
+    """Applique les paramètres de recherche (efSearch pour HNSW, nprobe pour IVF)."""
+    base = _base_index(index)
+    if "ef_search" in params and isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = params["ef_search"]
+    if "nprobe" in params and isinstance(base, faiss.IndexIVF):
+        base.nprobe = params["nprobe"]
+
+
+def search_parameters(index: faiss.Index, params: Dict[str, any],
+                      selector: Optional[faiss.IDSelector] = None) -> faiss.SearchParameters:
+    """
+    Paramètres de recherche par appel (sélecteur d'identifiants + efSearch / nprobe),
+    sans modifier l'état partagé de l'index.
+    """
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=params.get("ef_search", base.hnsw.efSearch))
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=params.get("nprobe", base.nprobe))
+    return faiss.SearchParameters(sel=selector)
+
+
+def is_exact(index: faiss.Index) -> bool:
+    """Vrai si la recherche est exhaustive (index flat)."""
+    return isinstance(_base_index(index), faiss.IndexFlat)
+
+
+def exact_search_ids(index: faiss.Index, queries: np.ndarray, ids: np.ndarray,
+                     k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Recherche exhaustive restreinte à `ids` (vecteurs reconstruits depuis l'index).
+    Sert de repli quand un index approché (HNSW, IVF) rend moins de k résultats filtrés.
+    """
+    ids = np.ascontiguousarray(ids, dtype="int64")
+    scores = np.full((queries.shape[0], k), -np.inf, dtype="float32")
+    found = np.full((queries.shape[0], k), -1, dtype="int64")
+    if not len(ids):
+        return scores, found
+    similarities = queries @ index.reconstruct_batch(ids).T
+    n = min(k, len(ids))
+    for row in range(queries.shape[0]):
+        top = np.argpartition(-similarities[row], n - 1)[:n]
+        top = top[np.argsort(-similarities[row][top])]
+        scores[row, :n] = similarities[row][top]
+        found[row, :n] = ids[top]
+    return scores, found
+
+
+def is_quantized(params: Dict[str, any]) -> bool:
+    """Vrai si l'index stocke des vecteurs approchés (les scores gagnent à être re-calculés)."""
+    return params.get("index_type") in QUANTIZED_INDEX_TYPES
+
+
+def rescore_exact(queries: np.ndarray, candidate_ids: np.ndarray, k: int,
+                  lookup: Callable[[np.ndarray], np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Re-score exact des candidats d'un index quantifié: `lookup(ids)` fournit les vecteurs
+    pleine précision; retourne les k meilleurs (scores, identifiants) par requête.
+    """
+    scores = np.full((queries.shape[0], k), -np.inf, dtype="float32")
+    found = np.full((queries.shape[0], k), -1, dtype="int64")
+    for row in range(queries.shape[0]):
+        ids = candidate_ids[row][candidate_ids[row] >= 0]
+        if not len(ids):
+            continue
+        similarities = np.asarray(lookup(ids), dtype="float32") @ queries[row]
+        order = np.argsort(-similarities)[:k]
+        scores[row, :len(order)] = similarities[order]
+        found[row, :len(order)] = ids[order]
+    return scores, found
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """HNSW ne sait pas retirer de vecteurs: il faut reconstruire l'index."""
+    return not isinstance(_base_index(index), faiss.IndexHNSW)
+
+
+def remove_ids(index: faiss.Index, ids: np.ndarray) -> int:
+    """Retire des identifiants de l'index (un IVF à table de hachage n'accepte que IDSelectorArray)."""
+    ids = np.ascontiguousarray(ids, dtype="int64")
+    if isinstance(index, faiss.IndexIVF):
+        return index.remove_ids(faiss.IDSelectorArray(ids))
+    return index.remove_ids(faiss.IDSelectorBatch(ids))
+
+
+def save_index_params(params: Dict[str, any], path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_index_params(path: str) -> Dict[str, any]:
+    """Paramètres persistés avec l'index (index exact par défaut pour les anciens index)."""
+    if not os.path.exists(path):
+        return {"index_type": "flat"}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ============================================================
+# Comparaison rappel / latence
+
+def compare_index_configs(vectors: np.ndarray, queries: np.ndarray, configs: List[Dict[str, any]],
+                          k: int = 5) -> List[Dict[str, any]]:
+    """
+    Compare des configurations d'index à la référence exacte (flat) sur les mêmes requêtes.
+    Les vecteurs et requêtes doivent être normalisés. Pour chaque configuration, retourne le
+    rappel@k par rapport à la référence, la latence moyenne par requête, le temps de
+    construction et la taille sérialisée de l'index.
+    Une clé "rescore_factor" dans une configuration active le re-score exact de k * facteur
+    candidats à partir des vecteurs pleine précision (comme VectorStoreManager).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    ids = np.arange(vectors.shape[0], dtype="int64")
+    k = min(k, vectors.shape[0])
+    reference_ids = None
+    reports = []
+
+    for config in [{"index_type": "flat"}] + list(configs):
+        config = dict(config)
+        rescore_factor = config.pop("rescore_factor", None)
+        start = time.perf_counter()
+        index, effective = create_index(vectors.shape[1], config, n_vectors=vectors.shape[0])
+        train_index(index, vectors)
+        index.add_with_ids(vectors, ids)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        # Requêtes unitaires, comme en production
+        if rescore_factor:
+            found_ids = np.vstack([
+                rescore_exact(queries[row:row + 1], index.search(queries[row:row + 1], k * rescore_factor)[1],
+                              k, lambda ids: vectors[ids])[1]
+                for row in range(queries.shape[0])
+            ])
+        else:
+            found_ids = np.vstack([index.search(queries[row:row + 1], k)[1] for row in range(queries.shape[0])])
+        latency_ms = (time.perf_counter() - start) / queries.shape[0] * 1000
+
+        if reference_ids is None:
+            reference_ids = found_ids
+        recall = np.mean([
+            len(set(found_ids[row]) & set(reference_ids[row])) / k for row in range(queries.shape[0])
+        ])
+        reports.append({
+            **effective,
+            "rescore_factor": rescore_factor,
+            "recall_at_k": float(recall),
+            "latency_ms": latency_ms,
+            "build_seconds": build_seconds,
+            "index_bytes": int(faiss.serialize_index(index).nbytes),
+        })
+    return reports
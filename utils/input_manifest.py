@@ -0,0 +1,97 @@
+# utils/input_manifest.py
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .config import INPUT_MANIFEST_FILE
+
+# Extensions prises en charge par load_and_parse_files
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt", ".csv", ".xlsx", ".xls"}
+
+
+def _hash_file(file_path: Path, block_size: int = 1 << 20) -> str:
+    """Calcule le SHA-256 du contenu d'un fichier, lu par blocs."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_input_files(input_dir: str, previous: Optional[Dict[str, any]] = None) -> Dict[str, any]:
+    """
+    Construit le manifeste des fichiers d'entrée: {chemin relatif: {size, mtime_ns, sha256}}.
+    Le hash d'un fichier dont la taille et la date de modification n'ont pas changé
+    depuis `previous` est réutilisé sans relire le fichier.
+    """
+    input_path = Path(input_dir)
+    previous_files = (previous or {}).get("files", {})
+    files = {}
+    for file_path in sorted(input_path.rglob("*.*")):
+        if not file_path.is_file() or file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+            continue
+        relative_path = str(file_path.relative_to(input_path))
+        stat = file_path.stat()
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+        old_entry = previous_files.get(relative_path)
+        if old_entry and old_entry["size"] == entry["size"] and old_entry["mtime_ns"] == entry["mtime_ns"]:
+            entry["sha256"] = old_entry["sha256"]
+        else:
+            entry["sha256"] = _hash_file(file_path)
+        files[relative_path] = entry
+
+    return {"input_dir": str(input_path.resolve()), "files": files}
+
+
+def diff_manifests(previous: Dict[str, any], current: Dict[str, any]) -> Dict[str, List[str]]:
+    """
+    Compare deux manifestes et retourne les chemins relatifs ajoutés, modifiés et supprimés.
+    Un fichier simplement "touché" (même contenu) n'est pas considéré comme modifié.
+    """
+    old_files = previous.get("files", {})
+    new_files = current.get("files", {})
+    return {
+        "added": sorted(path for path in new_files if path not in old_files),
+        "modified": sorted(
+            path for path in new_files
+            if path in old_files and new_files[path]["sha256"] != old_files[path]["sha256"]
+        ),
+        "deleted": sorted(path for path in old_files if path not in new_files),
+    }
+
+
+def exclude_files(manifest: Dict[str, any], paths: Iterable[str]) -> Dict[str, any]:
+    """
+    Retire des fichiers du manifeste (ex. fichiers dont le parsing a échoué): absents du
+    manifeste enregistré, ils seront vus comme ajoutés, donc retraités, à la prochaine indexation.
+    """
+    paths = set(paths)
+    if not paths:
+        return manifest
+    return {**manifest, "files": {path: entry for path, entry in manifest["files"].items() if path not in paths}}
+
+
+def load_manifest(path: str = INPUT_MANIFEST_FILE) -> Optional[Dict[str, any]]:
+    """Charge le manifeste des entrées, ou None s'il est absent ou illisible."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Manifeste des entrées illisible ({path}): {e}. Il sera reconstruit.")
+        return None
+
+
+def save_manifest(manifest: Dict[str, any], path: str = INPUT_MANIFEST_FILE):
+    """Écrit le manifeste de façon atomique (fichier temporaire puis renommage)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    logging.info(f"Manifeste des entrées sauvegardé ({len(manifest['files'])} fichiers) dans {path}.")
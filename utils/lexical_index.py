@@ -0,0 +1,139 @@
+# utils/lexical_index.py
+import os
+import re
+import logging
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .config import BM25_K1, BM25_B
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens en minuscules, sans accents ("Jokić" -> "jokic"), pour l'index lexical."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _TOKEN_PATTERN.findall(text)
+
+
+class BM25Index:
+    """
+    Index inversé BM25, calculé entièrement en local.
+
+    Les listes de postings sont stockées au format CSR (indptr / positions / fréquences):
+    la recherche accumule les scores des termes de la requête avec NumPy, sans appel réseau.
+    Les positions renvoient aux identifiants stables des chunks via `doc_ids`.
+    """
+
+    def __init__(self, terms: Dict[str, int], indptr: np.ndarray, postings: np.ndarray,
+                 frequencies: np.ndarray, doc_ids: np.ndarray, doc_lengths: np.ndarray,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.terms = terms
+        self.indptr = indptr
+        self.postings = postings
+        self.frequencies = frequencies
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        n_docs = len(doc_ids)
+        self.avg_doc_length = float(doc_lengths.mean()) if n_docs else 0.0
+        document_frequency = np.diff(indptr)
+        self.idf = np.log(1 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5)).astype("float32")
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[int, str]]) -> "BM25Index":
+        """Construit l'index à partir de couples (identifiant du chunk, texte)."""
+        term_postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_ids, doc_lengths = [], []
+        for position, (doc_id, text) in enumerate(documents):
+            tokens = tokenize(text)
+            doc_ids.append(doc_id)
+            doc_lengths.append(len(tokens))
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                term_postings.setdefault(token, []).append((position, count))
+
+        terms = {term: i for i, term in enumerate(sorted(term_postings))}
+        indptr = np.zeros(len(terms) + 1, dtype="int64")
+        postings, frequencies = [], []
+        for term, i in terms.items():
+            entries = term_postings[term]
+            indptr[i + 1] = indptr[i] + len(entries)
+            postings.extend(position for position, _ in entries)
+            frequencies.extend(count for _, count in entries)
+
+        index = cls(terms, indptr, np.array(postings, dtype="int32"), np.array(frequencies, dtype="float32"),
+                    np.array(doc_ids, dtype="int64"), np.array(doc_lengths, dtype="float32"))
+        logging.info(f"Index lexical BM25 construit: {len(doc_ids)} chunks, {len(terms)} termes.")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def search(self, query_text: str, k: int, allowed_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Retourne les k meilleurs (identifiant du chunk, score BM25), par score décroissant,
+        éventuellement restreints aux identifiants `allowed_ids`.
+        """
+        if not len(self.doc_ids):
+            return []
+        scores = np.zeros(len(self.doc_ids), dtype="float32")
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.avg_doc_length, 1e-9))
+        for token in set(tokenize(query_text)):
+            term = self.terms.get(token)
+            if term is None:
+                continue
+            start, end = self.indptr[term], self.indptr[term + 1]
+            positions = self.postings[start:end]
+            tf = self.frequencies[start:end]
+            scores[positions] += self.idf[term] * tf * (self.k1 + 1) / (tf + length_norm[positions])
+
+        if allowed_ids is not None:
+            scores[~np.isin(self.doc_ids, allowed_ids)] = 0
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        k = min(k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.doc_ids[p]), float(scores[p])) for p in top]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            terms=np.array(sorted(self.terms, key=self.terms.get), dtype=str),
+            indptr=self.indptr, postings=self.postings, frequencies=self.frequencies,
+            doc_ids=self.doc_ids, doc_lengths=self.doc_lengths,
+            params=np.array([self.k1, self.b], dtype="float64"),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            terms = {str(term): i for i, term in enumerate(data["terms"])}
+            k1, b = data["params"]
+            return cls(terms, data["indptr"], data["postings"], data["frequencies"],
+                       data["doc_ids"], data["doc_lengths"], k1=float(k1), b=float(b))
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], rrf_k: int) -> List[Tuple[int, float]]:
+    """
+    Fusionne plusieurs classements d'identifiants: score(d) = somme des 1 / (rrf_k + rang).
+    Retourne les identifiants par score fusionné décroissant.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,131 @@
+# utils/metadata_filter.py
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+
+from .config import METADATA_FILTER_FIELDS
+
+# Filtre structuré: {champ: valeur} ou {champ: [valeurs...]}
+# Les valeurs d'un même champ sont combinées en OU, les champs entre eux en ET.
+Where = Dict[str, Union[str, List[str]]]
+
+
+class MetadataIndex:
+    """
+    Index inversé métadonnée -> identifiants de chunks, sous forme de bitmaps précalculés.
+
+    Chaque couple (champ, valeur) a son bitmap compacté (1 bit par identifiant de chunk,
+    ordre des bits "little", le format attendu par `faiss.IDSelectorBitmap`). Un filtre
+    `where` se résout par quelques OU / ET bit à bit, sans parcourir les chunks.
+    """
+
+    def __init__(self, bitmaps: Dict[Tuple[str, str], np.ndarray], n_ids: int,
+                 fields: Tuple[str, ...] = METADATA_FILTER_FIELDS):
+        self.bitmaps = bitmaps
+        self.n_ids = n_ids
+        self.fields = fields
+        self.n_bytes = (n_ids + 7) // 8
+
+    @classmethod
+    def build(cls, chunks: Iterable[Dict[str, any]], fields: Tuple[str, ...] = METADATA_FILTER_FIELDS) -> "MetadataIndex":
+        """
+        Construit les bitmaps à partir des chunks (dictionnaires id/text/metadata). Un chunk
+        canonique est aussi indexé sous les valeurs de ses quasi-doublons (metadata["duplicates"]).
+        """
+        ids_by_value: Dict[Tuple[str, str], List[int]] = {}
+        max_id = -1
+        for chunk in chunks:
+            chunk_id = int(chunk["id"])
+            max_id = max(max_id, chunk_id)
+            for key in set(_field_values(chunk["metadata"], fields)):
+                ids_by_value.setdefault(key, []).append(chunk_id)
+        return cls._from_ids(ids_by_value, max_id + 1, fields)
+
+    @classmethod
+    def from_chunk_store(cls, store, fields: Tuple[str, ...] = METADATA_FILTER_FIELDS) -> "MetadataIndex":
+        """
+        Construit les bitmaps d'un ChunkStore à partir de sa table de documents et de ses colonnes
+        (doc_index, ids), sans matérialiser les chunks ni lire leurs textes.
+        """
+        ids = np.asarray(store.ids)
+        doc_index = np.asarray(store.doc_index)
+        docs_by_value: Dict[Tuple[str, str], List[int]] = {}
+        for position, metadata in enumerate(store.documents):
+            for key in set(_field_values(metadata, fields)):
+                docs_by_value.setdefault(key, []).append(position)
+
+        ids_by_value: Dict[Tuple[str, str], np.ndarray] = {}
+        for key, positions in docs_by_value.items():
+            selected = np.zeros(len(store.documents), dtype=bool)
+            selected[positions] = True
+            ids_by_value[key] = ids[selected[doc_index]]
+        for field in fields:
+            column = store.columns.get(field)
+            if column is not None: # Champ stocké par chunk (colonne numérique)
+                column = np.asarray(column)
+                for value in np.unique(column[column >= 0]):
+                    ids_by_value[(field, str(int(value)))] = ids[column == value]
+        return cls._from_ids(ids_by_value, int(ids[-1]) + 1 if len(ids) else 0, fields)
+
+    @classmethod
+    def _from_ids(cls, ids_by_value: Dict[Tuple[str, str], Iterable[int]], n_ids: int,
+                  fields: Tuple[str, ...]) -> "MetadataIndex":
+        bitmaps = {}
+        for key, ids in ids_by_value.items():
+            mask = np.zeros(n_ids, dtype=bool)
+            mask[ids] = True
+            bitmaps[key] = np.packbits(mask, bitorder="little")
+        logging.info(f"Index des métadonnées construit: {len(bitmaps)} valeurs filtrables sur {len(fields)} champs.")
+        return cls(bitmaps, n_ids, fields)
+
+    def values(self, field: str) -> List[str]:
+        """Valeurs connues d'un champ filtrable (utile pour proposer des filtres dans l'interface)."""
+        return sorted(value for name, value in self.bitmaps if name == field)
+
+    def bitmap(self, where: Where) -> np.ndarray:
+        """Bitmap compacté des identifiants qui satisfont le filtre."""
+        validate_where(where, self.fields)
+        result = np.full(self.n_bytes, 0xFF, dtype=np.uint8)
+        for field, accepted in where.items():
+            accepted = [accepted] if isinstance(accepted, (str, int, float)) else list(accepted)
+            field_bitmap = np.zeros(self.n_bytes, dtype=np.uint8)
+            for value in accepted:
+                value_bitmap = self.bitmaps.get((field, str(value)))
+                if value_bitmap is not None:
+                    np.bitwise_or(field_bitmap, value_bitmap, out=field_bitmap)
+            np.bitwise_and(result, field_bitmap, out=result)
+        return result
+
+    def matching_ids(self, where: Where) -> np.ndarray:
+        """Identifiants (triés) des chunks qui satisfont le filtre."""
+        mask = np.unpackbits(self.bitmap(where), count=self.n_ids, bitorder="little").astype(bool)
+        return np.flatnonzero(mask).astype("int64")
+
+
+def validate_where(where: Where, fields: Tuple[str, ...] = METADATA_FILTER_FIELDS):
+    """Lève ValueError si le filtre porte sur un champ non filtrable (absent de METADATA_FILTER_FIELDS)."""
+    for field in where:
+        if field not in fields:
+            raise ValueError(f"Champ de filtre inconnu: {field}. Champs possibles: {', '.join(fields)}")
+
+
+def _field_values(metadata: Dict[str, any], fields: Tuple[str, ...]) -> Iterator[Tuple[str, str]]:
+    """
+    Couples (champ, valeur) filtrables d'un chunk, y compris ceux des quasi-doublons regroupés
+    sur lui (metadata["duplicates"]): un filtre sur la source d'un doublon retrouve son contenu.
+    """
+    for entry in (metadata, *metadata.get("duplicates", ())):
+        for field in fields:
+            value = entry.get(field)
+            if value is not None:
+                yield field, str(value)
+
+
+def make_id_selector(bitmap: np.ndarray) -> faiss.IDSelector:
+    """
+    Sélecteur Faiss sur un bitmap compacté. Le sélecteur ne copie pas le bitmap:
+    l'appelant doit garder une référence à `bitmap` pendant toute la recherche.
+    """
+    return faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
@@ -0,0 +1,90 @@
+# utils/micro_batcher.py
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Tuple
+
+_STOP = object() # Sentinelle de fermeture déposée dans la file
+
+
+class MicroBatcher:
+    """
+    Regroupe des appels unitaires concurrents en lots.
+
+    Chaque `submit` dépose sa requête dans une file; un thread de fond attend au plus
+    `max_wait_ms` après la première requête (ou `max_batch_size` requêtes) puis appelle
+    `batch_fn` une seule fois sur le lot. `batch_fn` reçoit la liste des requêtes et doit
+    retourner la liste des résultats dans le même ordre.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0, name: str = "micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Tuple[Any, Future]]" = queue.Queue()
+        self._closed = False
+        self._stopping = False
+        self._close_lock = threading.Lock() # Garantit qu'aucune requête n'est déposée après la sentinelle
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def submit(self, request: Any, timeout: float = None) -> Any:
+        """Soumet une requête et attend son résultat (appel bloquant, sûr entre threads)."""
+        future: Future = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("Micro-batcher fermé.")
+            self._queue.put((request, future))
+        return future.result(timeout=timeout)
+
+    def close(self):
+        """
+        Arrête le thread de fond. Les requêtes déjà soumises sont traitées avant l'arrêt;
+        les soumissions suivantes sont refusées.
+        """
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put((_STOP, None))
+
+    def _collect_batch(self) -> List[Tuple[Any, Future]]:
+        batch = []
+        item = self._queue.get() # Bloque jusqu'à la première requête
+        deadline = time.monotonic() + self.max_wait
+        while item[0] is not _STOP:
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.max_batch_size or remaining <= 0:
+                return batch
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch
+        self._stopping = True
+        return batch
+
+    def _run(self):
+        while not self._stopping:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            requests = [request for request, _ in batch]
+            try:
+                results = self.batch_fn(requests)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{len(results)} résultats pour {len(batch)} requêtes.")
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logging.error(f"Erreur lors du traitement d'un lot de {len(batch)} requêtes: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
@@ -0,0 +1,105 @@
+# utils/ocr_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional, Sequence
+
+from .config import OCR_CACHE_FILE, OCR_CACHE_MAX_ENTRIES
+
+
+class OCRPageCache:
+    """
+    Cache persistant du texte OCR des pages de PDF, adressé par contenu.
+
+    La clé combine le hash de l'image rendue de la page, les langues OCR et l'échelle de
+    rendu: une page déjà lue n'est jamais ré-OCRisée, même si le PDF a été renommé ou
+    modifié ailleurs. Base SQLite locale (mode WAL, partageable entre les processus de
+    parsing), limitée à `max_entries` pages (éviction des moins récemment utilisées).
+    """
+
+    def __init__(self, path: str = OCR_CACHE_FILE, max_entries: int = OCR_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_pages ("
+            " key TEXT PRIMARY KEY,"
+            " text TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_pages_last_used ON ocr_pages(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(image_bytes: bytes, languages: Sequence[str], scale: float) -> str:
+        """Clé de cache: hash de l'image rendue, des langues OCR et de l'échelle de rendu."""
+        digest = hashlib.sha256(image_bytes)
+        digest.update(f"\x00{','.join(languages)}\x00{scale:.3f}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Texte OCR de la page, ou None si la page n'a jamais été lue."""
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM ocr_pages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE ocr_pages SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_pages (key, text, last_used) VALUES (?, ?, ?)",
+                (key, text, time.time())
+            )
+            self._evict_if_needed()
+            self._conn.commit()
+
+    def _evict_if_needed(self):
+        """Supprime les pages les moins récemment utilisées au-delà de `max_entries`."""
+        if not self.max_entries or self.max_entries <= 0:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM ocr_pages").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM ocr_pages WHERE key IN "
+                "(SELECT key FROM ocr_pages ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            logging.info(f"Cache OCR: {overflow} pages évincées (limite: {self.max_entries}).")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ocr_pages").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[OCRPageCache] = None
+_cache_pid: Optional[int] = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> OCRPageCache:
+    """Cache OCR du processus (une connexion SQLite par processus de parsing)."""
+    global _cache, _cache_pid
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = OCRPageCache()
+            _cache_pid = os.getpid()
+        return _cache
@@ -0,0 +1,114 @@
+# utils/query_cache.py
+import re
+import time
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .embedding_cache import EmbeddingCache
+
+
+def normalize_query(query_text: str) -> str:
+    """
+    Normalise une question pour le cache: minuscules, ponctuation retirée, espaces compactés.
+    "Qui est le meilleur joueur ?" et "qui est le meilleur  joueur" donnent la même clé.
+    """
+    text = unicodedata.normalize("NFKC", query_text).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache:
+    """
+    Cache LRU borné, avec durée de vie (TTL), des embeddings normalisés de requêtes.
+
+    Optionnellement adossé à un EmbeddingCache persistant pour survivre aux redémarrages,
+    dans un fichier distinct de celui des documents (QUERY_CACHE_FILE): les requêtes n'y
+    évincent pas d'embeddings de documents. La date d'écriture y est conservée, et le TTL
+    s'applique aussi aux entrées relues du disque.
+    """
+
+    def __init__(self, model: str, max_entries: int, ttl_seconds: float,
+                 persistent_cache: Optional[EmbeddingCache] = None):
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent_cache = persistent_cache
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    @property
+    def _persistent_namespace(self) -> str:
+        return f"{self.model}:query"
+
+    def get(self, query_text: str) -> Optional[np.ndarray]:
+        """Retourne l'embedding normalisé de la requête, ou None s'il est absent ou expiré."""
+        key = normalize_query(query_text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, vector = entry
+                if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+
+        if self.persistent_cache is not None:
+            entry = self.persistent_cache.get_with_created_at(self._persistent_namespace, key)
+            if entry is not None:
+                vector, written_at = entry
+                age = max(0.0, time.time() - written_at)
+                if self.ttl_seconds and age > self.ttl_seconds:
+                    self.persistent_cache.delete(self._persistent_namespace, key)
+                else:
+                    # L'entrée garde son âge réel en mémoire: elle expire à la même date que sur disque
+                    self._store(key, vector, now - age)
+                    with self._lock:
+                        self.persistent_hits += 1
+                    return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, query_text: str, vector: np.ndarray):
+        """Enregistre l'embedding (déjà normalisé) d'une requête."""
+        key = normalize_query(query_text)
+        vector = np.asarray(vector, dtype="float32")
+        self._store(key, vector, time.monotonic())
+        if self.persistent_cache is not None:
+            self.persistent_cache.put_many(self._persistent_namespace, [key], [vector])
+
+    def _store(self, key: str, vector: np.ndarray, created_at: float):
+        with self._lock:
+            self._entries[key] = (created_at, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """Compteurs de hits (mémoire et disque), de misses et taux de hit."""
+        with self._lock:
+            total = self.hits + self.persistent_hits + self.misses
+            return {
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.persistent_hits) / total if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        logging.info("Cache des embeddings de requêtes vidé.")
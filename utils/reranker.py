@@ -0,0 +1,115 @@
+# utils/reranker.py
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .config import (
+    RERANK_ENABLED, RERANK_MODEL, RERANK_DEVICE, RERANK_CACHE_MAX_ENTRIES
+)
+from .query_cache import normalize_query
+
+
+class CrossEncoderReranker:
+    """
+    Re-classe les résultats d'une recherche avec un cross-encoder (question et chunk lus
+    ensemble), plus précis que la similarité d'embeddings mais plus coûteux: on ne l'applique
+    qu'à quelques dizaines de candidats, évalués en un seul passage du modèle.
+
+    Les scores sont mis en cache (LRU) par (question normalisée, chunk): une question répétée
+    ne relance pas le modèle. Le texte du chunk fait partie de la clé (par son hash), pour
+    qu'un identifiant réutilisé après reconstruction de l'index ne serve pas un score périmé.
+    """
+
+    def __init__(self, model: str = RERANK_MODEL, device: str = RERANK_DEVICE,
+                 max_cache_entries: int = RERANK_CACHE_MAX_ENTRIES):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError("Le re-classement nécessite sentence-transformers "
+                              "(pip install sentence-transformers).") from e
+        logging.info(f"Chargement du cross-encoder {model} ({device})...")
+        self.model = CrossEncoder(model, device=device)
+        self.model_name = model
+        self.max_cache_entries = max_cache_entries
+        self._scores: "OrderedDict[Tuple[str, int, int], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._model_lock = threading.Lock() # Un passage à la fois: PyTorch parallélise déjà chaque lot
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(query: str, result: Dict[str, any]) -> Tuple[str, int, int]:
+        return query, result.get("id", -1), hash(result["text"])
+
+    def score(self, question: str, results: List[Dict[str, any]]) -> List[float]:
+        """Score de pertinence de chaque résultat pour la question (plus haut = plus pertinent)."""
+        query = normalize_query(question)
+        keys = [self._key(query, result) for result in results]
+        scores: List[Optional[float]] = [None] * len(results)
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    scores[i] = self._scores[key]
+            missing = [i for i, s in enumerate(scores) if s is None]
+            self.hits += len(results) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            pairs = [(question, results[i]["text"]) for i in missing]
+            with self._model_lock:
+                predicted = self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+            with self._cache_lock:
+                for i, value in zip(missing, predicted):
+                    scores[i] = float(value)
+                    self._scores[keys[i]] = float(value)
+                while len(self._scores) > self.max_cache_entries:
+                    self._scores.popitem(last=False)
+        return scores
+
+    def rerank(self, question: str, results: List[Dict[str, any]], top_n: int) -> List[Dict[str, any]]:
+        """
+        Retourne les `top_n` résultats les mieux notés par le cross-encoder, chacun avec son
+        score ("rerank_score"); le score de la recherche ("score") est conservé.
+        """
+        if not results:
+            return []
+        scores = self.score(question, results)
+        order = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)[:top_n]
+        return [{**results[i], "rerank_score": scores[i]} for i in order]
+
+    def cache_stats(self) -> Dict[str, float]:
+        with self._cache_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._scores),
+            }
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+_reranker_failed = False
+_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """
+    Re-classeur partagé du processus (modèle chargé une seule fois), ou None si le
+    re-classement est désactivé ou si le modèle n'a pas pu être chargé: la recherche
+    continue alors sans re-classement.
+    """
+    global _reranker, _reranker_failed
+    if not RERANK_ENABLED or _reranker_failed:
+        return None
+    if _reranker is None:
+        with _lock:
+            if _reranker is None and not _reranker_failed:
+                try:
+                    _reranker = CrossEncoderReranker()
+                except Exception as e:
+                    logging.error(f"Re-classement désactivé: impossible de charger le cross-encoder: {e}")
+                    _reranker_failed = True
+    return _reranker
@@ -0,0 +1,230 @@
+# utils/snapshots.py
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from .config import SNAPSHOTS_DIR, CURRENT_SNAPSHOT_FILE, SNAPSHOT_KEEP, SNAPSHOT_VERIFY_CHECKSUMS
+
+# Contenu d'un snapshot (mêmes noms que l'ancienne disposition à la racine de vector_db/)
+INDEX_FILE = "faiss_index.idx"
+PARAMS_FILE = "faiss_index.params.json"
+LEXICAL_FILE = "lexical_index.npz"
+CHUNKS_DIR = "chunk_store"
+MANIFEST_FILE = "manifest.json"
+# Trace locale d'une vérification réussie: (taille, mtime) des fichiers au moment de la vérification
+VALIDATION_FILE = ".validated.json"
+STAGING_PREFIX = ".staging-"
+
+
+def snapshot_paths(directory: str) -> Dict[str, str]:
+    """Chemins des fichiers d'un snapshot (ou de l'ancienne disposition si `directory` = vector_db/)."""
+    return {
+        "index": os.path.join(directory, INDEX_FILE),
+        "params": os.path.join(directory, PARAMS_FILE),
+        "lexical": os.path.join(directory, LEXICAL_FILE),
+        "chunks": os.path.join(directory, CHUNKS_DIR),
+    }
+
+
+def _write_json_atomic(path: str, data: Dict[str, any]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _snapshot_files(directory: str) -> List[str]:
+    """Fichiers de données d'un snapshot (chemins relatifs), hors manifeste et trace de vérification."""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            relative = os.path.relpath(os.path.join(root, name), directory)
+            if relative not in (MANIFEST_FILE, VALIDATION_FILE):
+                files.append(relative.replace(os.sep, "/"))
+    return sorted(files)
+
+
+def _file_stats(directory: str, files: List[str]) -> Dict[str, List[int]]:
+    stats = {}
+    for relative in files:
+        stat = os.stat(os.path.join(directory, relative))
+        stats[relative] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def list_snapshots() -> List[str]:
+    """Versions publiées, de la plus ancienne à la plus récente."""
+    if not os.path.isdir(SNAPSHOTS_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(SNAPSHOTS_DIR)
+        if not name.startswith(".") and os.path.exists(os.path.join(SNAPSHOTS_DIR, name, MANIFEST_FILE))
+    )
+
+
+def current_version() -> Optional[str]:
+    """Version pointée par CURRENT, ou None si aucun snapshot n'a été publié."""
+    try:
+        with open(CURRENT_SNAPSHOT_FILE, "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def snapshot_dir(version: str) -> str:
+    return os.path.join(SNAPSHOTS_DIR, version)
+
+
+def load_snapshot_manifest(version: str) -> Dict[str, any]:
+    with open(os.path.join(snapshot_dir(version), MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verify_snapshot(version: str) -> bool:
+    """
+    Vérifie qu'un snapshot est complet et intact (tailles, puis sommes de contrôle).
+    Si les fichiers n'ont pas bougé depuis la dernière vérification réussie, les sommes
+    de contrôle ne sont pas recalculées: un redémarrage ne relit pas tout l'index.
+    """
+    directory = snapshot_dir(version)
+    try:
+        manifest = load_snapshot_manifest(version)
+        files = manifest["files"]
+        stats = _file_stats(directory, list(files))
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Snapshot {version} illisible ou incomplet: {e}")
+        return False
+
+    for relative, expected in files.items():
+        if stats[relative][0] != expected["size"]:
+            logging.error(f"Snapshot {version}: taille inattendue pour {relative}.")
+            return False
+    if not SNAPSHOT_VERIFY_CHECKSUMS:
+        return True
+
+    validation_path = os.path.join(directory, VALIDATION_FILE)
+    try:
+        with open(validation_path, "r", encoding="utf-8") as f:
+            if json.load(f) == stats:
+                return True
+    except (OSError, ValueError):
+        pass
+
+    logging.info(f"Vérification des sommes de contrôle du snapshot {version}...")
+    for relative, expected in files.items():
+        if _sha256(os.path.join(directory, relative)) != expected["sha256"]:
+            logging.error(f"Snapshot {version}: somme de contrôle invalide pour {relative}.")
+            return False
+    try:
+        _write_json_atomic(validation_path, stats)
+    except OSError as e:
+        logging.warning(f"Impossible d'enregistrer la vérification du snapshot {version}: {e}")
+    return True
+
+
+def create_staging_dir() -> str:
+    """Répertoire de travail d'un nouveau snapshot, invisible des lecteurs jusqu'à sa publication."""
+    os.makedirs(SNAPSHOTS_DIR, exist_ok=True)
+    staging = os.path.join(SNAPSHOTS_DIR, f"{STAGING_PREFIX}{os.getpid()}-{time.time_ns()}")
+    os.makedirs(staging)
+    return staging
+
+
+def discard_staging_dir(staging: str):
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def publish_snapshot(staging: str, info: Dict[str, any]) -> str:
+    """
+    Publie un snapshot préparé dans `staging`: écrit le manifeste (sommes de contrôle,
+    `info`), renomme le répertoire vers sa version définitive puis bascule le pointeur
+    CURRENT par un remplacement atomique. Retourne la version publiée.
+    """
+    version = time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 1_000_000_000 // 1_000_000:03d}"
+    while os.path.exists(snapshot_dir(version)):
+        version += "x"
+
+    files = _snapshot_files(staging)
+    manifest = {
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "previous_version": current_version(),
+        **info,
+        "files": {
+            relative: {"size": os.path.getsize(os.path.join(staging, relative)),
+                       "sha256": _sha256(os.path.join(staging, relative))}
+            for relative in files
+        },
+    }
+    _write_json_atomic(os.path.join(staging, MANIFEST_FILE), manifest)
+    os.replace(staging, snapshot_dir(version))
+    # Les sommes viennent d'être calculées: inutile de les revérifier au prochain chargement
+    _write_json_atomic(os.path.join(snapshot_dir(version), VALIDATION_FILE),
+                       _file_stats(snapshot_dir(version), files))
+
+    _set_current(version)
+    logging.info(f"Snapshot {version} publié ({len(files)} fichiers).")
+    prune_snapshots()
+    return version
+
+
+def _set_current(version: str):
+    tmp_path = f"{CURRENT_SNAPSHOT_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CURRENT_SNAPSHOT_FILE)
+
+
+def prune_snapshots(keep: int = SNAPSHOT_KEEP):
+    """Supprime les snapshots au-delà des `keep` précédents (le snapshot courant est toujours conservé)."""
+    current = current_version()
+    versions = [v for v in list_snapshots() if v != current]
+    if current in list_snapshots():
+        # Seuls les snapshots antérieurs au courant servent au retour arrière
+        versions = [v for v in versions if v < current]
+    for version in versions[:max(0, len(versions) - keep)]:
+        try:
+            shutil.rmtree(snapshot_dir(version))
+            logging.info(f"Ancien snapshot {version} supprimé.")
+        except OSError as e:
+            # Fichiers encore ouverts par un lecteur (memory-mapping): nouvel essai à la prochaine publication
+            logging.warning(f"Suppression du snapshot {version} impossible pour l'instant: {e}")
+
+
+def rollback_snapshot(version: Optional[str] = None) -> str:
+    """
+    Revient au snapshot `version`, ou au snapshot précédant le courant si omis.
+    Le pointeur CURRENT est basculé atomiquement; les processus servant l'index le
+    rechargent à chaud. Retourne la version devenue courante.
+    """
+    versions = list_snapshots()
+    current = current_version()
+    if version is None:
+        previous = [v for v in versions if current is None or v < current]
+        if not previous:
+            raise ValueError("Aucun snapshot antérieur disponible pour un retour arrière.")
+        version = previous[-1]
+    if version not in versions:
+        raise ValueError(f"Snapshot inconnu: {version}. Snapshots disponibles: {', '.join(versions) or 'aucun'}")
+    if not verify_snapshot(version):
+        raise ValueError(f"Le snapshot {version} est corrompu: retour arrière annulé.")
+    _set_current(version)
+    logging.info(f"Retour arrière: snapshot courant {current} -> {version}.")
+    return version
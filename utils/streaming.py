@@ -0,0 +1,76 @@
+# utils/streaming.py
+import queue
+import threading
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Regroupe un flux en listes de `size` éléments (la dernière peut être plus courte)."""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def threaded_stage(items: Iterable[T], maxsize: int, name: str) -> Iterator[T]:
+    """
+    Étage de pipeline: `items` est consommé dans un thread dédié et ses éléments sont
+    transmis par une file bornée à `maxsize` éléments. L'étage amont travaille donc
+    pendant que l'aval traite les éléments précédents, sans jamais prendre plus de
+    `maxsize` éléments d'avance (mémoire bornée).
+
+    Une exception levée en amont est relancée chez le consommateur. Si le consommateur
+    s'arrête avant la fin (break, exception), le thread amont s'arrête au prochain
+    élément et le flux amont est fermé.
+    """
+    channel: "queue.Queue" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                channel.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = channel.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,196 @@
+# utils/tabular_loader.py
+import csv
+import math
+import logging
+import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .config import TABULAR_MAX_RECORD_CHARS, TABULAR_MAX_ROWS_PER_RECORD, TABULAR_HEADER_SCAN_ROWS
+
+CELL_SEPARATOR = "|" # Sans espaces: une ligne de 40 colonnes reste compacte
+CONTEXT_SEPARATOR = " | "
+# Un en-tête compte au moins ce nombre de colonnes: en dessous (tableaux clé/valeur,
+# texte libre), les lignes sont restituées telles quelles, sans en-tête répété
+MIN_HEADER_COLUMNS = 3
+
+
+def _format_value(value) -> str:
+    """Représentation compacte d'une cellule ('' pour une cellule vide)."""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return ""
+        return str(int(value)) if value.is_integer() else f"{value:.6g}"
+    if isinstance(value, datetime.datetime) and value.time() == datetime.time(0):
+        return value.date().isoformat()
+    return " ".join(str(value).split()) # Retours à la ligne et espaces multiples compactés
+
+
+def _trim(cells: List[str]) -> List[str]:
+    """Retire les cellules vides en fin de ligne (colonnes inutilisées d'une feuille)."""
+    end = len(cells)
+    while end and not cells[end - 1]:
+        end -= 1
+    return cells[:end]
+
+
+def _is_header(row: Sequence, cells: List[str]) -> bool:
+    """Ligne d'en-tête: au moins MIN_HEADER_COLUMNS cellules, presque toutes textuelles."""
+    filled = [value for value, cell in zip(row, cells) if cell]
+    if len(filled) < MIN_HEADER_COLUMNS:
+        return False
+    textual = sum(1 for value in filled if not isinstance(value, (int, float)))
+    return textual >= 0.8 * len(filled)
+
+
+def _is_numeric_row(row: Sequence) -> bool:
+    return all(isinstance(value, (int, float)) for value in row if value is not None and value != "")
+
+
+def _iter_records(rows: Iterable[Tuple[int, Sequence]], label: str, header_known: bool = False
+                  ) -> Iterator[Tuple[str, int, int]]:
+    """
+    Regroupe les lignes d'un tableau en enregistrements compacts: une ligne de contexte
+    (fichier, feuille, lignes couvertes), l'en-tête des colonnes, puis les lignes, cellules
+    séparées par "|". Un enregistrement ne dépasse pas TABULAR_MAX_RECORD_CHARS caractères
+    ni TABULAR_MAX_ROWS_PER_RECORD lignes: le découpage en chunks ne coupe jamais une ligne.
+
+    Si `header_known`, la première ligne non vide est l'en-tête (CSV). Sinon l'en-tête est
+    recherché dans les TABULAR_HEADER_SCAN_ROWS premières lignes: les lignes textuelles qui
+    le précèdent forment le titre du tableau, les lignes purement numériques (numéros de
+    colonnes) sont ignorées. Sans en-tête (tableau clé/valeur, texte libre), les lignes sont
+    restituées telles quelles. Une ligne d'en-tête suivant une ligne vide ouvre un nouveau
+    tableau de la même feuille. Produit (texte, première ligne, dernière ligne), numéros de
+    ligne de la feuille (base 1).
+    """
+    header: Optional[str] = None
+    title = ""
+    scanned: List[Tuple[int, List[str], Sequence]] = [] # Lignes lues pendant la recherche de l'en-tête
+    searching = True
+    batch: List[str] = []
+    batch_chars = 0
+    first = last = 0
+
+    def flush() -> Tuple[str, int, int]:
+        context = CONTEXT_SEPARATOR.join(part for part in (label, title, f"lignes {first}-{last}") if part)
+        return "\n".join([context] + ([header] if header else []) + batch), first, last
+
+    def add(row_number: int, cells: List[str]) -> Iterator[Tuple[str, int, int]]:
+        nonlocal batch, batch_chars, first, last
+        line = CELL_SEPARATOR.join(cells)
+        overhead = len(label) + len(title) + len(header or "") + 32
+        if batch and (len(batch) >= TABULAR_MAX_ROWS_PER_RECORD
+                      or overhead + batch_chars + len(line) + 1 > TABULAR_MAX_RECORD_CHARS):
+            yield flush()
+            batch, batch_chars = [], 0
+        if not batch:
+            first = row_number
+        batch.append(line)
+        batch_chars += len(line) + 1
+        last = row_number
+
+    after_blank = False
+    for row_number, row in rows:
+        cells = _trim([_format_value(value) for value in row])
+        if not cells:
+            after_blank = True
+            continue
+        if not searching and after_blank and _is_header(row, cells):
+            # Nouveau tableau dans la même feuille (séparé par une ligne vide): nouvel en-tête
+            if batch:
+                yield flush()
+                batch, batch_chars = [], 0
+            header = CELL_SEPARATOR.join(cell or f"col{i + 1}" for i, cell in enumerate(cells))
+        elif not searching:
+            yield from add(row_number, cells)
+        elif header_known or _is_header(row, cells):
+            header = CELL_SEPARATOR.join(cell or f"col{i + 1}" for i, cell in enumerate(cells))
+            title = " ".join(" ".join(c for c in scanned_cells if c)
+                             for _, scanned_cells, scanned_row in scanned if not _is_numeric_row(scanned_row))
+            scanned, searching = [], False
+        else:
+            scanned.append((row_number, cells, row))
+            if len(scanned) >= TABULAR_HEADER_SCAN_ROWS:
+                searching = False
+        after_blank = False
+
+        if not searching and scanned:
+            # Pas d'en-tête: les lignes lues pendant la recherche sont des données
+            for scanned_number, scanned_cells, _ in scanned:
+                yield from add(scanned_number, scanned_cells)
+            scanned = []
+
+    for scanned_number, scanned_cells, _ in scanned: # Tableau plus court que la zone de recherche
+        yield from add(scanned_number, scanned_cells)
+    if batch:
+        yield flush()
+
+
+def iter_excel_sheets(file_path: str) -> Iterator[Tuple[str, Iterator[Tuple[int, Sequence]]]]:
+    """
+    (nom de feuille, lignes numérotées) de chaque feuille, lues en flux: openpyxl en
+    lecture seule pour .xlsx (les cellules ne sont jamais toutes en mémoire), pandas pour .xls.
+    """
+    if file_path.lower().endswith(".xlsx"):
+        import openpyxl
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for worksheet in workbook.worksheets:
+                yield worksheet.title, enumerate(worksheet.iter_rows(values_only=True), start=1)
+        finally:
+            workbook.close()
+    else:
+        import pandas as pd
+        excel_file = pd.ExcelFile(file_path)
+        for sheet_name in excel_file.sheet_names:
+            df = excel_file.parse(sheet_name, header=None)
+            yield sheet_name, enumerate(df.itertuples(index=False, name=None), start=1)
+
+
+def iter_csv_rows(file_path: str) -> Iterator[Tuple[int, List[str]]]:
+    """Lignes numérotées d'un CSV lues en flux (séparateur détecté, repli latin-1 si le fichier n'est pas en UTF-8)."""
+    encoding = "utf-8"
+    with open(file_path, "rb") as f:
+        sample = f.read(1 << 16)
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(sample) - 4: # Une erreur en fin d'échantillon peut être un caractère coupé
+            encoding = "latin1"
+    text_sample = sample.decode(encoding, errors="ignore")
+    try:
+        dialect = csv.Sniffer().sniff(text_sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    with open(file_path, "r", encoding=encoding, errors="replace", newline="") as f:
+        yield from enumerate(csv.reader(f, dialect), start=1)
+
+
+def iter_tabular_documents(file_path: Path, relative_path: Path, source_folder: str) -> Iterator[Dict[str, any]]:
+    """
+    Documents d'un fichier CSV ou Excel en mode tabulaire: un document par groupe de lignes
+    (voir `_iter_records`), avec les métadonnées habituelles plus la feuille et les lignes couvertes.
+    """
+    base_metadata = {
+        "filename": file_path.name,
+        "category": source_folder,
+        "full_path": str(file_path.resolve()),
+    }
+    if file_path.suffix.lower() == ".csv":
+        tables = [(None, iter_csv_rows(str(file_path)), True)]
+    else:
+        tables = ((sheet_name, rows, False) for sheet_name, rows in iter_excel_sheets(str(file_path)))
+
+    records = 0
+    for sheet_name, rows, header_known in tables:
+        label = file_path.name if sheet_name is None else f"{file_path.name}{CONTEXT_SEPARATOR}Feuille: {sheet_name}"
+        source = str(relative_path) if sheet_name is None else f"{relative_path} (Feuille: {sheet_name})"
+        for text, first, last in _iter_records(rows, label, header_known=header_known):
+            metadata = {"source": source, **base_metadata, "row_start": first, "row_end": last}
+            if sheet_name is not None:
+                metadata["sheet"] = sheet_name
+            records += 1
+            yield {"page_content": text, "metadata": metadata}
+    logging.info(f"Texte tabulaire extrait de {relative_path}: {records} groupe(s) de lignes.")
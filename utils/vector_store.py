@@ -1,293 +1,1114 @@
 # utils/vector_store.py
 import os
+import json
+import bisect
 import pickle
 import faiss
 import numpy as np
 import logging
-from typing import List, Dict, Tuple, Optional
-from mistralai.client import MistralClient
+from typing import List, Dict, Tuple, Optional, Union, Iterable, Iterator
 from mistralai.exceptions import MistralAPIException
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document # Utilisé pour le format attendu par le splitter
 
 from .config import (
-    MISTRAL_API_KEY, EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE,
-    FAISS_INDEX_FILE, DOCUMENT_CHUNKS_FILE, CHUNK_SIZE, CHUNK_OVERLAP
+    EMBEDDING_BACKEND,
+    VECTOR_DB_DIR, FAISS_INDEX_FILE, DOCUMENT_CHUNKS_FILE, CHUNK_STORE_DIR, ALLOW_LEGACY_CHUNKS_PICKLE,
+    EMBEDDING_CACHE_ENABLED,
+    QUERY_CACHE_ENABLED, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_PERSIST,
+    QUERY_CACHE_FILE, QUERY_CACHE_PERSIST_MAX_ENTRIES,
+    SEARCH_MICRO_BATCHING, SEARCH_MICRO_BATCH_MAX_SIZE, SEARCH_MICRO_BATCH_WAIT_MS,
+    SEARCH_MODE, HYBRID_CANDIDATES, RRF_K, FILTER_EXACT_MAX_IDS,
+    KEEP_FULL_PRECISION_VECTORS, EXACT_RESCORE_FACTOR,
+    INGEST_BATCH_SIZE, INGEST_QUEUE_SIZE, INDEX_TRAIN_SAMPLE_SIZE, DEDUP_ENABLED,
+    LOCAL_EMBEDDING_BATCH_SIZE, SEARCH_DIVERSIFY, MMR_CANDIDATES, MMR_LAMBDA, NEAR_DUPLICATE_THRESHOLD, MERGE_ADJACENT_CHUNKS
+)
+from .embedding_cache import EmbeddingCache
+from .query_cache import QueryEmbeddingCache
+from .micro_batcher import MicroBatcher
+from .embedding_pipeline import EmbeddingPipeline
+from .embedding_provider import EmbeddingProvider, get_embedding_provider
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .metadata_filter import MetadataIndex, Where, make_id_selector, validate_where
+from .diversification import mmr_select, rrf_relevance, merge_adjacent_chunks
+from .index_factory import (
+    create_index, train_index, apply_search_params, supports_removal, is_id_addressable, remove_ids,
+    search_parameters, is_exact, exact_search_ids, is_quantized, rescore_exact,
+    save_index_params, load_index_params, default_index_params, TRAINED_INDEX_TYPES
+)
+from .chunk_store import ChunkStore, ChunkStoreWriter
+from .chunker import chunking_params, make_text_splitter
+from .dedup import ChunkDeduplicator
+from .streaming import batched, threaded_stage
+from .snapshots import (
+    snapshot_paths, snapshot_dir, current_version, list_snapshots, verify_snapshot, load_snapshot_manifest,
+    create_staging_dir, discard_staging_dir, publish_snapshot
 )
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def _chunk_pages(page_offsets: List[List[int]], start: int, length: int) -> Dict[str, int]:
+    """Pages (numérotées à partir de 1) couvertes par un chunk de texte commençant à `start`."""
+    if start < 0:
+        return {}
+    starts = [offset for offset, _ in page_offsets]
+    first = max(bisect.bisect_right(starts, start) - 1, 0)
+    last = max(bisect.bisect_right(starts, start + max(length - 1, 0)) - 1, first)
+    return {"page": page_offsets[first][1], "page_end": page_offsets[last][1]}
+
+
+def _describe_chunking() -> str:
+    params = chunking_params()
+    return (f"moteur={params['chunker']}, taille={params['chunk_size']}, chevauchement={params['chunk_overlap']}"
+            + (" tokens" if params["chunk_unit"] == "tokens" else ""))
+
+
 class VectorStoreManager:
     """Gère la création, le chargement et la recherche dans un index Faiss."""
 
-    def __init__(self):
+    def __init__(self, share_clients_with: Optional["VectorStoreManager"] = None, mmap_index: bool = False):
+        """
+        Args:
+            share_clients_with: Instance existante dont on réutilise les fournisseurs d'embeddings et les caches
+                                (utilisé lors d'un rechargement à chaud, voir utils/vector_store_registry.py)
+            mmap_index: Charge l'index Faiss avec IO_FLAG_MMAP, en lecture seule (recopié à la première
+                        modification). Seuls les index IVF sont réellement memory-mappés; les autres
+                        types sont lus en mémoire (voir VECTOR_STORE_MMAP_INDEX)
+        """
+        self._mmap_index = mmap_index
+        self.snapshot_version: Optional[str] = None # Version du snapshot chargé ou publié en dernier
         self.index: Optional[faiss.Index] = None
-        self.document_chunks: List[Dict[str, any]] = []
-        self.mistral_client = MistralClient(api_key=MISTRAL_API_KEY)
+        self.index_params: Dict[str, any] = {"index_type": "flat"} # Type et réglages (nprobe, efSearch...) de l'index
+        self.lexical_index: Optional[BM25Index] = None # Index BM25, reconstruit avec les chunks
+        self.metadata_index: Optional[MetadataIndex] = None # Bitmaps métadonnée -> identifiants, pour les filtres
+        # Liste de chunks en mémoire, ou stockage colonnaire memory-mappé après chargement
+        self.document_chunks: Union[List[Dict[str, any]], ChunkStore] = []
+        self._chunk_ids = np.empty(0, dtype='int64') # Identifiants FAISS des chunks, triés (même ordre que document_chunks)
+        self._next_id = 0 # Prochain identifiant stable à attribuer
+        # Embeddings pleine précision (même ordre que document_chunks) pour re-scorer les index quantifiés;
+        # memory-mappés depuis le stockage de chunks après chargement
+        self._full_vectors: Optional[np.ndarray] = None
+        if share_clients_with is not None:
+            self.query_embedder = share_clients_with.query_embedder
+            self.indexing_embedder = share_clients_with.indexing_embedder
+            self.embedding_cache = share_clients_with.embedding_cache
+            self.query_cache = share_clients_with.query_cache
+        else:
+            self.query_embedder: EmbeddingProvider = get_embedding_provider()
+            # Fournisseur dédié à l'indexation (pour Mistral, sans reprises internes: le pipeline gère débit et reprises)
+            self.indexing_embedder: EmbeddingProvider = get_embedding_provider(for_indexing=True)
+            self.embedding_cache: Optional[EmbeddingCache] = EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None
+            self.query_cache: Optional[QueryEmbeddingCache] = QueryEmbeddingCache(
+                model=self.query_embedder.model_name,
+                max_entries=QUERY_CACHE_MAX_ENTRIES,
+                ttl_seconds=QUERY_CACHE_TTL_SECONDS,
+                persistent_cache=EmbeddingCache(QUERY_CACHE_FILE, QUERY_CACHE_PERSIST_MAX_ENTRIES)
+                if QUERY_CACHE_PERSIST else None,
+            ) if QUERY_CACHE_ENABLED else None
+        if self.indexing_embedder.remote:
+            self.embedding_pipeline = EmbeddingPipeline(self._embed_batch)
+        else:
+            # Modèle local: lots plus gros, sans limitation de débit; un seul lot à la fois (PyTorch parallélise chaque lot)
+            self.embedding_pipeline = EmbeddingPipeline(self._embed_batch, batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+                                                        max_workers=1, requests_per_second=0, tokens_per_second=0)
+        # Regroupe les appels concurrents à `search` arrivant à quelques millisecondes d'intervalle
+        self._micro_batcher: Optional[MicroBatcher] = MicroBatcher(
+            self._run_search_batch,
+            max_batch_size=SEARCH_MICRO_BATCH_MAX_SIZE,
+            max_wait_ms=SEARCH_MICRO_BATCH_WAIT_MS,
+            name="search-micro-batcher",
+        ) if SEARCH_MICRO_BATCHING else None
         self._load_index_and_chunks()
 
+    def close(self):
+        """
+        Arrête les threads de fond de l'instance (micro-batcher). Les recherches en cours se
+        terminent normalement; les clients et caches, éventuellement partagés, restent ouverts.
+        """
+        if self._micro_batcher is not None:
+            self._micro_batcher.close()
+
+    @staticmethod
+    def has_persisted_index() -> bool:
+        """Indique si un index publié (snapshot) ou un index de l'ancienne disposition existe sur disque."""
+        if current_version() is not None:
+            return True
+        return os.path.exists(FAISS_INDEX_FILE) and (
+            ChunkStore.exists(CHUNK_STORE_DIR) or os.path.exists(DOCUMENT_CHUNKS_FILE)
+        )
+
+    def _resolve_persisted_paths(self) -> Optional[Dict[str, str]]:
+        """
+        Chemins à charger: le snapshot courant s'il est intact, sinon le snapshot antérieur intact
+        le plus récent; à défaut de snapshot, l'ancienne disposition à la racine de vector_db/.
+        """
+        current = current_version()
+        if current is not None:
+            candidates = [current] + [v for v in reversed(list_snapshots()) if v < current]
+            for version in candidates:
+                if verify_snapshot(version):
+                    if version != current:
+                        logging.error(f"Snapshot courant {current} invalide: chargement du snapshot {version}.")
+                    manifest = load_snapshot_manifest(version)
+                    if manifest.get("embedding_model") != self.query_embedder.model_name:
+                        logging.warning(f"Snapshot {version} construit avec le modèle {manifest.get('embedding_model')}, "
+                                        f"différent du modèle configuré ({self.query_embedder.model_name}): reconstruisez l'index.")
+                    self.snapshot_version = version
+                    return snapshot_paths(snapshot_dir(version))
+            logging.error("Aucun snapshot intact trouvé.")
+            return None
+        if os.path.exists(FAISS_INDEX_FILE) and (ChunkStore.exists(CHUNK_STORE_DIR) or os.path.exists(DOCUMENT_CHUNKS_FILE)):
+            return snapshot_paths(VECTOR_DB_DIR)
+        return None
+
     def _load_index_and_chunks(self):
-        """Charge l'index Faiss et les chunks si les fichiers existent."""
-        if os.path.exists(FAISS_INDEX_FILE) and os.path.exists(DOCUMENT_CHUNKS_FILE):
-            try:
-                logging.info(f"Chargement de l'index Faiss depuis {FAISS_INDEX_FILE}...")
-                self.index = faiss.read_index(FAISS_INDEX_FILE)
-                logging.info(f"Chargement des chunks depuis {DOCUMENT_CHUNKS_FILE}...")
-                with open(DOCUMENT_CHUNKS_FILE, 'rb') as f:
-                    self.document_chunks = pickle.load(f)
-                logging.info(f"Index ({self.index.ntotal} vecteurs) et {len(self.document_chunks)} chunks chargés.")
-            except Exception as e:
-                logging.error(f"Erreur lors du chargement de l'index/chunks: {e}")
-                self.index = None
-                self.document_chunks = []
-        else:
+        """Charge l'index Faiss et les chunks du snapshot courant (ou de l'ancienne disposition)."""
+        self.snapshot_version = None
+        paths = self._resolve_persisted_paths()
+        if paths is None:
             logging.warning("Fichiers d'index Faiss ou de chunks non trouvés. L'index est vide.")
+            return
+        try:
+            logging.info(f"Chargement de l'index Faiss depuis {paths['index']}...")
+            if self._mmap_index:
+                self.index = faiss.read_index(paths["index"], faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            else:
+                self.index = faiss.read_index(paths["index"])
+            self.index_params = load_index_params(paths["params"])
+            apply_search_params(self.index, self.index_params)
+            if ChunkStore.exists(paths["chunks"]):
+                logging.info(f"Chargement des chunks (memory-mapping) depuis {paths['chunks']}...")
+                self.document_chunks = ChunkStore(paths["chunks"])
+                self._next_id = self.document_chunks.next_id
+                self._full_vectors = self.document_chunks.vectors if self._keeps_full_vectors() else None
+            elif self.snapshot_version is None and ALLOW_LEGACY_CHUNKS_PICKLE:
+                self._migrate_legacy_pickle()
+            else:
+                raise RuntimeError(f"Seul l'ancien fichier {DOCUMENT_CHUNKS_FILE} est présent et "
+                                   "ALLOW_LEGACY_CHUNKS_PICKLE est désactivé. Reconstruisez l'index.")
+            self._refresh_id_mapping()
+            self.lexical_index = BM25Index.load(paths["lexical"])
+            if self.lexical_index is None or len(self.lexical_index) != len(self.document_chunks):
+                logging.info("Index lexical absent ou désynchronisé: reconstruction à partir des chunks...")
+                self._rebuild_lexical_index()
+            self._rebuild_metadata_index()
+            logging.info(f"Index ({self.index.ntotal} vecteurs) et {len(self.document_chunks)} chunks chargés"
+                         f"{f' (snapshot {self.snapshot_version})' if self.snapshot_version else ''}.")
+        except Exception as e:
+            logging.error(f"Erreur lors du chargement de l'index/chunks: {e}")
+            self.index = None
+            self.lexical_index = None
+            self.metadata_index = None
+            self._full_vectors = None
+            self.document_chunks = []
+            self._refresh_id_mapping()
 
-    def _split_documents_to_chunks(self, documents: List[Dict[str, any]]) -> List[Dict[str, any]]:
-        """Découpe les documents en chunks avec métadonnées."""
-        logging.info(f"Découpage de {len(documents)} documents en chunks (taille={CHUNK_SIZE}, chevauchement={CHUNK_OVERLAP})...")
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            length_function=len, # Important: mesure en caractères
-            add_start_index=True, # Ajoute la position de début du chunk dans le document original
-        )
+    def _migrate_legacy_pickle(self):
+        """
+        Migration unique de l'ancien format (pickle + IndexFlatIP) vers le stockage colonnaire
+        et un index à identifiants stables. Le pickle n'est plus lu une fois la migration faite.
+        """
+        logging.warning(f"Ancien format de chunks détecté ({DOCUMENT_CHUNKS_FILE}): migration vers un snapshot...")
+        with open(DOCUMENT_CHUNKS_FILE, 'rb') as f:
+            self.document_chunks = pickle.load(f)
+        self._ensure_id_mapped_index()
+        self._refresh_id_mapping()
+        self._save_index_and_chunks()
+
+    def _ensure_id_mapped_index(self):
+        """
+        Migre un ancien index (IndexFlatIP sans identifiants) vers un index à identifiants stables (IndexIDMap2).
+        Les vecteurs sont reconstruits depuis l'index existant, sans appel à l'API.
+        """
+        if is_id_addressable(self.index):
+            return
+        logging.info("Migration de l'index Faiss vers un index à identifiants stables (IndexIDMap2)...")
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        ids = np.arange(len(self.document_chunks), dtype='int64')
+        self.index, self.index_params = create_index(vectors.shape[1], {"index_type": "flat"})
+        self.index.add_with_ids(vectors, ids)
+        for new_id, chunk in zip(ids, self.document_chunks):
+            chunk["id"] = int(new_id)
+
+    def _create_trained_index(self, vectors: np.ndarray):
+        """
+        Crée l'index du type configuré (INDEX_TYPE), l'entraîne sur `vectors` si nécessaire
+        et ajoute ces vecteurs. Les paramètres effectifs sont conservés pour la sauvegarde.
+        """
+        self.index, self.index_params = create_index(vectors.shape[1], n_vectors=vectors.shape[0])
+        logging.info(f"Création d'un index Faiss '{self.index_params['index_type']}' (paramètres: {self.index_params})...")
+        train_index(self.index, vectors)
+
+    def _refresh_id_mapping(self):
+        """Recalcule le tableau trié des identifiants FAISS des chunks."""
+        if isinstance(self.document_chunks, ChunkStore):
+            self._chunk_ids = self.document_chunks.ids
+        else:
+            self._chunk_ids = np.array([chunk["id"] for chunk in self.document_chunks], dtype='int64')
+        # Les identifiants ne sont jamais réutilisés après une suppression
+        last_id = int(self._chunk_ids[-1]) if len(self._chunk_ids) else -1
+        self._next_id = max(self._next_id, last_id + 1)
+
+    def _rebuild_lexical_index(self):
+        """Reconstruit l'index BM25 à partir des chunks courants (calcul local, sans API)."""
+        if isinstance(self.document_chunks, ChunkStore):
+            store = self.document_chunks # Textes lus un à un, sans matérialiser les chunks
+            self.lexical_index = BM25Index.build((int(store.ids[p]), store.text(p)) for p in range(len(store)))
+        else:
+            self.lexical_index = BM25Index.build((chunk["id"], chunk["text"]) for chunk in self.document_chunks)
+
+    def _rebuild_search_indexes(self):
+        """Reconstruit les index auxiliaires de recherche (BM25, métadonnées) après une modification des chunks."""
+        self._rebuild_lexical_index()
+        self._rebuild_metadata_index()
+
+    def _rebuild_metadata_index(self):
+        """Bitmaps des filtres de métadonnées; un ChunkStore est lu par colonnes, sans matérialiser ses chunks."""
+        if isinstance(self.document_chunks, ChunkStore):
+            self.metadata_index = MetadataIndex.from_chunk_store(self.document_chunks)
+        else:
+            self.metadata_index = MetadataIndex.build(self.document_chunks)
+
+    def _position_of(self, chunk_id: int) -> Optional[int]:
+        """Position d'un chunk dans document_chunks à partir de son identifiant (recherche dichotomique)."""
+        position = int(np.searchsorted(self._chunk_ids, chunk_id))
+        if position < len(self._chunk_ids) and self._chunk_ids[position] == chunk_id:
+            return position
+        return None
 
-        all_chunks = []
-        doc_counter = 0
+    def _materialize_chunks(self):
+        """Convertit le stockage memory-mappé en liste modifiable avant une mise à jour incrémentale."""
+        if isinstance(self.document_chunks, ChunkStore):
+            store = self.document_chunks
+            self.document_chunks = list(store)
+            if self._full_vectors is not None:
+                self._full_vectors = np.array(self._full_vectors, dtype="float32")
+            store.close()
+
+    def _keeps_full_vectors(self) -> bool:
+        """Les vecteurs pleine précision ne sont conservés que pour un index quantifié (sq8, fp16, ivfpq)."""
+        return KEEP_FULL_PRECISION_VECTORS and is_quantized(self.index_params)
+
+    def _vectors_for_ids(self, ids: np.ndarray) -> np.ndarray:
+        """Vecteurs pleine précision des identifiants donnés (seules ces lignes sont lues du disque)."""
+        positions = np.searchsorted(self._chunk_ids, ids)
+        return self._full_vectors[positions]
+
+    def _iter_chunks(self, documents: Iterable[Dict[str, any]], start_id: int = 0) -> Iterator[Dict[str, any]]:
+        """
+        Découpe les documents en chunks avec métadonnées, numérotés à partir de `start_id`.
+        Générateur: les documents (liste ou flux) sont découpés au fur et à mesure de leur lecture.
+        """
+        split_text = make_text_splitter()
+
+        next_id = start_id
         for doc in documents:
-            # Convertit notre format de document en format Langchain Document pour le splitter
-            langchain_doc = Document(page_content=doc["page_content"], metadata=doc["metadata"])
-            chunks = text_splitter.split_documents([langchain_doc])
+            metadata = doc["metadata"]
+            page_offsets = metadata.get("page_offsets") # PDF: [début dans le texte, numéro de page]
+            if page_offsets:
+                metadata = {key: value for key, value in metadata.items() if key != "page_offsets"}
+            chunks = split_text(doc["page_content"])
             logging.info(f"  Document '{doc['metadata'].get('filename', 'N/A')}' découpé en {len(chunks)} chunks.")
 
             # Enrichit chaque chunk avec des métadonnées supplémentaires
-            for i, chunk in enumerate(chunks):
-                chunk_dict = {
-                    "id": f"{doc_counter}_{i}", # Identifiant unique du chunk (doc_index_chunk_index)
-                    "text": chunk.page_content,
+            for i, (start_index, text) in enumerate(chunks):
+                yield {
+                    "id": next_id, # Identifiant stable du chunk (= identifiant dans l'index Faiss)
+                    "text": text,
                     "metadata": {
-                        **chunk.metadata, # Métadonnées héritées du document (source, category, etc.)
+                        **metadata, # Métadonnées héritées du document (source, category, etc.)
                         "chunk_id_in_doc": i, # Position du chunk dans son document d'origine
-                        "start_index": chunk.metadata.get("start_index", -1) # Position de début (en caractères)
+                        "start_index": start_index, # Position de début (en caractères)
+                        **(_chunk_pages(page_offsets, start_index, len(text)) if page_offsets else {})
                     }
                 }
-                all_chunks.append(chunk_dict)
-            doc_counter += 1
+                next_id += 1
 
+    def _split_documents_to_chunks(self, documents: List[Dict[str, any]], start_id: int = 0) -> List[Dict[str, any]]:
+        """Découpe les documents en chunks avec métadonnées, numérotés à partir de `start_id`."""
+        logging.info(f"Découpage de {len(documents)} documents en chunks ({_describe_chunking()})...")
+        all_chunks = list(self._iter_chunks(documents, start_id))
         logging.info(f"Total de {len(all_chunks)} chunks créés.")
         return all_chunks
 
     def _generate_embeddings(self, chunks: List[Dict[str, any]]) -> Optional[np.ndarray]:
-        """Génère les embeddings pour une liste de chunks via l'API Mistral."""
-        if not MISTRAL_API_KEY:
-            logging.error("Impossible de générer les embeddings: MISTRAL_API_KEY manquante.")
-            return None
+        """
+        Génère les embeddings pour une liste de chunks via l'API Mistral.
+        Les embeddings déjà présents dans le cache (même modèle, même texte) ne sont pas recalculés;
+        les autres sont calculés en parallèle, avec limitation de débit et reprises.
+        Retourne None si des chunks n'ont pas pu être embeddés (aucun vecteur nul n'est inséré).
+        """
         if not chunks:
             logging.warning("Aucun chunk fourni pour générer les embeddings.")
             return None
 
-        logging.info(f"Génération des embeddings pour {len(chunks)} chunks (modèle: {EMBEDDING_MODEL})...")
-        all_embeddings = []
-        total_batches = (len(chunks) + EMBEDDING_BATCH_SIZE - 1) // EMBEDDING_BATCH_SIZE
-
-        for i in range(0, len(chunks), EMBEDDING_BATCH_SIZE):
-            batch_num = (i // EMBEDDING_BATCH_SIZE) + 1
-            batch_chunks = chunks[i:i + EMBEDDING_BATCH_SIZE]
-            texts_to_embed = [chunk["text"] for chunk in batch_chunks]
-
-            logging.info(f"  Traitement du lot {batch_num}/{total_batches} ({len(texts_to_embed)} chunks)")
-            try:
-                response = self.mistral_client.embeddings(
-                    model=EMBEDDING_MODEL,
-                    input=texts_to_embed
-                )
-                batch_embeddings = [data.embedding for data in response.data]
-                all_embeddings.extend(batch_embeddings)
-            except MistralAPIException as e:
-                logging.error(f"Erreur API Mistral lors de la génération d'embeddings (lot {batch_num}): {e}")
-                logging.error(f"  Détails: Status Code={e.status_code}, Message={e.message}")
-            except Exception as e:
-                logging.error(f"Erreur inattendue lors de la génération d'embeddings (lot {batch_num}): {e}")
-                 # Gérer l'erreur: ici on ajoute des vecteurs nuls pour ne pas bloquer
-                num_failed = len(texts_to_embed)
-                if all_embeddings: # Si on a déjà des embeddings, on prend la dimension du premier
-                    dim = len(all_embeddings[0])
-                else: # Sinon, on ne peut pas déterminer la dimension, on saute ce lot
-                     logging.error("Impossible de déterminer la dimension des embeddings, saut du lot.")
-                     continue
-                logging.warning(f"Ajout de {num_failed} vecteurs nuls de dimension {dim} pour le lot échoué.")
-                all_embeddings.extend([np.zeros(dim, dtype='float32')] * num_failed)
-
-            except Exception as e:
-                logging.error(f"Erreur inattendue lors de la génération d'embeddings (lot {batch_num}): {e}")
-                # Gérer comme ci-dessus
-                num_failed = len(texts_to_embed)
-                if all_embeddings:
-                    dim = len(all_embeddings[0])
-                else:
-                     logging.error("Impossible de déterminer la dimension des embeddings, saut du lot.")
-                     continue
-                logging.warning(f"Ajout de {num_failed} vecteurs nuls de dimension {dim} pour le lot échoué.")
-                all_embeddings.extend([np.zeros(dim, dtype='float32')] * num_failed)
+        texts = [chunk["text"] for chunk in chunks]
+        all_embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        # 1. Consulter le cache d'embeddings
+        if self.embedding_cache is not None:
+            all_embeddings = self.embedding_cache.get_many(self.indexing_embedder.model_name, texts)
+        missing_indices = [i for i, emb in enumerate(all_embeddings) if emb is None]
+        logging.info(f"Génération des embeddings pour {len(chunks)} chunks (modèle: {self.indexing_embedder.model_name}, "
+                     f"{len(chunks) - len(missing_indices)} en cache, {len(missing_indices)} à calculer)...")
 
+        unavailable = self.indexing_embedder.is_available()
+        if missing_indices and unavailable:
+            logging.error(f"Impossible de générer les embeddings: {unavailable}.")
+            return None
 
-        if not all_embeddings:
-             logging.error("Aucun embedding n'a pu être généré.")
-             return None
+        # 2. Calculer uniquement les embeddings des chunks absents du cache
+        if missing_indices:
+            missing_texts = [texts[i] for i in missing_indices]
+
+            def store_batch(batch_indices: List[int], vectors: np.ndarray):
+                # Mise en cache au fil de l'eau: un échec ultérieur ne fait pas perdre ce lot
+                if self.embedding_cache is not None:
+                    self.embedding_cache.put_many(self.indexing_embedder.model_name,
+                                                  [missing_texts[i] for i in batch_indices], vectors)
+
+            computed, failed = self.embedding_pipeline.run(missing_texts, on_batch=store_batch)
+            if failed:
+                logging.error(f"{len(failed)} chunk(s) n'ont pas pu être embeddés après toutes les reprises. "
+                              "Les embeddings déjà calculés restent en cache.")
+                return None
+            for position, vector in computed.items():
+                all_embeddings[missing_indices[position]] = vector
 
         embeddings_array = np.array(all_embeddings).astype('float32')
         logging.info(f"Embeddings générés avec succès. Shape: {embeddings_array.shape}")
         return embeddings_array
 
-    def build_index(self, documents: List[Dict[str, any]]):
-        """Construit l'index Faiss à partir des documents."""
-        if not documents:
-            logging.warning("Aucun document fourni pour construire l'index.")
-            return
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Un lot d'embeddings de documents (utilisé par le pipeline d'indexation)."""
+        return self.indexing_embedder.embed_documents(texts)
 
-        # 1. Découper en chunks
-        self.document_chunks = self._split_documents_to_chunks(documents)
-        if not self.document_chunks:
-            logging.error("Le découpage n'a produit aucun chunk. Impossible de construire l'index.")
-            return
+    def _embedded_batches(self, chunk_batches: Iterable[List[Dict[str, any]]]
+                          ) -> Iterator[Tuple[List[Dict[str, any]], Optional[np.ndarray]]]:
+        """Étage d'embeddings: (chunks, embeddings normalisés) par lot; None si le lot n'a pas pu être embeddé."""
+        try:
+            for chunks in chunk_batches:
+                embeddings = self._generate_embeddings(chunks)
+                if embeddings is not None and embeddings.shape[0] == len(chunks):
+                    faiss.normalize_L2(embeddings)
+                else:
+                    embeddings = None
+                yield chunks, embeddings
+        finally:
+            # Arrêt anticipé: l'étage amont (découpage, parsing) est arrêté lui aussi
+            close = getattr(chunk_batches, "close", None)
+            if close is not None:
+                close()
 
-        # 2. Générer les embeddings
-        embeddings = self._generate_embeddings(self.document_chunks)
-        if embeddings is None or embeddings.shape[0] != len(self.document_chunks):
-            logging.error("Problème de génération d'embeddings. Le nombre d'embeddings ne correspond pas au nombre de chunks.")
-            # Nettoyer pour éviter un état incohérent
-            self.document_chunks = []
-            self.index = None
-            # Supprimer les fichiers potentiellement corrompus
-            if os.path.exists(FAISS_INDEX_FILE): os.remove(FAISS_INDEX_FILE)
-            if os.path.exists(DOCUMENT_CHUNKS_FILE): os.remove(DOCUMENT_CHUNKS_FILE)
-            return
+    def _abort_build(self, staging: Optional[str] = None, writer: Optional[ChunkStoreWriter] = None):
+        """Abandonne une construction en échec et recharge le snapshot publié, resté intact."""
+        if writer is not None:
+            writer.abort()
+        if staging is not None:
+            discard_staging_dir(staging)
+        self.document_chunks = []
+        self._refresh_id_mapping()
+        self.index = None
+        self.lexical_index = None
+        self.metadata_index = None
+        self._full_vectors = None
+        # Le snapshot publié n'a pas été touché: on le recharge plutôt que de rester sur un index vide
+        self._load_index_and_chunks()
 
+    def _add_embedded(self, pending: List[Tuple[List[Dict[str, any]], np.ndarray]]):
+        """
+        Ajoute des lots embeddés à l'index en construction. Le premier appel crée l'index
+        (entraîné sur les vecteurs de ces lots pour les types qui l'exigent).
+        """
+        embeddings = pending[0][1] if len(pending) == 1 else np.vstack([e for _, e in pending])
+        ids = np.array([c["id"] for chunks, _ in pending for c in chunks], dtype='int64')
+        if self.index is None:
+            self._create_trained_index(embeddings)
+        self.index.add_with_ids(embeddings, ids)
+
+    def build_index(self, documents: Iterable[Dict[str, any]]) -> bool:
+        """
+        Construit l'index Faiss à partir des documents (liste, ou flux tel que iter_parsed_files).
 
-        # 3. Créer l'index Faiss optimisé pour la similarité cosinus
-        dimension = embeddings.shape[1]
-        logging.info(f"Création de l'index Faiss optimisé pour la similarité cosinus avec dimension {dimension}...")
+        Pipeline en flux: découpage, embeddings et ajout à l'index travaillent en parallèle sur
+        des lots de INGEST_BATCH_SIZE chunks, reliés par des files bornées. Les embeddings ne
+        sont jamais accumulés pour tout le corpus (sauf l'échantillon d'entraînement des index
+        sq8/ivf/ivfpq), ni les chunks: textes, métadonnées et vecteurs pleine précision d'un index
+        quantifié sont écrits au fil des lots dans le snapshot en préparation, puis memory-mappés.
+        Hors index Faiss, la mémoire conservée par chunk se limite à quelques entiers (identifiant,
+        offsets, colonnes) et, avec la déduplication, à sa signature MinHash.
+        Retourne True si le nouvel index a été construit et publié.
+        """
+        # 1. Reconstruction complète: la numérotation repart de zéro, l'ancien stockage n'est pas relu
+        if isinstance(self.document_chunks, ChunkStore):
+            self.document_chunks.close()
+        self._mmap_index = False # L'index chargé est remplacé, pas modifié
+        self._next_id = 0
+        self.document_chunks = []
+        self._refresh_id_mapping()
+        self.index = None
+        self._full_vectors = None
+        logging.info(f"Construction de l'index en flux (lots de {INGEST_BATCH_SIZE} chunks, {_describe_chunking()})...")
 
-        # Normaliser les embeddings pour la similarité cosinus
-        faiss.normalize_L2(embeddings)
+        # 2. Étages: [parsing +] découpage [+ déduplication] -> embeddings (cache réutilisé) -> index
+        deduplicator = ChunkDeduplicator() if DEDUP_ENABLED else None
+        chunks = self._iter_chunks(documents)
+        if deduplicator is not None:
+            chunks = deduplicator.deduplicate(chunks)
+        chunk_batches = threaded_stage(batched(chunks, INGEST_BATCH_SIZE), INGEST_QUEUE_SIZE, name="ingest-chunking")
+        embedded = threaded_stage(self._embedded_batches(chunk_batches), INGEST_QUEUE_SIZE, name="ingest-embedding")
 
-        # Créer un index pour la similarité cosinus (IndexFlatIP = produit scalaire)
-        self.index = faiss.IndexFlatIP(dimension)
-        self.index.add(embeddings)
+        config_params = default_index_params()
+        needs_training = config_params["index_type"] in TRAINED_INDEX_TYPES
+        collect_vectors = KEEP_FULL_PRECISION_VECTORS and is_quantized(config_params)
+        pending: List[Tuple[List[Dict[str, any]], np.ndarray]] = [] # Lots en attente de l'entraînement de l'index
+        pending_count = 0
+        staging = create_staging_dir()
+        chunks_dir = snapshot_paths(staging)["chunks"]
+        writer = ChunkStoreWriter(chunks_dir)
+        if self.embedding_cache is not None:
+            self.embedding_cache.reset_stats()
+        try:
+            for chunks, embeddings in embedded:
+                if embeddings is None:
+                    logging.error("Problème de génération d'embeddings. Construction de l'index interrompue.")
+                    self._abort_build(staging, writer)
+                    return False
+                if self.index is not None and embeddings.shape[1] != self.index.d:
+                    logging.error(f"Dimension des embeddings ({embeddings.shape[1]}) incohérente ({self.index.d} attendue).")
+                    self._abort_build(staging, writer)
+                    return False
+                writer.add_chunks(chunks)
+                self._next_id = chunks[-1]["id"] + 1
+                if collect_vectors:
+                    writer.add_vectors(embeddings)
+                if self.index is None:
+                    pending.append((chunks, embeddings))
+                    pending_count += len(chunks)
+                    if needs_training and pending_count < INDEX_TRAIN_SAMPLE_SIZE:
+                        continue
+                    self._add_embedded(pending)
+                    pending = []
+                else:
+                    self._add_embedded([(chunks, embeddings)])
+                logging.info(f"  {len(writer)} chunks indexés...")
+            if pending:
+                self._add_embedded(pending)
+        except Exception as e:
+            logging.error(f"Erreur lors de la construction de l'index en flux: {e}")
+            self._abort_build(staging, writer)
+            return False
+        finally:
+            embedded.close()
+            if self.embedding_cache is not None:
+                self.embedding_cache.log_stats()
+            if deduplicator is not None:
+                deduplicator.log_stats()
+
+        if not len(writer):
+            logging.error("Aucun chunk produit (aucun document ou documents vides). Impossible de construire l'index.")
+            self._abort_build(staging, writer)
+            return False
+
+        # 3. Fin de l'écriture des chunks (références des doublons, vecteurs pleine précision d'un index
+        # quantifié), puis index auxiliaires lus depuis le stockage memory-mappé
         logging.info(f"Index Faiss créé avec {self.index.ntotal} vecteurs.")
+        try:
+            if deduplicator is not None:
+                writer.add_duplicates(deduplicator.references)
+            writer.close(self._next_id, keep_vectors=self._keeps_full_vectors())
+            self._adopt_chunk_store(chunks_dir)
+        except Exception as e:
+            logging.error(f"Erreur lors de l'écriture des chunks: {e}")
+            self._abort_build(staging, writer)
+            return False
+        self._rebuild_search_indexes()
+
+        # 4. Publier le snapshot (les chunks et vecteurs sont ensuite relus depuis le snapshot publié)
+        if not self._publish_staging(staging):
+            self._abort_build()
+            return False
+        return True
+
+    # ============================================================
+    # Mises à jour incrémentales
+
+    @staticmethod
+    def _matches_source(metadata: Dict[str, any], source: str) -> bool:
+        """Un chunk appartient à `source` s'il en provient directement ou d'une de ses feuilles Excel."""
+        chunk_source = metadata.get("source", "")
+        return chunk_source == source or chunk_source.startswith(f"{source} (Feuille: ")
+
+    def _prepare_documents(self, documents: List[Dict[str, any]]) -> Optional[Tuple[List[Dict[str, any]], np.ndarray]]:
+        """
+        Découpe et embedde de nouveaux documents sans modifier l'index. Retourne None en cas
+        d'échec des embeddings (la liste des chunks est vide si le découpage n'en produit aucun).
+        """
+        chunks = self._split_documents_to_chunks(documents, start_id=self._next_id)
+        if DEDUP_ENABLED:
+            # Doublons recherchés parmi les nouveaux chunks (l'index existant n'est pas relu)
+            deduplicator = ChunkDeduplicator()
+            chunks = list(deduplicator.deduplicate(chunks))
+            deduplicator.attach_references(chunks)
+            deduplicator.log_stats()
+        if not chunks:
+            # Documents vides ou illisibles: rien à embedder, ce n'est pas une erreur
+            logging.warning("Le découpage n'a produit aucun chunk.")
+            return [], np.empty((0, self.index.d if self.index is not None else 0), dtype="float32")
+
+        if self.embedding_cache is not None:
+            self.embedding_cache.reset_stats()
+        embeddings = self._generate_embeddings(chunks)
+        if self.embedding_cache is not None:
+            self.embedding_cache.log_stats()
+        if embeddings is None or embeddings.shape[0] != len(chunks):
+            logging.error("Problème de génération d'embeddings. Les documents ne sont pas ajoutés.")
+            return None
+        if self.index is not None and embeddings.shape[1] != self.index.d:
+            logging.error(f"Dimension des embeddings ({embeddings.shape[1]}) incompatible avec l'index ({self.index.d}).")
+            return None
+
+        faiss.normalize_L2(embeddings)
+        return chunks, embeddings
+
+    def _ensure_writable_index(self):
+        """Recopie en mémoire un index chargé en memory-mapping lecture seule, avant toute modification."""
+        if self._mmap_index and self.index is not None:
+            logging.info("Index memory-mappé en lecture seule: chargement en mémoire avant modification...")
+            self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+            apply_search_params(self.index, self.index_params)
+        self._mmap_index = False
+
+    def _add_prepared(self, chunks: List[Dict[str, any]], embeddings: np.ndarray):
+        """Ajoute des chunks déjà embeddés à l'index et à la liste des chunks."""
+        self._ensure_writable_index()
+        if self.index is None:
+            self._create_trained_index(embeddings)
+        self.index.add_with_ids(embeddings, np.array([c["id"] for c in chunks], dtype='int64'))
+        self._materialize_chunks()
+        if self._keeps_full_vectors() and (self._full_vectors is not None or not self.document_chunks):
+            self._full_vectors = embeddings if self._full_vectors is None else np.vstack([self._full_vectors, embeddings])
+        self.document_chunks.extend(chunks)
+        self._refresh_id_mapping()
+        self._rebuild_search_indexes()
+
+    def _remove_sources(self, sources: Iterable[str]) -> Tuple[int, bool]:
+        """
+        Retire de l'index et de la liste tous les chunks des sources données. Un chunk canonique
+        dont des doublons (metadata["duplicates"]) proviennent d'autres sources est conservé:
+        l'un de ces doublons prend sa place (ses métadonnées deviennent celles du chunk).
+        Retourne (nombre de chunks retirés, chunks modifiés): une source présente seulement
+        parmi les doublons d'autres chunks ne retire aucun vecteur, mais modifie ces chunks.
+        """
+        sources = list(sources)
+
+        def matches(metadata: Dict[str, any]) -> bool:
+            return any(self._matches_source(metadata, source) for source in sources)
+
+        affected = any(
+            matches(chunk["metadata"]) or any(matches(duplicate) for duplicate in chunk["metadata"].get("duplicates", ()))
+            for chunk in self.document_chunks
+        )
+        if not affected:
+            return 0, False
+        self._materialize_chunks()
+        to_remove = []
+        for chunk in self.document_chunks:
+            metadata = chunk["metadata"]
+            duplicates = metadata.get("duplicates")
+            if duplicates:
+                kept = [duplicate for duplicate in duplicates if not matches(duplicate)]
+                if matches(metadata) and kept:
+                    metadata = dict(kept[0])
+                    kept = kept[1:]
+                if kept:
+                    metadata = {**metadata, "duplicates": kept}
+                else:
+                    metadata = {key: value for key, value in metadata.items() if key != "duplicates"}
+                chunk["metadata"] = metadata
+            if matches(metadata):
+                to_remove.append(chunk["id"])
+        if not to_remove:
+            self._rebuild_search_indexes() # Seules des références de doublons ont changé
+            return 0, True
+        removed_ids = set(to_remove)
+        self._ensure_writable_index()
+        if supports_removal(self.index):
+            remove_ids(self.index, np.array(to_remove, dtype='int64'))
+        else:
+            # HNSW ne supporte pas la suppression: reconstruction à partir des vecteurs conservés
+            keep_ids = np.array([c["id"] for c in self.document_chunks if c["id"] not in removed_ids], dtype='int64')
+            logging.info(f"Index '{self.index_params['index_type']}' sans suppression: reconstruction avec {len(keep_ids)} vecteurs...")
+            vectors = np.vstack([self.index.reconstruct(int(i)) for i in keep_ids]) if len(keep_ids) else None
+            self.index, self.index_params = create_index(self.index.d, self.index_params)
+            if vectors is not None:
+                self.index.add_with_ids(vectors, keep_ids)
+        if self._full_vectors is not None:
+            keep = np.array([c["id"] not in removed_ids for c in self.document_chunks], dtype=bool)
+            self._full_vectors = self._full_vectors[keep]
+        self.document_chunks = [c for c in self.document_chunks if c["id"] not in removed_ids]
+        self._refresh_id_mapping()
+        self._rebuild_search_indexes()
+        return len(to_remove), True
+
+    def add_documents(self, documents: List[Dict[str, any]], save: bool = True) -> int:
+        """
+        Ajoute des documents à l'index existant sans toucher aux autres.
+        Retourne le nombre de chunks ajoutés.
+        """
+        if not documents:
+            logging.warning("Aucun document fourni pour l'ajout.")
+            return 0
+        prepared = self._prepare_documents(documents)
+        if prepared is None:
+            return 0
+        chunks, embeddings = prepared
+        if not chunks:
+            return 0
+        self._add_prepared(chunks, embeddings)
+        logging.info(f"{len(chunks)} chunks ajoutés à l'index ({self.index.ntotal} vecteurs au total).")
+        if save:
+            self._save_index_and_chunks()
+        return len(chunks)
 
-        # 4. Sauvegarder l'index et les chunks
+    def remove_documents(self, source: Union[str, Iterable[str]], save: bool = True) -> int:
+        """
+        Retire de l'index tous les chunks d'une ou plusieurs sources (chemin relatif du fichier,
+        tel que stocké dans metadata["source"]). Retourne le nombre de chunks retirés.
+        """
+        if self.index is None:
+            logging.warning("Suppression impossible: l'index Faiss n'est pas chargé.")
+            return 0
+        sources = [source] if isinstance(source, str) else list(source)
+        removed, modified = self._remove_sources(sources)
+        logging.info(f"{removed} chunks retirés de l'index pour {len(sources)} source(s).")
+        if modified and save: # Y compris si seules des références de doublons ont été retirées
+            self._save_index_and_chunks()
+        return removed
+
+    def upsert_documents(self, documents: List[Dict[str, any]], save: bool = True,
+                         replace_sources: Optional[Iterable[str]] = None) -> Optional[int]:
+        """
+        Remplace les documents fournis dans l'index (suppression des anciens chunks de même source,
+        ainsi que de ceux des `replace_sources`, puis ajout des nouveaux). Les nouveaux embeddings
+        sont calculés avant toute suppression: en cas d'échec, l'index reste inchangé.
+        Retourne le nombre de chunks ajoutés (0 si les documents n'en produisent aucun: leurs
+        anciens chunks sont alors simplement retirés), ou None en cas d'échec.
+        """
+        if not documents:
+            logging.warning("Aucun document fourni pour la mise à jour.")
+            return 0
+        prepared = self._prepare_documents(documents)
+        if prepared is None:
+            return None
+        chunks, embeddings = prepared
+        removed = 0
+        if self.index is not None:
+            sources = {doc["metadata"]["source"] for doc in documents} | set(replace_sources or [])
+            removed, _ = self._remove_sources(sources)
+        if chunks:
+            self._add_prepared(chunks, embeddings)
+        logging.info(f"Mise à jour: {removed} chunks retirés, {len(chunks)} chunks ajoutés "
+                     f"({self.index.ntotal if self.index is not None else 0} vecteurs au total).")
+        if save:
+            self._save_index_and_chunks()
+        return len(chunks)
+
+    def save(self):
+        """Persiste l'état courant (après des mises à jour faites avec `save=False`)."""
         self._save_index_and_chunks()
 
     def _save_index_and_chunks(self):
-        """Sauvegarde l'index Faiss et la liste des chunks."""
+        """
+        Publie l'index, ses paramètres, l'index lexical et les chunks dans un nouveau snapshot versionné.
+        Tout est écrit dans un répertoire de travail, puis le pointeur CURRENT est basculé atomiquement:
+        un lecteur charge l'ancien snapshot complet ou le nouveau, jamais un mélange des deux.
+        """
         if self.index is None or not self.document_chunks:
             logging.warning("Tentative de sauvegarde d'un index ou de chunks vides.")
             return
+        if isinstance(self.document_chunks, ChunkStore) and self.snapshot_version is not None:
+            logging.info(f"Index inchangé depuis le chargement du snapshot {self.snapshot_version}: rien à publier.")
+            return
 
-        os.makedirs(os.path.dirname(FAISS_INDEX_FILE), exist_ok=True)
-        os.makedirs(os.path.dirname(DOCUMENT_CHUNKS_FILE), exist_ok=True)
+        staging = create_staging_dir()
+        try:
+            ChunkStore.write(snapshot_paths(staging)["chunks"], self.document_chunks, next_id=self._next_id,
+                             vectors=self._full_vectors)
+        except Exception as e:
+            discard_staging_dir(staging)
+            logging.error(f"Erreur lors de l'écriture des chunks: {e}")
+            return
+        self._publish_staging(staging)
 
+    def _publish_staging(self, staging: str) -> bool:
+        """
+        Complète un snapshot en préparation dont les chunks sont déjà écrits (index Faiss, paramètres,
+        index lexical), le publie, puis relit ses chunks et vecteurs pleine précision par memory-mapping
+        à la place des copies en mémoire. Retourne False (répertoire de travail supprimé) en cas d'échec.
+        """
         try:
-            logging.info(f"Sauvegarde de l'index Faiss dans {FAISS_INDEX_FILE}...")
-            faiss.write_index(self.index, FAISS_INDEX_FILE)
-            logging.info(f"Sauvegarde des chunks dans {DOCUMENT_CHUNKS_FILE}...")
-            with open(DOCUMENT_CHUNKS_FILE, 'wb') as f:
-                pickle.dump(self.document_chunks, f)
-            logging.info("Index et chunks sauvegardés avec succès.")
+            paths = snapshot_paths(staging)
+            logging.info(f"Sauvegarde de l'index Faiss et des chunks dans un nouveau snapshot ({staging})...")
+            faiss.write_index(self.index, paths["index"])
+            save_index_params(self.index_params, paths["params"])
+            if self.lexical_index is not None:
+                self.lexical_index.save(paths["lexical"])
+            version = publish_snapshot(staging, {
+                "vector_count": int(self.index.ntotal),
+                "chunk_count": len(self.document_chunks),
+                "next_id": self._next_id,
+                "embedding_backend": EMBEDDING_BACKEND,
+                "embedding_model": self.indexing_embedder.model_name,
+                "embedding_dimension": int(self.index.d),
+                **chunking_params(),
+                "duplicate_chunks": self._duplicate_count(),
+                "index_params": self.index_params,
+            })
         except Exception as e:
+            discard_staging_dir(staging)
             logging.error(f"Erreur lors de la sauvegarde de l'index/chunks: {e}")
+            return False
+        self.snapshot_version = version
+        self._adopt_chunk_store(snapshot_paths(snapshot_dir(version))["chunks"])
+        logging.info("Index et chunks sauvegardés avec succès.")
+        return True
 
-    def search(self, query_text: str, k: int = 5, min_score: float = None) -> List[Dict[str, any]]:
+    def _adopt_chunk_store(self, directory: str):
+        """
+        Remplace les chunks et vecteurs en mémoire par ceux, identiques, du stockage publié (memory-mappé).
+        L'ancien stockage n'est pas fermé explicitement: une recherche concurrente peut encore le lire.
+        """
+        self.document_chunks = ChunkStore(directory)
+        self._full_vectors = self.document_chunks.vectors if self._keeps_full_vectors() else None
+        self._refresh_id_mapping()
+
+    def _duplicate_count(self) -> int:
+        """Nombre de doublons rattachés aux chunks (metadata["duplicates"])."""
+        if isinstance(self.document_chunks, ChunkStore):
+            store = self.document_chunks
+            per_document = np.array([len(doc.get("duplicates", ())) for doc in store.documents], dtype="int64")
+            return int(per_document[store.doc_index].sum())
+        return sum(len(chunk["metadata"].get("duplicates", ())) for chunk in self.document_chunks)
+
+    def search(self, query_text: str, k: int = 5, min_score: float = None,
+               mode: Optional[str] = None, where: Optional[Where] = None,
+               diversify: Optional[bool] = None) -> List[Dict[str, any]]:
         """
         Recherche les k chunks les plus pertinents pour une requête.
+        Si le micro-batching est activé, les appels concurrents sont regroupés en un seul lot.
 
         Args:
             query_text: Texte de la requête
             k: Nombre de résultats à retourner
-            min_score: Score minimum (entre 0 et 1) pour inclure un résultat
+            min_score: Score minimum (entre 0 et 1) pour inclure un résultat dense (en mode "hybrid",
+                       les résultats trouvés par BM25 seul ne sont pas filtrés)
+            mode: "dense" (embeddings), "lexical" (BM25) ou "hybrid" (fusion RRF, "score" = score RRF);
+                  SEARCH_MODE par défaut
+            where: Filtre sur les métadonnées, appliqué pendant la recherche,
+                   ex. {"filename": "Reddit 1.pdf"} ou {"category": ["pdf", "excel"]}
+            diversify: Re-classement MMR des candidats pour écarter les quasi-doublons, puis fusion des chunks
+                       adjacents (MERGE_ADJACENT_CHUNKS); SEARCH_DIVERSIFY par défaut
 
         Returns:
             Liste des chunks pertinents avec leurs scores
+
+        Raises:
+            ValueError: si `where` porte sur un champ non filtrable (vérifié avant tout appel
+                        d'embeddings; les autres erreurs de recherche donnent une liste vide)
         """
+        if where:
+            validate_where(where) # Avant le micro-batcher: un filtre invalide ne fait pas échouer le lot
+        if self._micro_batcher is not None and not self._micro_batcher.closed:
+            return self._micro_batcher.submit((query_text, k, min_score, mode, where, diversify))
+        return self.search_many([query_text], k=k, min_score=min_score, mode=mode, where=where, diversify=diversify)[0]
+
+    def search_many(self, queries: List[str], k: int = 5, min_score: float = None,
+                    mode: Optional[str] = None, where: Optional[Where] = None,
+                    diversify: Optional[bool] = None) -> List[List[Dict[str, any]]]:
+        """
+        Recherche groupée: un seul appel d'embeddings pour toutes les requêtes,
+        puis une seule recherche Faiss sur la matrice des requêtes empilées.
+        Si l'API d'embeddings est indisponible, bascule sur la recherche lexicale.
+        Le filtre `where` est appliqué dans la recherche: on obtient exactement les k meilleurs
+        chunks qui le satisfont.
+
+        Returns:
+            Une liste de résultats par requête, dans l'ordre des requêtes
+
+        Raises:
+            ValueError: si `where` porte sur un champ non filtrable (vérifié avant l'appel d'embeddings)
+        """
+        if where:
+            validate_where(where)
+        mode = mode or SEARCH_MODE
+        diversify = SEARCH_DIVERSIFY if diversify is None else diversify
+        # Avec la diversification, MMR choisit les k résultats parmi davantage de candidats
+        candidates_k = max(k, MMR_CANDIDATES) if diversify else k
+        if not queries:
+            return []
         if self.index is None or not self.document_chunks:
             logging.warning("Recherche impossible: l'index Faiss n'est pas chargé ou est vide.")
-            return []
-        if not MISTRAL_API_KEY:
-             logging.error("Recherche impossible: MISTRAL_API_KEY manquante pour générer l'embedding de la requête.")
-             return []
+            return [[] for _ in queries]
 
-        logging.info(f"Recherche des {k} chunks les plus pertinents pour: '{query_text}'")
-        try:
-            # 1. Générer l'embedding de la requête
-            response = self.mistral_client.embeddings(
-                model=EMBEDDING_MODEL,
-                input=[query_text] # La requête doit être une liste
-            )
-            query_embedding = np.array([response.data[0].embedding]).astype('float32')
+        if len(queries) == 1:
+            logging.info(f"Recherche ({mode}) des {k} chunks les plus pertinents pour: '{queries[0]}'")
+        else:
+            logging.info(f"Recherche groupée ({mode}) des {k} chunks les plus pertinents pour {len(queries)} requêtes")
 
-            # Normaliser l'embedding de la requête pour la similarité cosinus
-            faiss.normalize_L2(query_embedding)
+        allowed_ids = None
+        if where:
+            allowed_ids = self.metadata_index.matching_ids(where)
+            logging.info(f"Filtre {where}: {len(allowed_ids)} chunks éligibles.")
+            if not len(allowed_ids):
+                return [[] for _ in queries]
 
-            # 2. Rechercher dans l'index Faiss
-            # Pour IndexFlatIP: scores = produit scalaire (plus grand = meilleur)
-            # indices: index des chunks correspondants dans self.document_chunks
-            # Demander plus de résultats si un score minimum est spécifié
-            search_k = k * 3 if min_score is not None else k
-            scores, indices = self.index.search(query_embedding, search_k)
+        if mode == "lexical":
+            return [self._finalize_results(self._lexical_search(query, candidates_k, allowed_ids), k)
+                    for query in queries]
 
-            # 3. Formater les résultats
-            results = []
-            if indices.size > 0: # Vérifier s'il y a des résultats
-                for i, idx in enumerate(indices[0]):
-                    if 0 <= idx < len(self.document_chunks): # Vérifier la validité de l'index
-                        chunk = self.document_chunks[idx]
-                        # Convertir le score en similarité (0-1)
-                        # Pour IndexFlatIP avec vecteurs normalisés, le score est déjà entre -1 et 1
-                        # On le convertit en pourcentage (0-100%)
-                        raw_score = float(scores[0][i])
-                        similarity = raw_score * 100
-
-                        # Filtrer les résultats en fonction du score minimum
-                        # Le min_score est entre 0 et 1, mais similarity est en pourcentage (0-100)
-                        min_score_percent = min_score * 100 if min_score is not None else 0
-                        if min_score is not None and similarity < min_score_percent:
-                            logging.debug(f"Document filtré (score {similarity:.2f}% < minimum {min_score_percent:.2f}%)")
-                            continue
-
-                        results.append({
-                            "score": similarity, # Score de similarité en pourcentage
-                            "raw_score": raw_score, # Score brut pour débogage
-                            "text": chunk["text"],
-                            "metadata": chunk["metadata"] # Contient source, category, chunk_id_in_doc, start_index etc.
-                        })
-                    else:
-                        logging.warning(f"Index Faiss {idx} hors limites (taille des chunks: {len(self.document_chunks)}).")
-
-            # Trier par score (similarité la plus élevée en premier)
-            results.sort(key=lambda x: x["score"], reverse=True)
-
-            # Limiter au nombre demandé (k) si nécessaire
-            if len(results) > k:
-                results = results[:k]
-
-            if min_score is not None:
-                min_score_percent = min_score * 100
-                logging.info(f"{len(results)} chunks pertinents trouvés (score minimum: {min_score_percent:.2f}%).")
+        try:
+            # 1. Générer les embeddings des requêtes (ou les reprendre du cache)
+            query_embeddings = self._embed_queries(queries)
+        except Exception as e:
+            if isinstance(e, MistralAPIException):
+                logging.error(f"Erreur API Mistral lors de la génération de l'embedding de la requête: {e}")
+                logging.error(f"  Détails: Status Code={e.http_status}, Message={e.message}")
             else:
-                logging.info(f"{len(results)} chunks pertinents trouvés.")
+                logging.error(f"Erreur lors de la génération de l'embedding de la requête: {e}")
+            if self.lexical_index is None:
+                return [[] for _ in queries]
+            logging.warning("Embeddings indisponibles: bascule sur la recherche lexicale (BM25).")
+            return [self._finalize_results(self._lexical_search(query, candidates_k, allowed_ids), k)
+                    for query in queries]
 
+        try:
+            # 2. Rechercher dans l'index Faiss
+            # Scores = produit scalaire (plus grand = meilleur), exact ou approché selon le type d'index
+            # indices: identifiants stables des chunks correspondants (-1 si aucun résultat)
+            # Demander plus de résultats si un score minimum est spécifié, ou pour la fusion hybride
+            search_k = max(k * 3 if min_score is not None else k, candidates_k)
+            if mode == "hybrid":
+                search_k = max(search_k, HYBRID_CANDIDATES)
+            if self._full_vectors is not None:
+                # Index quantifié: k * facteur candidats approchés, re-scorés avec les vecteurs pleine précision
+                _, candidates = self._dense_search(query_embeddings, search_k * EXACT_RESCORE_FACTOR, where, allowed_ids)
+                scores, indices = rescore_exact(query_embeddings, candidates, search_k, self._vectors_for_ids)
+            else:
+                scores, indices = self._dense_search(query_embeddings, search_k, where, allowed_ids)
+
+            # 3. Formater les résultats, requête par requête
+            results = []
+            for row, query in enumerate(queries):
+                if mode == "hybrid":
+                    dense = self._format_results(scores[row], indices[row], search_k, min_score)
+                    candidates = self._fuse_hybrid(query, dense, candidates_k, allowed_ids)
+                else:
+                    candidates = self._format_results(scores[row], indices[row], candidates_k, min_score)
+                results.append(self._finalize_results(candidates, k, diversify, hybrid=mode == "hybrid"))
             return results
 
-        except MistralAPIException as e:
-            logging.error(f"Erreur API Mistral lors de la génération de l'embedding de la requête: {e}")
-            logging.error(f"  Détails: Status Code={e.status_code}, Message={e.message}")
-            return []
         except Exception as e:
             logging.error(f"Erreur inattendue lors de la recherche: {e}")
+            return [[] for _ in queries]
+
+    def _finalize_results(self, candidates: List[Dict[str, any]], k: int, diversify: bool = False,
+                          hybrid: bool = False) -> List[Dict[str, any]]:
+        """
+        Sélection finale des k résultats. Sans `diversify`, ce sont les k premiers candidats, inchangés.
+        Avec `diversify`: re-classement MMR (les quasi-doublons sont écartés), puis fusion des chunks
+        adjacents d'un même document (MERGE_ADJACENT_CHUNKS); les candidats suivants dans l'ordre MMR
+        complètent la sélection tant qu'elle compte moins de k résultats.
+        La pertinence donnée à MMR est le score des candidats (similarité cosinus, ou score RRF
+        normalisé si `hybrid`): l'ordre de la fusion hybride est conservé, seule la redondance
+        est mesurée sur la matrice des vecteurs candidats.
+        """
+        if not diversify:
+            return candidates[:k]
+        if len(candidates) > 1:
+            scores = np.array([c["score"] for c in candidates], dtype="float32")
+            relevance = rrf_relevance(scores) if hybrid else scores / 100 # score dense en pourcentage
+            vectors = self._candidate_vectors(np.array([c["id"] for c in candidates], dtype="int64"))
+            # Ordre MMR de tous les candidats: ceux au-delà des k premiers servent de réserve
+            selected = mmr_select(relevance, vectors, len(candidates), MMR_LAMBDA, NEAR_DUPLICATE_THRESHOLD)
+            if len(selected) < len(candidates):
+                logging.info(f"{len(candidates) - len(selected)} quasi-doublon(s) écarté(s) par MMR.")
+            candidates = [candidates[i] for i in selected]
+        if not MERGE_ADJACENT_CHUNKS:
+            return candidates[:k]
+        taken = k
+        results = merge_adjacent_chunks(candidates[:taken])
+        while len(results) < k and taken < len(candidates):
+            taken += k - len(results)
+            results = merge_adjacent_chunks(candidates[:taken])
+        return results
+
+    def _candidate_vectors(self, ids: np.ndarray) -> np.ndarray:
+        """Vecteurs normalisés des candidats: pleine précision si conservés, sinon reconstruits depuis l'index."""
+        if self._full_vectors is not None:
+            return np.asarray(self._vectors_for_ids(ids), dtype="float32")
+        return self.index.reconstruct_batch(ids)
+
+    def _dense_search(self, query_embeddings: np.ndarray, search_k: int, where: Optional[Where],
+                      allowed_ids: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Recherche Faiss, restreinte aux chunks éligibles si un filtre est donné: le bitmap
+        précalculé est passé à Faiss comme sélecteur d'identifiants. Un index approché (HNSW, IVF)
+        peut rendre moins de résultats que prévu avec un filtre sélectif; on bascule alors
+        sur une recherche exacte parmi les chunks éligibles.
+        """
+        if where is None:
+            return self.index.search(query_embeddings, search_k)
+
+        if not is_exact(self.index) and len(allowed_ids) <= FILTER_EXACT_MAX_IDS:
+            return exact_search_ids(self.index, query_embeddings, allowed_ids, search_k)
+
+        bitmap = self.metadata_index.bitmap(where) # Référence conservée pendant la recherche
+        params = search_parameters(self.index, self.index_params, make_id_selector(bitmap))
+        scores, indices = self.index.search(query_embeddings, search_k, params=params)
+        expected = min(search_k, len(allowed_ids))
+        if not is_exact(self.index) and (indices >= 0).sum(axis=1).min() < expected:
+            logging.info("Résultats filtrés incomplets avec l'index approché: recherche exacte parmi les chunks éligibles.")
+            scores, indices = exact_search_ids(self.index, query_embeddings, allowed_ids, search_k)
+        return scores, indices
+
+    def _format_results(self, scores: np.ndarray, indices: np.ndarray, k: int, min_score: float = None) -> List[Dict[str, any]]:
+        """Convertit une ligne de résultats Faiss (scores, identifiants) en chunks avec scores."""
+        results = []
+        for i, idx in enumerate(indices):
+            if idx < 0: # Moins de résultats que demandé
+                continue
+            position = self._position_of(int(idx))
+            if position is not None: # Vérifier la validité de l'identifiant
+                chunk = self.document_chunks[position]
+                # Convertir le score en similarité (0-1)
+                # Pour IndexFlatIP avec vecteurs normalisés, le score est déjà entre -1 et 1
+                # On le convertit en pourcentage (0-100%)
+                raw_score = float(scores[i])
+                similarity = raw_score * 100
+
+                # Filtrer les résultats en fonction du score minimum
+                # Le min_score est entre 0 et 1, mais similarity est en pourcentage (0-100)
+                min_score_percent = min_score * 100 if min_score is not None else 0
+                if min_score is not None and similarity < min_score_percent:
+                    logging.debug(f"Document filtré (score {similarity:.2f}% < minimum {min_score_percent:.2f}%)")
+                    continue
+
+                results.append({
+                    "id": chunk["id"], # Identifiant stable du chunk
+                    "score": similarity, # Score de similarité en pourcentage
+                    "raw_score": raw_score, # Score brut pour débogage
+                    "text": chunk["text"],
+                    "metadata": chunk["metadata"] # Contient source, category, chunk_id_in_doc, start_index etc.
+                })
+            else:
+                logging.warning(f"Identifiant Faiss {idx} sans chunk correspondant ({len(self.document_chunks)} chunks).")
+
+        # Trier par score (similarité la plus élevée en premier)
+        results.sort(key=lambda x: x["score"], reverse=True)
+
+        # Limiter au nombre demandé (k) si nécessaire
+        if len(results) > k:
+            results = results[:k]
+
+        if min_score is not None:
+            min_score_percent = min_score * 100
+            logging.info(f"{len(results)} chunks pertinents trouvés (score minimum: {min_score_percent:.2f}%).")
+        else:
+            logging.info(f"{len(results)} chunks pertinents trouvés.")
+
+        return results
+
+    def _chunk_result(self, chunk_id: int, score: float, raw_score: float) -> Optional[Dict[str, any]]:
+        """Résultat de recherche pour un identifiant de chunk (None si l'identifiant est inconnu)."""
+        position = self._position_of(chunk_id)
+        if position is None:
+            return None
+        chunk = self.document_chunks[position]
+        return {"id": chunk["id"], "score": score, "raw_score": raw_score,
+                "text": chunk["text"], "metadata": chunk["metadata"]}
+
+    def _lexical_search(self, query_text: str, k: int, allowed_ids: Optional[np.ndarray] = None) -> List[Dict[str, any]]:
+        """Recherche BM25 pure, calculée en local (score = score BM25), éventuellement restreinte à `allowed_ids`."""
+        if self.lexical_index is None:
+            logging.warning("Recherche lexicale impossible: index BM25 absent.")
             return []
+        results = [self._chunk_result(chunk_id, score, score) for chunk_id, score in self.lexical_index.search(query_text, k, allowed_ids)]
+        results = [r for r in results if r is not None]
+        logging.info(f"{len(results)} chunks trouvés par la recherche lexicale.")
+        return results
+
+    def _fuse_hybrid(self, query_text: str, dense_results: List[Dict[str, any]], k: int,
+                     allowed_ids: Optional[np.ndarray] = None) -> List[Dict[str, any]]:
+        """
+        Fusionne le classement dense et le classement BM25 par Reciprocal Rank Fusion.
+        Le "score" retourné est le score RRF; "raw_score" reste la similarité cosinus (None si absent du dense).
+        """
+        if self.lexical_index is None:
+            return dense_results[:k]
+        lexical = self.lexical_index.search(query_text, HYBRID_CANDIDATES, allowed_ids)
+        fused = reciprocal_rank_fusion([[r["id"] for r in dense_results], [chunk_id for chunk_id, _ in lexical]], RRF_K)
+
+        dense_by_id = {r["id"]: r for r in dense_results}
+        results = []
+        for chunk_id, rrf_score in fused[:k]:
+            if chunk_id in dense_by_id:
+                result = {**dense_by_id[chunk_id], "score": rrf_score}
+            else:
+                result = self._chunk_result(chunk_id, rrf_score, None)
+                if result is None:
+                    continue
+            results.append(result)
+        logging.info(f"{len(results)} chunks retenus après fusion hybride (dense: {len(dense_results)}, lexical: {len(lexical)}).")
+        return results
+
+    def _run_search_batch(self, requests: List[Tuple[str, int, Optional[float], Optional[str], Optional[Where], Optional[bool]]]
+                          ) -> List[List[Dict[str, any]]]:
+        """Traite un lot du micro-batcher: un `search_many` par combinaison (k, min_score, mode, filtre, diversification)."""
+        results: List[Optional[List[Dict[str, any]]]] = [None] * len(requests)
+        groups: Dict[Tuple[int, Optional[float], Optional[str], str, Optional[bool]], List[int]] = {}
+        for position, (_, k, min_score, mode, where, diversify) in enumerate(requests):
+            filter_key = json.dumps(where, sort_keys=True) if where else ""
+            groups.setdefault((k, min_score, mode, filter_key, diversify), []).append(position)
+        for (k, min_score, mode, _, diversify), positions in groups.items():
+            where = requests[positions[0]][4]
+            group_results = self.search_many([requests[p][0] for p in positions], k=k, min_score=min_score,
+                                             mode=mode, where=where, diversify=diversify)
+            for position, result in zip(positions, group_results):
+                results[position] = result
+        return results
+
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Retourne les embeddings normalisés (shape (n, d)) des requêtes.
+        Les requêtes déjà vues (à la casse et à la ponctuation près) sont servies par le cache;
+        les autres sont embeddées en un seul appel au fournisseur d'embeddings.
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * len(queries)
+        if self.query_cache is not None:
+            embeddings = [self.query_cache.get(query) for query in queries]
+            if any(emb is not None for emb in embeddings):
+                logging.info(f"{sum(emb is not None for emb in embeddings)}/{len(queries)} embedding(s) de requête servi(s) par le cache.")
+
+        missing = list(dict.fromkeys(q for q, emb in zip(queries, embeddings) if emb is None))
+        if missing:
+            unavailable = self.query_embedder.is_available()
+            if unavailable:
+                raise ValueError(f"{unavailable}: impossible de générer l'embedding de la requête.")
+            # Toutes les requêtes absentes du cache en un seul appel
+            new_embeddings = np.ascontiguousarray(self.query_embedder.embed_queries(missing), dtype='float32')
+
+            # Normaliser les embeddings des requêtes pour la similarité cosinus
+            faiss.normalize_L2(new_embeddings)
+            computed = dict(zip(missing, new_embeddings))
+            for query, vector in computed.items():
+                if self.query_cache is not None:
+                    self.query_cache.put(query, vector)
+            embeddings = [emb if emb is not None else computed[q] for q, emb in zip(queries, embeddings)]
+
+        return np.ascontiguousarray(np.vstack(embeddings), dtype='float32')
 
+    def query_cache_stats(self) -> Dict[str, float]:
+        """Compteurs du cache des embeddings de requêtes (vide si le cache est désactivé)."""
+        return self.query_cache.stats() if self.query_cache is not None else {}
 
     # ============================================================
     # Helpers pour RAGAS
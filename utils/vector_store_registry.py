@@ -0,0 +1,134 @@
+# utils/vector_store_registry.py
+import os
+import time
+import logging
+import threading
+from typing import Optional, Tuple
+
+from .config import (
+    CURRENT_SNAPSHOT_FILE, FAISS_INDEX_FILE, FAISS_INDEX_PARAMS_FILE, LEXICAL_INDEX_FILE, CHUNK_STORE_DIR,
+    VECTOR_STORE_HOT_RELOAD, VECTOR_STORE_RELOAD_INTERVAL_SECONDS, VECTOR_STORE_MMAP_INDEX
+)
+from .chunk_store import DOCUMENTS_FILE
+from .vector_store import VectorStoreManager
+from .index_factory import supports_mmap
+
+# Fichiers dont la modification signale un nouvel index: le pointeur de snapshot courant
+# (publication ou retour arrière), et les fichiers de l'ancienne disposition
+_WATCHED_FILES = (
+    CURRENT_SNAPSHOT_FILE,
+    FAISS_INDEX_FILE,
+    FAISS_INDEX_PARAMS_FILE,
+    LEXICAL_INDEX_FILE,
+    os.path.join(CHUNK_STORE_DIR, DOCUMENTS_FILE),
+)
+
+_lock = threading.Lock()
+_vector_store: Optional[VectorStoreManager] = None
+_loaded_signature: Optional[Tuple] = None
+_watcher: Optional[threading.Thread] = None
+
+
+def _files_signature() -> Tuple:
+    """(mtime, taille) des fichiers surveillés; None pour un fichier absent."""
+    signature = []
+    for path in _WATCHED_FILES:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def get_vector_store() -> VectorStoreManager:
+    """
+    Retourne le VectorStoreManager partagé du processus, chargé une seule fois.
+    Appeler cette fonction à chaque requête (plutôt que garder la référence) permet
+    de profiter des rechargements à chaud.
+    """
+    global _vector_store, _loaded_signature
+    if _vector_store is None:
+        with _lock:
+            if _vector_store is None:
+                _loaded_signature = _files_signature()
+                _vector_store = VectorStoreManager(mmap_index=VECTOR_STORE_MMAP_INDEX)
+                if VECTOR_STORE_HOT_RELOAD:
+                    _start_watcher()
+    return _vector_store
+
+
+def reload_vector_store(force: bool = False) -> bool:
+    """
+    Recharge l'index depuis le disque si les fichiers ont changé (ou si `force`).
+
+    Le nouvel index est chargé à côté de l'ancien, puis la référence partagée est
+    remplacée en une seule affectation: les recherches en cours finissent sur l'ancienne
+    instance, qui est libérée dès qu'elles se terminent. Fournisseurs d'embeddings et caches
+    sont réutilisés et les chunks sont memory-mappés, mais l'index Faiss n'est memory-mappé que
+    pour les types IVF (ivf, ivfpq): pour flat, hnsw, sq8 et fp16, faiss le lit entièrement en
+    mémoire (mesuré avec faiss-cpu 1.10: +207 Mo de RSS pour un index flat de 196 Mo). Pendant
+    le basculement, le processus tient alors deux index complets: prévoir un pic d'environ deux
+    fois la taille du fichier de l'index.
+    Retourne True si l'index a été remplacé.
+    """
+    global _vector_store, _loaded_signature
+    current = get_vector_store()
+    with _lock:
+        signature = _files_signature()
+        if not force and signature == _loaded_signature:
+            return False
+
+        logging.info("Modification de l'index détectée: chargement de la nouvelle version...")
+        candidate = VectorStoreManager(share_clients_with=current, mmap_index=VECTOR_STORE_MMAP_INDEX)
+        if candidate.index is None or candidate.index.ntotal != len(candidate.document_chunks):
+            # Sauvegarde en cours ou fichiers incohérents: on garde l'index actuel, nouvel essai au prochain passage
+            logging.warning("Nouvel index incomplet ou incohérent: l'index actuel est conservé.")
+            candidate.close()
+            return False
+
+        _vector_store = candidate
+        _loaded_signature = signature
+    current.close()
+    logging.info(f"Index rechargé à chaud: {candidate.index.ntotal} vecteurs.")
+    if not supports_mmap(candidate.index_params):
+        logging.info(f"Index '{candidate.index_params.get('index_type')}' chargé en mémoire (non memory-mappable): "
+                     "deux index complets ont coexisté pendant le basculement.")
+    return True
+
+
+def register_vector_store(vector_store: VectorStoreManager):
+    """
+    Installe comme instance partagée un VectorStoreManager qui vient de construire et publier
+    l'index (ex. reconstruction depuis l'interface): le snapshot publié n'est pas rechargé.
+    """
+    global _vector_store, _loaded_signature
+    with _lock:
+        previous = _vector_store
+        _vector_store = vector_store
+        _loaded_signature = _files_signature()
+        if VECTOR_STORE_HOT_RELOAD:
+            _start_watcher()
+    if previous is not None and previous is not vector_store:
+        previous.close()
+
+
+def _watch():
+    previous = _files_signature()
+    while True:
+        time.sleep(VECTOR_STORE_RELOAD_INTERVAL_SECONDS)
+        signature = _files_signature()
+        # On attend que les fichiers soient stables sur deux passages (sauvegarde terminée)
+        if signature == previous and signature != _loaded_signature:
+            try:
+                reload_vector_store()
+            except Exception as e:
+                logging.error(f"Erreur lors du rechargement à chaud de l'index: {e}")
+        previous = signature
+
+
+def _start_watcher():
+    global _watcher
+    if _watcher is None:
+        _watcher = threading.Thread(target=_watch, name="vector-store-watcher", daemon=True)
+        _watcher.start()
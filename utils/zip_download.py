@@ -0,0 +1,168 @@
+# utils/zip_download.py
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import zipfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+import requests
+
+from .config import DOWNLOAD_DIR, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_MAX_RETRIES, DOWNLOAD_TIMEOUT
+
+
+class DownloadError(Exception):
+    """Téléchargement impossible ou fichier reçu incohérent (taille, empreinte)."""
+
+
+def _partial_paths(url: str, download_dir: str):
+    """Fichier partiel et métadonnées de reprise associés à une URL (stables d'un lancement à l'autre)."""
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    base = os.path.join(download_dir, name)
+    return base + ".part", base + ".json"
+
+
+def _load_validator(meta_path: str) -> dict:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _total_size(response: requests.Response, offset: int) -> Optional[int]:
+    """Taille totale annoncée par le serveur (Content-Range en reprise, Content-Length sinon)."""
+    content_range = response.headers.get("Content-Range", "")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1].strip()
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    return offset + int(length) if length and length.isdigit() else None
+
+
+def sha256_file(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def download_file(url: str, sha256: Optional[str] = None, download_dir: str = DOWNLOAD_DIR,
+                  max_retries: int = DOWNLOAD_MAX_RETRIES, session: Optional[requests.Session] = None) -> str:
+    """
+    Télécharge `url` en flux, par blocs de DOWNLOAD_CHUNK_SIZE octets, dans un fichier partiel
+    de `download_dir` (jamais en mémoire) et retourne son chemin.
+
+    Une coupure (réseau, processus interrompu) n'oblige pas à tout recommencer: le
+    téléchargement reprend là où il s'était arrêté avec une requête HTTP Range, validée par
+    If-Range (ETag ou Last-Modified): si le fichier a changé sur le serveur, il est
+    re-téléchargé depuis le début. La taille finale est comparée à celle annoncée par le
+    serveur et, si `sha256` est fourni, l'empreinte du fichier est vérifiée.
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    part_path, meta_path = _partial_paths(url, download_dir)
+    http = session or requests.Session()
+
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        validator = _load_validator(meta_path) if offset else {}
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if validator.get("etag") or validator.get("last_modified"):
+                headers["If-Range"] = validator.get("etag") or validator.get("last_modified")
+        try:
+            with http.get(url, stream=True, headers=headers, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status_code == 416 and offset:
+                    # Plage refusée: le fichier partiel est déjà complet, ou ne correspond plus au fichier distant
+                    total = _total_size(response, 0) if "/" in response.headers.get("Content-Range", "") \
+                        else validator.get("total")
+                    if total == offset:
+                        break
+                    logging.warning("Reprise impossible (plage refusée), nouveau téléchargement complet.")
+                    os.remove(part_path)
+                    continue
+                response.raise_for_status()
+
+                if offset and response.status_code != 206:
+                    logging.info("Le serveur ne reprend pas ce téléchargement (fichier modifié ou Range non "
+                                 "supporté): téléchargement depuis le début.")
+                    offset = 0
+                total = _total_size(response, offset)
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"url": url, "etag": response.headers.get("ETag"),
+                               "last_modified": response.headers.get("Last-Modified"), "total": total}, f)
+                if offset:
+                    logging.info(f"Reprise du téléchargement à {offset / 1e6:.1f} Mo"
+                                 + (f" sur {total / 1e6:.1f} Mo" if total else "") + "...")
+
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for block in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        if block:
+                            f.write(block)
+                    received = f.tell()
+            if total is not None and received != total:
+                raise requests.exceptions.ChunkedEncodingError(
+                    f"téléchargement incomplet ({received} octets sur {total})")
+            break
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise DownloadError(f"téléchargement interrompu après {max_retries} reprises: {e}") from e
+            delay = min(2 ** attempt, 30)
+            logging.warning(f"Téléchargement interrompu ({e}), reprise dans {delay} s "
+                            f"(tentative {attempt}/{max_retries})...")
+            time.sleep(delay)
+
+    if sha256:
+        actual = sha256_file(part_path)
+        if actual.lower() != sha256.lower():
+            # Fichier corrompu: on ne le reprendra pas, le prochain essai repart de zéro
+            discard_download(url, download_dir)
+            raise DownloadError(f"empreinte SHA-256 inattendue ({actual}, attendue {sha256})")
+    logging.info(f"Téléchargement terminé: {os.path.getsize(part_path) / 1e6:.1f} Mo.")
+    return part_path
+
+
+def discard_download(url: str, download_dir: str = DOWNLOAD_DIR):
+    """Supprime le fichier partiel et les métadonnées de reprise d'une URL."""
+    for path in _partial_paths(url, download_dir):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def iter_extract_zip(zip_path: str, output_dir: str) -> Iterator[str]:
+    """
+    Extrait les fichiers d'une archive un par un et produit le chemin relatif de chacun dès
+    qu'il est complet: le parsing d'un fichier peut commencer pendant l'extraction des suivants.
+
+    Chaque fichier est décompressé en flux dans un fichier temporaire, renommé une fois son
+    CRC vérifié (zipfile lève BadZipFile sinon): un fichier produit n'est jamais tronqué. Les
+    entrées sortant de `output_dir` (chemins absolus, "..") sont ignorées.
+    """
+    output_path = Path(output_dir).resolve()
+    output_path.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in archive.infolist():
+            if member.is_dir():
+                continue
+            target = (output_path / member.filename).resolve()
+            if output_path not in target.parents:
+                logging.warning(f"Entrée d'archive ignorée (chemin hors du répertoire cible): {member.filename}")
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target.with_name(target.name + ".extracting")
+            try:
+                with archive.open(member) as source, open(tmp_path, "wb") as destination:
+                    shutil.copyfileobj(source, destination, DOWNLOAD_CHUNK_SIZE)
+                os.replace(tmp_path, target)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            yield str(target.relative_to(output_path))